@@ -2,12 +2,18 @@
 
 import joblib
 import pickle
+from forest_model import load_compiled
 
 def load_model(path="models/ai_model.pkl"):
     """
     Load your AI model from disk. Supports both joblib and pickle formats,
     and unpacks a tuple if necessary (e.g. (model, vectorizer)).
+    A current compiled forest export (forest_model.py) is preferred when present.
     """
+    compiled = load_compiled(path)
+    if compiled is not None:
+        return compiled
+
     try:
         loaded = joblib.load(path)
     except Exception:
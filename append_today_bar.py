@@ -1,7 +1,8 @@
-import pandas as pd
-import time
 from datetime import datetime
 from fyers_connect import get_fyers_client
+from fetch_engine import RateLimitedClient, fetch_concurrent
+import bar_store
+import symbol_master
 
 def fetch_today_bar(symbol, fyers):
     today = datetime.now().strftime("%Y-%m-%d")
@@ -31,46 +32,26 @@ def fetch_today_bar(symbol, fyers):
     }
 
 if __name__ == "__main__":
-    fyers = get_fyers_client()
-    stock_list = pd.read_csv("stock_universe.csv")
-    bars_file = "nse_daily_bars_fyers.csv"
-    try:
-        df_bars = pd.read_csv(bars_file)
-    except FileNotFoundError:
-        df_bars = pd.DataFrame(
-            columns=["symbol", "timestamp", "open", "high", "low", "close", "volume"]
-        )
+    fyers = RateLimitedClient(get_fyers_client())
+    conn = bar_store.connect()
+    migrated = bar_store.migrate_csv(conn)
+    if migrated:
+        print(f"Imported {migrated} bars from {bar_store.LEGACY_CSV} into {bar_store.BARS_DB}")
 
-    # Build symbols as "NSE:TCS-EQ"
-    symbols = [
-        f"{row['exchange'].strip().upper()}:{row['symbol'].strip().upper()}-EQ"
-        for _, row in stock_list.iterrows()
-    ]
+    # Broker symbols ("NSE:TCS-EQ") from the symbol master; the store keys bars by symbol id
+    symbols = symbol_master.load_universe(conn)
 
     batch_size = 100
     appended = 0
     total_batches = (len(symbols) + batch_size - 1) // batch_size
-    time.sleep(10)
     for batch_idx in range(total_batches):
         batch_symbols = symbols[batch_idx * batch_size : (batch_idx + 1) * batch_size]
         print(f"\n=== Processing batch {batch_idx + 1} of {total_batches} ===")
-        for symbol in batch_symbols:
-            print(f"Fetching {symbol}...", end="")
-            bar = fetch_today_bar(symbol, fyers)
-            if bar is None:
-                print(" skip")
-                continue
-            # Check if already present (by symbol and timestamp)
-            if not ((df_bars["symbol"] == bar["symbol"]) & (df_bars["timestamp"] == bar["timestamp"])).any():
-                df_bars = pd.concat([df_bars, pd.DataFrame([bar])], ignore_index=True)
-                appended += 1
-                print(" done")
-            else:
-                print(" already exists")
-            time.sleep(0.25)  # Rate limit protection between requests
-        if batch_idx != total_batches - 1:  # No need to sleep after the last batch
-            print(f"Sleeping for 60 seconds after batch {batch_idx + 1}...")
-            time.sleep(20)
+        # Requests are paced by the shared rate limiter, not fixed sleeps
+        bars = fetch_concurrent(lambda sym: fetch_today_bar(sym, fyers), batch_symbols)
+        new_bars = [bars[sym] for sym in batch_symbols if bars.get(sym) is not None]
+        print(f"Fetched {len(new_bars)}/{len(batch_symbols)} bars")
+        # Keyed upsert: a bar already in the store is left as is (or corrected)
+        appended += bar_store.upsert_bars(conn, new_bars)
 
-    df_bars.to_csv(bars_file, index=False)
-    print(f"ok Appended {appended} new bars. Saved to {bars_file}")
+    print(f"ok Upserted {appended} new/changed bars into {bar_store.BARS_DB}")
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+backtest.py
+
+Replays the model and the dashboard's pick rules over the historical feature
+panel (training_features.csv), to see how the scanner's picks would have done.
+
+Each trading day is treated as one end-of-day scan with ltp = close:
+
+- every symbol that passes the scanner's quote screen on the day's bar
+  (scanner.screen_reasons: price, volume, no-movement) and has at least
+  scanner.MIN_BARS bars and no NaN feature is scored, and gets the scanner's ATR-based target_price (score rounded to 4
+  places and target to 2, as in ai_scanner_output.csv);
+- pick_tracker.select_top_picks: score >= CONFIDENCE_THRESHOLD, target at
+  least MIN_TARGET_PCT above price, best TOP_N of the day;
+- entry at close, stop STOP_PCT below; a symbol that is still open is not
+  re-entered (the tracker's unique open-pick index);
+- from the next bar on, pick_tracker.evaluate_open_picks on each daily bar:
+  Stop if low <= stop (checked first, so a bar touching both is a stop), Hit
+  at the target if high >= target, Expired at the close after MAX_HOLD_DAYS
+  bars. Trades still open when the data ends are reported as Open.
+
+The same-day check the live tracker runs right after recording a pick is
+skipped: a daily bar's range mostly predates an end-of-day entry.
+
+Everything is array operations: the panel is scored in one predict_proba call
+per chunk, daily top-N is a ranked filter, exits are forward windows over
+(trades × MAX_HOLD_DAYS) and the no-re-entry rule follows per-symbol
+"next allowed entry" pointers for all symbols at once. Date ranges are split
+across a process pool (each chunk carries MAX_HOLD_DAYS extra dates for its
+exits); only the re-entry filter runs on the combined candidates.
+
+The model is evaluated on the period it was trained on unless --start is past
+the training data, so in-sample results flatter it.
+
+Usage:
+    python backtest.py [--start 2023-01-01] [--end 2024-12-31] [--workers 4]
+"""
+
+import os
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import bar_store
+import symbol_master
+from feature_engineering import OUTPUT_CSV as FEATURES_CSV
+from feature_kernel import FEATURE_COLS, OHLCV, KEY
+from label_training_data import forward_window, first_touch, rows_left_in_symbol
+from pick_tracker import CONFIDENCE_THRESHOLD, MIN_TARGET_PCT, TOP_N, STOP_PCT, MAX_HOLD_DAYS
+from scanner import MODEL_PATH, MIN_BARS, load_scanner_model, target_prices, screen_reasons
+
+TRADES_CSV = "backtest_trades.csv"
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+DATES_PER_CHUNK = 120     # entry dates per process-pool task
+
+
+def load_panel(path=FEATURES_CSV):
+    """The feature panel, sorted by (symbol_id, timestamp), with each row's bar number within its symbol."""
+    df = pd.read_csv(path, parse_dates=["timestamp"], dtype={KEY: np.int32})
+    df = df.sort_values([KEY, "timestamp"], kind="mergesort").reset_index(drop=True)
+    df["bar_no"] = df.groupby(KEY, sort=False).cumcount()
+    return df
+
+
+def candidate_trades(frame, model, feature_list, last_entry=None, horizon=MAX_HOLD_DAYS,
+                     threshold=CONFIDENCE_THRESHOLD, min_target_pct=MIN_TARGET_PCT, top_n=TOP_N):
+    """
+    Picks and their exits for one (symbol_id, timestamp)-sorted slice of the panel.
+    Rows after `last_entry` only serve as forward bars. Ignores re-entry; see
+    filter_open_overlaps.
+    """
+    symbols = frame[KEY].to_numpy()
+    ts = frame["timestamp"].to_numpy()
+    close = frame["close"].to_numpy(dtype=float)
+    scorable = (frame["bar_no"].to_numpy() >= MIN_BARS - 1) & ~frame[FEATURE_COLS + OHLCV].isna().any(axis=1).to_numpy()
+    scorable &= screen_reasons(close, frame["volume"], frame["high"], frame["low"]) == ""
+    if last_entry is not None:
+        scorable &= ts <= np.datetime64(last_entry)
+    rows = np.flatnonzero(scorable)
+    if not len(rows):
+        return pd.DataFrame()
+
+    X = frame.iloc[rows].reindex(columns=feature_list, fill_value=0).astype(float)
+    score = np.round(model.predict_proba(X)[:, 1], 4)
+    target = np.round(target_prices(score, frame["ATR14"].to_numpy()[rows], close[rows], close[rows]), 2)
+
+    # select_top_picks, for every day at once
+    keep = (score >= threshold) & (target / close[rows] - 1 >= min_target_pct)
+    rows, score, target = rows[keep], score[keep], target[keep]
+    order = np.lexsort((-score, ts[rows]))
+    rows, score, target = rows[order], score[order], target[order]
+    day = ts[rows]
+    starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    top = rank < top_n
+    rows, score, target = rows[top], score[top], target[top]
+
+    # evaluate_open_picks on each following bar
+    entry = close[rows]
+    stop = np.round(entry * (1 - STOP_PCT), 2)
+    rows_left = rows_left_in_symbol(symbols)
+    fwd_low = forward_window(frame["low"].to_numpy(), rows_left, horizon)[rows]
+    fwd_high = forward_window(frame["high"].to_numpy(), rows_left, horizon)[rows]
+    fwd_close = forward_window(close, rows_left, horizon)[rows]
+    stop_k = first_touch(fwd_low <= stop[:, None])
+    hit_k = first_touch(fwd_high >= target[:, None])
+    stopped = stop_k <= hit_k
+    exit_k = np.minimum(stop_k, hit_k)
+    complete = rows_left[rows] >= horizon
+    outcome = np.select([stopped & (exit_k < horizon), exit_k < horizon, complete], ["Stop", "Hit", "Expired"],
+                        default="Open")
+    exit_k = np.where(outcome == "Expired", horizon - 1, exit_k)
+    last_close = fwd_close[np.arange(len(rows)), np.minimum(exit_k, horizon - 1)]
+    exit_price = np.select([outcome == "Stop", outcome == "Hit", outcome == "Expired"], [stop, target, last_close],
+                           default=np.nan)
+    exit_row = np.where(outcome == "Open", -1, rows + exit_k + 1)
+
+    return pd.DataFrame({
+        KEY: symbols[rows],
+        "picked_at": ts[rows],
+        "entry_price": entry,
+        "stop_price": stop,
+        "target_price": target,
+        "score": score,
+        "dropped_at": np.where(exit_row >= 0, ts[np.maximum(exit_row, 0)], np.datetime64("NaT")),
+        "exit_price": exit_price,
+        "target_hit": outcome,
+        "held_bars": np.where(outcome == "Open", rows_left[rows], exit_k + 1),
+    })
+
+
+def filter_open_overlaps(trades):
+    """
+    Drop picks of a symbol that is still open (including on its exit day, since
+    the tracker records a scan's picks before evaluating). Follows, for all
+    symbols at once, each accepted trade's pointer to its symbol's next entry
+    after its exit.
+    """
+    if trades.empty:
+        return trades
+    trades = trades.sort_values([KEY, "picked_at"], kind="mergesort").reset_index(drop=True)
+    dates = np.unique(trades["picked_at"].to_numpy())
+    n_dates = len(dates) + 1
+    sym = pd.factorize(trades[KEY])[0].astype(np.int64)
+    entry_key = sym * (n_dates + 1) + np.searchsorted(dates, trades["picked_at"].to_numpy())
+    dropped = trades["dropped_at"].to_numpy()
+    exit_pos = np.where(pd.isna(dropped), n_dates, np.searchsorted(dates, dropped, side="right") - 1)
+    nxt = np.searchsorted(entry_key, sym * (n_dates + 1) + exit_pos, side="right")
+    nxt = np.where((nxt < len(trades)) & (sym[np.minimum(nxt, len(trades) - 1)] == sym), nxt, -1)
+
+    accepted = np.zeros(len(trades), dtype=bool)
+    cur = np.flatnonzero(np.r_[True, sym[1:] != sym[:-1]])     # each symbol's first pick
+    while len(cur):
+        accepted[cur] = True
+        cur = nxt[cur]
+        cur = cur[cur >= 0]
+    return trades[accepted].sort_values(["picked_at", "score"], ascending=[True, False],
+                                        kind="mergesort").reset_index(drop=True)
+
+
+_worker_model = None   # (model, feature_list), loaded once per pool worker by _init_worker
+
+
+def _init_worker(model_path):
+    """Process-pool initializer: load the (mmap) model once, quietly; the parent already reports it."""
+    global _worker_model
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        _worker_model = load_scanner_model(model_path)
+
+
+def _chunk_trades(frame, last_entry, rules):
+    """Process-pool task: simulate one date range with the worker's model."""
+    model, feature_list = _worker_model
+    return candidate_trades(frame, model, feature_list, last_entry, **rules)
+
+
+def _chunks(panel, dates_per_chunk, horizon):
+    """(slice, last entry date) per date range; each slice also holds the next `horizon` dates."""
+    dates = np.unique(panel["timestamp"].to_numpy())
+    ts = panel["timestamp"].to_numpy()
+    for i in range(0, len(dates), dates_per_chunk):
+        first, last = dates[i], dates[min(i + dates_per_chunk, len(dates)) - 1]
+        through = dates[min(i + dates_per_chunk + horizon, len(dates)) - 1]
+        yield panel[(ts >= first) & (ts <= through)], last
+
+
+def run_backtest(panel, model_path=MODEL_PATH, model=None, feature_list=None, start=None, end=None,
+                 workers=BACKTEST_WORKERS, dates_per_chunk=DATES_PER_CHUNK, **rules):
+    """
+    Trades the dashboard rules would have taken on `panel` (see load_panel),
+    with entries between `start` and `end`. `rules` overrides threshold /
+    min_target_pct / top_n for what-if runs. Returns a trades DataFrame.
+    """
+    ts = panel["timestamp"]
+    if start is not None:
+        panel = panel[ts >= pd.Timestamp(start)]     # bar_no still counts earlier history
+    if end is not None:
+        # keep MAX_HOLD_DAYS dates past `end` so the last entries can exit
+        later = np.unique(panel["timestamp"][panel["timestamp"] > pd.Timestamp(end)])[:MAX_HOLD_DAYS]
+        panel = panel[panel["timestamp"] <= (later[-1] if len(later) else pd.Timestamp(end))]
+    last_entry = pd.Timestamp(end) if end is not None else None
+
+    chunks = [(frame, last if last_entry is None else min(last, np.datetime64(last_entry)))
+              for frame, last in _chunks(panel, dates_per_chunk, MAX_HOLD_DAYS)]
+    if model is None and workers > 1 and len(chunks) > 1:
+        print(f"Backtesting {len(chunks)} date ranges on {min(workers, len(chunks))} workers with {model_path}")
+        with ProcessPoolExecutor(min(workers, len(chunks)), initializer=_init_worker, initargs=(model_path,)) as pool:
+            parts = list(pool.map(_chunk_trades, *zip(*chunks), [rules] * len(chunks)))
+    else:
+        if model is None:
+            model, feature_list = load_scanner_model(model_path)
+        parts = [candidate_trades(frame, model, feature_list, last, **rules) for frame, last in chunks]
+    parts = [p for p in parts if not p.empty]
+    trades = filter_open_overlaps(pd.concat(parts, ignore_index=True) if parts else pd.DataFrame())
+    if not trades.empty:
+        trades["pct_change"] = ((trades["exit_price"] / trades["entry_price"] - 1) * 100).round(2)
+    return trades
+
+
+def summarize(trades):
+    """Headline numbers; hit rate is Hit / closed trades, as on the dashboard."""
+    if trades.empty:
+        return {"trades": 0}
+    closed = trades[trades["target_hit"] != "Open"]
+    counts = closed["target_hit"].value_counts()
+    returns = closed["pct_change"] / 100
+    return {
+        "trades": len(trades),
+        "closed": len(closed),
+        "hit": int(counts.get("Hit", 0)),
+        "stop": int(counts.get("Stop", 0)),
+        "expired": int(counts.get("Expired", 0)),
+        "hit_rate_pct": round(counts.get("Hit", 0) / len(closed) * 100, 2) if len(closed) else 0.0,
+        "avg_return_pct": round(returns.mean() * 100, 3) if len(closed) else 0.0,
+        "total_return_pct": round(returns.sum() * 100, 2),
+        "avg_held_bars": round(closed["held_bars"].mean(), 2) if len(closed) else 0.0,
+        "first_pick": str(trades["picked_at"].min().date()),
+        "last_pick": str(trades["picked_at"].max().date()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the model with the dashboard's pick and exit rules")
+    parser.add_argument("--features", default=FEATURES_CSV, help="feature panel CSV (feature_engineering.py output)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--start", default=None, help="first entry date (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="last entry date (YYYY-MM-DD)")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD, help="minimum model score")
+    parser.add_argument("--min-target-pct", type=float, default=MIN_TARGET_PCT, help="minimum target above price")
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS)
+    parser.add_argument("--out", default=TRADES_CSV)
+    args = parser.parse_args()
+
+    panel = load_panel(args.features)
+    print(f"Panel: {panel[KEY].nunique()} symbols, {panel['timestamp'].nunique()} dates, {len(panel):,} rows")
+    trades = run_backtest(panel, args.model, start=args.start, end=args.end, workers=args.workers,
+                          threshold=args.threshold, min_target_pct=args.min_target_pct)
+    if len(trades):     # broker symbols next to the ids, for reading the report
+        trades.insert(1, "symbol", symbol_master.load(bar_store.connect()).symbols(trades[KEY]))
+    trades.to_csv(args.out, index=False)
+    for k, v in summarize(trades).items():
+        print(f"  {k:18s} {v}")
+    print(f"✅ {len(trades)} trades saved to {args.out}")
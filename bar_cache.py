@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+bar_cache.py
+
+Daily-bar cache under scanner.fetch_recent_bars.
+
+Completed sessions never change, so each symbol's history is fetched in full
+only once per trading day (a miss). The completed bars are kept in memory and
+in the bar store; later scans that day (hits) only need today's partial bar,
+built from the live quote when one is available, else fetched alone. A quote
+whose last trade is not from today's session (weekends, holidays, pre-open)
+still holds the previous session's prices, so it yields no partial bar.
+The cache invalidates itself when the IST date changes.
+"""
+
+import logging
+import threading
+import zoneinfo
+from datetime import datetime
+import pandas as pd
+import bar_store
+import symbol_master
+
+IST = zoneinfo.ZoneInfo("Asia/Kolkata")
+
+SYNC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bar_sync (
+    symbol_id INTEGER PRIMARY KEY,  -- symbol_master id
+    synced_on TEXT NOT NULL         -- IST date of the last full history fetch
+);
+"""
+
+
+def ist_today():
+    return datetime.now(IST).date()
+
+
+def session_epoch(day):
+    """Epoch seconds FYERS uses for a daily candle: midnight IST of that day."""
+    return int(datetime(day.year, day.month, day.day, tzinfo=IST).timestamp())
+
+
+def bar_dates(ts):
+    """IST trading dates for a column of naive-UTC bar timestamps."""
+    return pd.to_datetime(ts).dt.tz_localize("UTC").dt.tz_convert(IST).dt.date
+
+
+def quote_trade_date(quote):
+    """IST date of a quote's last trade ("tt", epoch seconds), or None."""
+    try:
+        return datetime.fromtimestamp(int(float(quote["tt"])), IST).date()
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def partial_bar_from_quote(quote, day):
+    """
+    The bar of session `day` so far, from a scanner quote dict; None if the
+    quote lacks OHLC or its last trade is from another session.
+    """
+    if not quote or any(quote.get(k) is None for k in ("open", "high", "low", "ltp")):
+        return None
+    if quote_trade_date(quote) != day:
+        return None
+    return pd.DataFrame([{
+        "ts": pd.to_datetime(session_epoch(day), unit="s"),
+        "open": quote["open"], "high": quote["high"], "low": quote["low"],
+        "close": quote["ltp"], "volume": quote.get("volume", 0),
+    }])
+
+
+class DailyBarCache:
+    def __init__(self, fetch_fn, conn=None):
+        """
+        fetch_fn(symbol, fyers, date_from, date_to) -> DataFrame with
+        ts, open, high, low, close, volume (ts naive UTC, as scanner returns).
+        """
+        self.fetch_fn = fetch_fn
+        self.conn = conn or bar_store.connect()
+        self.conn.executescript(SYNC_SCHEMA)
+        self.session_date = None
+        self._completed = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _roll(self):
+        today = ist_today()
+        if today != self.session_date:
+            if self.session_date is not None:
+                logging.info(f"Bar cache: new session {today}, dropping {len(self._completed)} cached symbols")
+            self._completed = {}
+            self.session_date = today
+        return today
+
+    def _load_synced(self, symbol, today, days):
+        """Completed bars from the store, if this symbol was fully synced today."""
+        with self._lock:
+            symbol_id = symbol_master.load(self.conn).id_of(symbol)
+            if symbol_id is None:
+                return None
+            row = self.conn.execute("SELECT synced_on FROM bar_sync WHERE symbol_id = ?", (symbol_id,)).fetchone()
+            if not row or row[0] != today.isoformat():
+                return None
+            df = bar_store.read_recent_bars(self.conn, symbol_id, days + 1)
+        df = df.rename(columns={"timestamp": "ts"}).drop(columns="symbol_id")
+        df["ts"] = pd.to_datetime(df["ts"], unit="s")
+        return df[bar_dates(df["ts"]) < today].tail(days).reset_index(drop=True)
+
+    def _store_completed(self, symbol, completed, today):
+        with self._lock:
+            symbol_id = int(symbol_master.register(self.conn, [symbol])[0])
+            rows = completed.rename(columns={"ts": "timestamp"}).assign(symbol_id=symbol_id)
+            if not rows.empty:
+                bar_store.upsert_bars(self.conn, rows)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO bar_sync (symbol_id, synced_on) VALUES (?, ?)",
+                                  (symbol_id, today.isoformat()))
+
+    def _keep(self, symbol, completed, today):
+        """Cache a symbol's completed bars, unless the session rolled over meanwhile."""
+        with self._lock:
+            if self.session_date == today:
+                self._completed[symbol] = completed
+
+    def get_bars(self, symbol, fyers, days=30, quote=None):
+        with self._lock:
+            today = self._roll()
+            completed = self._completed.get(symbol)
+        if completed is None:
+            completed = self._load_synced(symbol, today, days)
+        if completed is not None:
+            with self._lock:
+                self.hits += 1
+            self._keep(symbol, completed, today)
+            if quote and quote_trade_date(quote) != today:
+                return completed.tail(days).reset_index(drop=True)   # no trade yet this session
+            partial = partial_bar_from_quote(quote, today)
+            if partial is None:
+                today_ts = pd.Timestamp(today)
+                partial = self.fetch_fn(symbol, fyers, today_ts, today_ts)
+                partial = partial[bar_dates(partial["ts"]) == today] if not partial.empty else partial
+            parts = [df for df in (completed, partial) if not df.empty]
+            bars = pd.concat(parts, ignore_index=True) if parts else completed
+            return bars.tail(days).reset_index(drop=True)
+
+        with self._lock:
+            self.misses += 1
+        date_to = pd.Timestamp(today)
+        full = self.fetch_fn(symbol, fyers, date_to - pd.Timedelta(days=days * 1.5), date_to)
+        if full.empty:
+            return full
+        completed = full[bar_dates(full["ts"]) < today].reset_index(drop=True)
+        self._store_completed(symbol, completed, today)
+        self._keep(symbol, completed.tail(days).reset_index(drop=True), today)
+        return full.tail(days).reset_index(drop=True)
+
+    def completed(self, symbol):
+        """This session's cached completed bars for a symbol, or None."""
+        with self._lock:
+            return self._completed.get(symbol) if self.session_date == ist_today() else None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "symbols_cached": len(self._completed),
+            "session_date": str(self.session_date),
+        }
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+bar_store.py
+
+Daily OHLCV bars in an indexed SQLite table keyed by (symbol_id, timestamp),
+replacing the flat nse_daily_bars_fyers.csv. Symbol ids are the int32 ids of
+symbol_master, whose `symbols` table lives in the same database; a store
+keyed by symbol string is re-keyed in place on first connect.
+
+- upsert_bars: insert or update a day's bars in one statement (no full-file rewrite)
+- read_bars / read_bars_from / read_recent_bars: range reads by symbol id and date
+- migrate_csv: one-time import of the legacy CSV
+- content_digest: fingerprint of the bars (write revision plus aggregates), used
+  by the retrain pipeline's stage cache
+
+Usage:
+    python bar_store.py migrate      # import nse_daily_bars_fyers.csv
+    python bar_store.py info         # row/symbol counts and date range
+"""
+
+import os
+import sys
+import sqlite3
+import numpy as np
+import pandas as pd
+import symbol_master
+
+BARS_DB    = os.getenv("BARS_DB", "nse_daily_bars.db")
+LEGACY_CSV = "nse_daily_bars_fyers.csv"
+COLUMNS    = ["symbol_id", "timestamp", "open", "high", "low", "close", "volume"]
+
+BARS_TABLE = """
+CREATE TABLE IF NOT EXISTS bars (
+    symbol_id INTEGER NOT NULL,   -- symbol_master id
+    timestamp INTEGER NOT NULL,   -- epoch seconds, as returned by FYERS history
+    open      REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (symbol_id, timestamp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_bars_timestamp ON bars (timestamp);
+"""
+SCHEMA = BARS_TABLE + symbol_master.SCHEMA + """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def connect(path=BARS_DB):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _rekey_by_symbol_id(conn)
+    return conn
+
+
+def _rekey_by_symbol_id(conn):
+    """One-time move of a store keyed by symbol string onto symbol ids. No-op once done."""
+    if "symbol" not in [r[1] for r in conn.execute("PRAGMA table_info(bars)")]:
+        return
+    symbols = [r[0] for r in conn.execute("SELECT DISTINCT symbol FROM bars")]
+    ids = symbol_master.register(conn, symbols)
+    statements = [s.strip() for s in BARS_TABLE.split(";") if s.strip()]
+    with conn:
+        conn.execute("BEGIN")               # one transaction, DDL included
+        conn.execute("DROP INDEX IF EXISTS idx_bars_timestamp")
+        conn.execute("ALTER TABLE bars RENAME TO bars_by_symbol")
+        for stmt in statements:
+            conn.execute(stmt)
+        conn.execute("CREATE TEMP TABLE symbol_keys (symbol TEXT PRIMARY KEY, symbol_id INTEGER)")
+        conn.executemany("INSERT INTO symbol_keys VALUES (?, ?)", zip(symbols, ids.tolist()))
+        conn.execute("""
+            INSERT INTO bars (symbol_id, timestamp, open, high, low, close, volume)
+            SELECT k.symbol_id, b.timestamp, b.open, b.high, b.low, b.close, b.volume
+            FROM bars_by_symbol b JOIN symbol_keys k ON k.symbol = b.symbol
+        """)
+        conn.execute("DROP TABLE bars_by_symbol")
+        conn.execute("DROP TABLE symbol_keys")
+        # bar_cache's per-day sync markers were keyed by string too; the next scan re-syncs
+        conn.execute("DROP TABLE IF EXISTS bar_sync")
+
+
+def to_epoch(value):
+    """Accept epoch seconds, date strings, datetimes or Timestamps."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(pd.Timestamp(value).timestamp())
+
+
+def _timestamps_to_epoch(ts):
+    if pd.api.types.is_numeric_dtype(ts):
+        return ts.astype("int64")
+    return (pd.to_datetime(ts) - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+
+
+def upsert_bars(conn, bars):
+    """
+    Insert or update bars. `bars` is a DataFrame with COLUMNS or an iterable of
+    dicts with those keys; at the API edge a broker `symbol` may stand in for
+    symbol_id (new symbols are registered). Returns the number of rows inserted or changed.
+    """
+    df = bars if isinstance(bars, pd.DataFrame) else pd.DataFrame(list(bars))
+    if df.empty:
+        return 0
+    if "symbol_id" not in df:
+        df = df.assign(symbol_id=symbol_master.register(conn, df["symbol"]))
+    df = df[COLUMNS].copy()
+    df["timestamp"] = _timestamps_to_epoch(df["timestamp"])
+    before = conn.total_changes
+    with conn:
+        conn.executemany("""
+            INSERT INTO bars (symbol_id, timestamp, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (symbol_id, timestamp) DO UPDATE SET
+                open=excluded.open, high=excluded.high, low=excluded.low,
+                close=excluded.close, volume=excluded.volume
+            WHERE (open, high, low, close, volume)
+                IS NOT (excluded.open, excluded.high, excluded.low, excluded.close, excluded.volume)
+        """, df.itertuples(index=False, name=None))
+        changed = conn.total_changes - before
+        if changed:
+            # Same transaction as the rows: a committed write always moves the revision
+            conn.execute("""
+                INSERT INTO meta (key, value) VALUES ('revision', 1)
+                ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+            """)
+    return changed
+
+
+def _frame(df):
+    df["symbol_id"] = df["symbol_id"].astype(np.int32)
+    return df
+
+
+def read_bars(conn, symbol_ids=None, start=None, end=None):
+    """
+    Bars for `symbol_ids` (all if None) with start <= timestamp <= end, sorted
+    by symbol id then timestamp. Timestamps come back as epoch seconds, like the CSV.
+    """
+    where, params = [], []
+    if symbol_ids is not None:
+        symbol_ids = [int(i) for i in np.atleast_1d(symbol_ids)]
+        where.append(f"symbol_id IN ({','.join('?' * len(symbol_ids))})")
+        params += symbol_ids
+    if start is not None:
+        where.append("timestamp >= ?")
+        params.append(to_epoch(start))
+    if end is not None:
+        where.append("timestamp <= ?")
+        params.append(to_epoch(end))
+    sql = f"SELECT {', '.join(COLUMNS)} FROM bars"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY symbol_id, timestamp"
+    return _frame(pd.read_sql_query(sql, conn, params=params))
+
+
+def read_bars_from(conn, starts):
+    """
+    Bars with timestamp >= starts[symbol_id] for each symbol id in `starts`
+    ({symbol_id: epoch seconds}), sorted like read_bars. One indexed range
+    read per symbol, so a symbol with an old start only costs its own bars.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS read_starts (symbol_id INTEGER PRIMARY KEY, start INTEGER)")
+    with conn:
+        conn.execute("DELETE FROM read_starts")
+        conn.executemany("INSERT INTO read_starts VALUES (?, ?)",
+                         ((int(sid), to_epoch(ts)) for sid, ts in starts.items()))
+    cols = ", ".join(f"b.{c}" for c in COLUMNS)
+    return _frame(pd.read_sql_query(f"""
+        SELECT {cols} FROM read_starts s
+        JOIN bars b ON b.symbol_id = s.symbol_id AND b.timestamp >= s.start
+        ORDER BY b.symbol_id, b.timestamp
+    """, conn))
+
+
+def read_recent_bars(conn, symbol_id, days=30):
+    """Last `days` bars for one symbol id, oldest first."""
+    df = pd.read_sql_query(
+        f"SELECT {', '.join(COLUMNS)} FROM bars WHERE symbol_id = ? ORDER BY timestamp DESC LIMIT ?",
+        conn, params=[int(symbol_id), days],
+    )
+    return _frame(df.iloc[::-1].reset_index(drop=True))
+
+
+def list_symbol_ids(conn):
+    return [r[0] for r in conn.execute("SELECT DISTINCT symbol_id FROM bars ORDER BY symbol_id")]
+
+
+def bar_counts(conn):
+    """{symbol_id: number of bars} (served from the primary key index)."""
+    return dict(conn.execute("SELECT symbol_id, COUNT(*) FROM bars GROUP BY symbol_id"))
+
+
+def revision(conn):
+    """Write counter of the bars: bumped by every upsert_bars call that inserted or changed a row."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def content_digest(conn):
+    """
+    Fingerprint of the table's contents without reading the rows: the write
+    revision, so any change made through upsert_bars shows (including
+    revisions whose sums cancel out), plus row count, time range and column
+    totals, which also catch rows added or deleted behind its back. Unlike
+    the file bytes it ignores page layout and un-checkpointed WAL frames.
+    """
+    row = conn.execute("""
+        SELECT COUNT(*), MIN(timestamp), MAX(timestamp), TOTAL(timestamp),
+               TOTAL(open), TOTAL(high), TOTAL(low), TOTAL(close), TOTAL(volume),
+               COUNT(DISTINCT symbol_id)
+        FROM bars
+    """).fetchone()
+    return repr((revision(conn),) + row)
+
+
+def migrate_csv(conn, csv_path=LEGACY_CSV, chunksize=200_000, force=False):
+    """One-time import of the legacy bar CSV. Returns rows imported (0 if already done)."""
+    done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_from'").fetchone()
+    if (done and not force) or not os.path.exists(csv_path):
+        return 0
+    imported = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        chunk = chunk.dropna(subset=["symbol", "timestamp"])
+        imported += upsert_bars(conn, chunk)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)", (csv_path,))
+    return imported
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "info"
+    conn = connect()
+    if cmd == "migrate":
+        n = migrate_csv(conn, force="--force" in sys.argv)
+        print(f"✅ Imported {n} bars from {LEGACY_CSV} into {BARS_DB}")
+    rows, syms, lo, hi = conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT symbol_id), MIN(timestamp), MAX(timestamp) FROM bars").fetchone()
+    span = f"{pd.Timestamp(lo, unit='s').date()} → {pd.Timestamp(hi, unit='s').date()}" if rows else "empty"
+    print(f"{BARS_DB}: {rows} bars, {syms} symbols, {span}")
@@ -0,0 +1,705 @@
+#!/usr/bin/env python3
+"""
+benchmarks.py
+
+Offline benchmarks and parity checks on synthetic data (no broker access needed).
+Broker calls go to fake_fyers.FakeFyersClient (FYERS_CLIENT=fake), with
+optional simulated latency and error rates.
+
+Every run appends one JSON line (environment, parameters, results) to
+bench_results.jsonl, or to --out, so runs can be compared over time.
+
+Usage:
+    python benchmarks.py features [--symbols 200] [--days 750] [--no-reference]
+    python benchmarks.py labels   [--symbols 200] [--days 750] [--no-reference]
+    python benchmarks.py label-grid [--symbols 200] [--days 750]
+    python benchmarks.py streaming [--symbols 200]
+    python benchmarks.py model    [--symbols 200] [--days 750]
+    python benchmarks.py training-load [--symbols 200] [--days 750]
+    python benchmarks.py feature-build [--symbols 200] [--days 750] [--workers 4] [--partition-size 50]
+    python benchmarks.py training [--symbols 200] [--years 3]
+    python benchmarks.py scanner  [--symbols 200] [--latency 0.02] [--error-rate 0.01]
+    python benchmarks.py dashboard [--picks 5000]
+    python benchmarks.py backtest [--symbols 200] [--years 3] [--workers 4]
+    python benchmarks.py suite    [--symbols 200] [--years 3] [--out bench_results.jsonl]
+"""
+
+import os
+import json
+import time
+import platform
+import argparse
+import subprocess
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("FYERS_CLIENT", "fake")   # before fyers_connect is imported: never call the broker
+
+BENCH_LOG = "bench_results.jsonl"
+TRADING_DAYS_PER_YEAR = 252
+
+from feature_engineering import add_features
+from feature_kernel import KEY
+from label_training_data import label_swing_trades
+from streaming_indicators import IndicatorBook
+
+FEATURE_COLS = [
+    "EMA5", "EMA20", "EMA_diff", "RSI14", "MACD", "MACD_sig", "MACD_hist",
+    "BB_%B", "BB_bandwidth", "ATR14", "OBV"
+]
+
+
+def make_synthetic_bars(n_symbols=200, n_days=750, seed=42, start="2022-01-03"):
+    """Deterministic random-walk daily OHLCV bars, shaped like the bar store output (symbol ids 0..n-1)."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start, periods=n_days)
+    epoch = ((days - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).to_numpy()
+    base = rng.uniform(50, 3000, size=(n_symbols, 1))
+    rets = rng.normal(0.0003, 0.018, size=(n_symbols, n_days))
+    close = base * np.exp(np.cumsum(rets, axis=1))
+    open_ = close * (1 + rng.normal(0, 0.004, size=close.shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, size=close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, size=close.shape)))
+    volume = rng.integers(1_000, 2_000_000, size=close.shape)
+    return pd.DataFrame({
+        KEY: np.repeat(np.arange(n_symbols, dtype=np.int32), n_days),
+        "timestamp": np.tile(epoch, n_symbols),
+        "open": open_.round(2).ravel(),
+        "high": high.round(2).ravel(),
+        "low": low.round(2).ravel(),
+        "close": close.round(2).ravel(),
+        "volume": volume.ravel(),
+    })
+
+
+def synthetic_symbols(ids):
+    """Broker symbols for synthetic symbol ids: id i is NSE:SYN{i:04d}-EQ."""
+    ids = np.asarray(ids)
+    names = np.array([f"NSE:SYN{i:04d}-EQ" for i in range(ids.max() + 1 if len(ids) else 0)], dtype=object)
+    return names[ids]
+
+
+def _add_features_reference(df):
+    """The original per-symbol loop implementation, kept only for parity checks."""
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit='s')
+    df = df.sort_values([KEY, "timestamp"]).reset_index(drop=True)
+    result_frames = []
+    for symbol, group in df.groupby(KEY):
+        g = group.copy()
+        g["EMA5"] = g["close"].ewm(span=5, adjust=False).mean()
+        g["EMA20"] = g["close"].ewm(span=20, adjust=False).mean()
+        g["EMA_diff"] = g["EMA5"] - g["EMA20"]
+        delta = g["close"].diff()
+        up = np.where(delta > 0, delta, 0)
+        down = np.where(delta < 0, -delta, 0)
+        # index=g.index: the original used a fresh RangeIndex here, which misaligned
+        # RSI14 for every symbol but the first; the reference keeps the intended values
+        roll_up = pd.Series(up, index=g.index).rolling(window=14, min_periods=1).mean()
+        roll_down = pd.Series(down, index=g.index).rolling(window=14, min_periods=1).mean()
+        rs = roll_up / (roll_down + 1e-8)
+        g["RSI14"] = 100 - (100 / (1 + rs))
+        ema12 = g["close"].ewm(span=12, adjust=False).mean()
+        ema26 = g["close"].ewm(span=26, adjust=False).mean()
+        g["MACD"] = ema12 - ema26
+        g["MACD_sig"] = g["MACD"].ewm(span=9, adjust=False).mean()
+        g["MACD_hist"] = g["MACD"] - g["MACD_sig"]
+        ma20 = g["close"].rolling(window=20, min_periods=1).mean()
+        std20 = g["close"].rolling(window=20, min_periods=1).std()
+        g["BB_upper"] = ma20 + 2 * std20
+        g["BB_lower"] = ma20 - 2 * std20
+        g["BB_%B"] = (g["close"] - g["BB_lower"]) / (g["BB_upper"] - g["BB_lower"] + 1e-8)
+        g["BB_bandwidth"] = (g["BB_upper"] - g["BB_lower"]) / (ma20 + 1e-8)
+        prev_close = g["close"].shift()
+        tr = pd.concat([
+            g["high"] - g["low"],
+            (g["high"] - prev_close).abs(),
+            (g["low"] - prev_close).abs()
+        ], axis=1).max(axis=1)
+        g["ATR14"] = tr.rolling(window=14, min_periods=1).mean()
+        obv = [0]
+        for i in range(1, len(g)):
+            if g["close"].iloc[i] > g["close"].iloc[i-1]:
+                obv.append(obv[-1] + g["volume"].iloc[i])
+            elif g["close"].iloc[i] < g["close"].iloc[i-1]:
+                obv.append(obv[-1] - g["volume"].iloc[i])
+            else:
+                obv.append(obv[-1])
+        g["OBV"] = obv
+        result_frames.append(g)
+    features = pd.concat(result_frames).sort_values([KEY, "timestamp"]).reset_index(drop=True)
+    return features[[KEY, "timestamp", "open", "high", "low", "close", "volume"] + FEATURE_COLS]
+
+
+def _label_swing_trades_reference(df, profit_target=0.03, horizon=3):
+    """The original per-row loop (close-only, target-only), kept only for parity checks."""
+    df = df.sort_values([KEY, "timestamp"]).reset_index(drop=True)
+    df["label"] = 0
+    for symbol in df[KEY].unique():
+        sub = df[df[KEY] == symbol].reset_index()
+        closes = sub["close"].values
+        for i in range(len(sub) - horizon):
+            entry = closes[i]
+            max_close = max(closes[i+1:i+1+horizon])
+            if (max_close - entry) / entry >= profit_target:
+                df.loc[sub.loc[i, "index"], "label"] = 1
+            else:
+                df.loc[sub.loc[i, "index"], "label"] = 0
+    return df
+
+
+def _load_training_reference(csv_path, test_size=0.15, random_state=42):
+    """The original train_model.py load: full float64/object frame, frame-wide medians, copies."""
+    from sklearn.model_selection import train_test_split
+    from train_model import FEATURE_COLS as TRAIN_COLS
+
+    df = pd.read_csv(csv_path)
+    feature_cols = [f for f in TRAIN_COLS if f in df.columns]
+    df[feature_cols] = df[feature_cols].fillna(df[feature_cols].median())
+    df = df.dropna(subset=["label"])
+    X, y = df[feature_cols], df["label"]
+    return train_test_split(X, y, test_size=test_size, random_state=random_state, shuffle=True)
+
+
+def assert_frames_close(new, ref, cols, rtol=1e-9, atol=1e-9):
+    """Raise AssertionError naming the first column that differs beyond tolerance."""
+    assert len(new) == len(ref), f"row count {len(new)} != {len(ref)}"
+    assert (new[KEY].values == ref[KEY].values).all(), "symbol order differs"
+    assert (new["timestamp"].values == ref["timestamp"].values).all(), "timestamp order differs"
+    for col in cols:
+        a = new[col].to_numpy(dtype=float)
+        b = ref[col].to_numpy(dtype=float)
+        ok = np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+        assert ok.all(), f"{col}: {(~ok).sum()} rows differ, max abs diff {np.nanmax(np.abs(a - b)):.3g}"
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def bench_features(n_symbols, n_days, reference=True):
+    bars = make_synthetic_bars(n_symbols, n_days)
+    rows = len(bars)
+    print(f"Synthetic bars: {n_symbols} symbols × {n_days} days = {rows:,} rows")
+
+    new, secs = _timed(add_features, bars.copy())
+    print(f"add_features:           {secs:8.3f}s  {rows / secs:>12,.0f} rows/s")
+    result = {"rows": rows, "add_features_sec": secs, "add_features_rows_per_sec": rows / secs}
+
+    if reference:
+        ref, ref_secs = _timed(_add_features_reference, bars.copy())
+        print(f"reference (per-symbol): {ref_secs:8.3f}s  {rows / ref_secs:>12,.0f} rows/s"
+              f"  → {ref_secs / secs:.1f}× speed-up")
+        assert_frames_close(new, ref, FEATURE_COLS)
+        print("✅ Parity: all feature columns match the per-symbol reference")
+        result.update(reference_sec=ref_secs, speedup=ref_secs / secs)
+    return result
+
+
+def bench_labels(n_symbols, n_days, reference=True):
+    bars = make_synthetic_bars(n_symbols, n_days)
+    rows = len(bars)
+    print(f"Synthetic bars: {n_symbols} symbols × {n_days} days = {rows:,} rows")
+
+    labeled, secs = _timed(label_swing_trades, bars)
+    print(f"label_swing_trades (path-aware): {secs:8.3f}s  {rows / secs:>12,.0f} rows/s"
+          f"  base rate {labeled['label'].mean():.3f}")
+    close_only, close_secs = _timed(lambda d: label_swing_trades(d, path_aware=False), bars)
+    print(f"label_swing_trades (close-only): {close_secs:8.3f}s  {rows / close_secs:>12,.0f} rows/s"
+          f"  base rate {close_only['label'].mean():.3f}")
+    result = {"rows": rows, "label_sec": secs, "label_rows_per_sec": rows / secs}
+
+    if reference:
+        ref, ref_secs = _timed(_label_swing_trades_reference, bars)
+        print(f"reference (per-row loop):        {ref_secs:8.3f}s  {rows / ref_secs:>12,.0f} rows/s"
+              f"  → {ref_secs / close_secs:.1f}× speed-up")
+        assert (close_only["label"].values == ref["label"].values).all(), "close-only labels differ from reference"
+        print("✅ Parity: close-only labels match the per-row reference")
+        result.update(reference_sec=ref_secs, speedup=ref_secs / close_secs)
+    return result
+
+
+def bench_label_grid(n_symbols, n_days):
+    """One-pass grid labeling vs calling label_swing_trades once per config, with exact parity."""
+    from label_training_data import label_grid, label_column, GRID_TARGETS, GRID_STOPS, GRID_HORIZONS
+
+    bars = make_synthetic_bars(n_symbols, n_days)
+    configs = [(t, s, h) for t in GRID_TARGETS for s in GRID_STOPS for h in GRID_HORIZONS]
+    print(f"Synthetic bars: {len(bars):,} rows × {len(configs)} configs")
+
+    (labels, stats), secs = _timed(label_grid, bars)
+    print(f"label_grid (one pass):       {secs:8.3f}s")
+    t0 = time.perf_counter()
+    for t, s, h in configs:
+        ref = label_swing_trades(bars, t, s, h)
+        assert (labels[label_column(t, s, h)].values == ref["label"].values).all(), f"{(t, s, h)} differs"
+    loop_secs = time.perf_counter() - t0
+    print(f"label_swing_trades per config: {loop_secs:8.3f}s  → {loop_secs / secs:.1f}× speed-up")
+    print(f"✅ Parity: all {len(configs)} label columns match label_swing_trades;"
+          f" base rates {stats['base_rate'].min():.3f}–{stats['base_rate'].max():.3f}")
+    return {"rows": len(bars), "configs": len(configs), "grid_sec": secs, "per_config_sec": loop_secs,
+            "speedup": loop_secs / secs}
+
+
+def bench_streaming(n_symbols, ticks_per_symbol=50):
+    """Seed per-symbol indicator state, apply and re-score live ticks, compare against the batch kernel."""
+    from scanner import compute_features
+
+    bars = make_synthetic_bars(n_symbols, 60)
+    ohlcv = ["open", "high", "low", "close", "volume"]
+    completed = {sym: g[ohlcv].iloc[:-1].reset_index(drop=True) for sym, g in bars.groupby(KEY, sort=False)}
+    today = {sym: g[ohlcv].iloc[-1] for sym, g in bars.groupby(KEY, sort=False)}
+
+    book = IndicatorBook()
+    _, seed_secs = _timed(book.seed_many, completed)
+    print(f"Seeded {len(book)} symbols in {seed_secs * 1e3:.1f}ms")
+
+    rng = np.random.default_rng(7)
+    t0 = time.perf_counter()
+    n = 0
+    for sym, bar in today.items():
+        for ltp in bar["close"] * (1 + rng.normal(0, 0.005, ticks_per_symbol)):
+            feats = book.update(sym, ltp, max(bar["high"], ltp), min(bar["low"], ltp), bar["open"], bar["volume"])
+            n += 1
+    per_tick = (time.perf_counter() - t0) / n
+    print(f"Tick update: {per_tick * 1e6:.1f}µs/tick over {n:,} ticks")
+
+    # Parity on the last tick of each symbol against the batch computation (must be exact)
+    for sym, bar in today.items():
+        ltp = bar["close"] * 1.003
+        hi, lo = max(bar["high"], ltp), min(bar["low"], ltp)
+        streamed = book.update(sym, ltp, hi, lo, bar["open"], bar["volume"])
+        window = pd.concat([completed[sym], pd.DataFrame([[bar["open"], hi, lo, ltp, bar["volume"]]], columns=ohlcv)],
+                           ignore_index=True)
+        batch = compute_features(window)
+        for k, v in batch.items():
+            assert streamed[k] == v, f"{sym} {k}: {streamed[k]!r} != {v!r}"
+    print("✅ Parity: streaming features equal the feature kernel bit-for-bit")
+
+    # Live re-scoring: the same tick through live_feed.LiveScorer and the compiled forest
+    from sklearn.ensemble import RandomForestClassifier
+    from forest_model import CompiledForest
+    from live_feed import LiveScorer
+    feature_cols = ohlcv + FEATURE_COLS
+    data = label_swing_trades(add_features(bars.copy())).dropna(subset=feature_cols + ["label"])
+    model = RandomForestClassifier(n_estimators=100, max_depth=8, min_samples_leaf=5, n_jobs=-1, random_state=42)
+    model.fit(data[feature_cols], data["label"])
+    forest = CompiledForest.from_sklearn(model, feature_cols)
+    scorer = LiveScorer(forest, feature_cols, completed)
+    t0 = time.perf_counter()
+    n = 0
+    for sym, bar in today.items():
+        for ltp in bar["close"] * (1 + rng.normal(0, 0.005, ticks_per_symbol)):
+            scorer.score(sym, ltp, max(bar["high"], ltp), min(bar["low"], ltp), bar["open"], bar["volume"])
+            n += 1
+    per_score = (time.perf_counter() - t0) / n
+    print(f"Tick re-score (features + compiled forest): {per_score * 1e6:.1f}µs/tick over {n:,} ticks")
+    rows = []
+    for sym, bar in today.items():
+        ltp = bar["close"] * 1.003
+        hi, lo = max(bar["high"], ltp), min(bar["low"], ltp)
+        rows.append(scorer.score(sym, ltp, hi, lo, bar["open"], bar["volume"]))
+        window = pd.concat([completed[sym], pd.DataFrame([[bar["open"], hi, lo, ltp, bar["volume"]]], columns=ohlcv)],
+                           ignore_index=True)
+        batch = compute_features(window)
+        ref = model.predict_proba(pd.DataFrame([[batch[c] for c in feature_cols]], columns=feature_cols))[0, 1]
+        assert abs(rows[-1] - ref) < 1e-12, f"{sym}: live score {rows[-1]!r} != {ref!r}"
+    print("✅ Parity: live tick scores equal sklearn on the kernel's features")
+    return {"symbols": n_symbols, "seed_sec": seed_secs, "tick_us": per_tick * 1e6, "rescore_us": per_score * 1e6}
+
+
+def bench_model(n_symbols, n_days):
+    """Pickle vs compiled forest: load time, scan-sized scoring, and predict_proba parity."""
+    import os
+    import joblib
+    import tempfile
+    from sklearn.ensemble import RandomForestClassifier
+    from forest_model import export_forest, CompiledForest, forest_path_for
+
+    feature_cols = ["open", "high", "low", "close", "volume"] + FEATURE_COLS
+    data = label_swing_trades(add_features(make_synthetic_bars(n_symbols, n_days)))
+    data = data.dropna(subset=feature_cols + ["label"])
+    model = RandomForestClassifier(n_estimators=200, max_depth=8, min_samples_leaf=5, n_jobs=-1, random_state=42)
+    model.fit(data[feature_cols], data["label"])
+    latest = data.groupby(KEY).tail(1)[feature_cols].astype(float)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ai_model.pkl")
+        joblib.dump((model, feature_cols), path)
+        export_forest(model, feature_cols, path)
+        (pickled, _), pkl_secs = _timed(joblib.load, path)
+        forest, load_secs = _timed(CompiledForest.load, forest_path_for(path))
+        print(f"Load:  pickle {pkl_secs * 1e3:8.1f}ms   compiled {load_secs * 1e3:8.1f}ms"
+              f"  → {pkl_secs / load_secs:.0f}× faster")
+
+        ref, sk_secs = _timed(pickled.predict_proba, latest)
+        got, cf_secs = _timed(forest.predict_proba, latest)
+        print(f"Score {len(latest)} symbols: sklearn {sk_secs * 1e3:8.1f}ms   compiled {cf_secs * 1e3:8.1f}ms")
+        assert np.allclose(got, ref, rtol=0, atol=1e-12), f"max abs diff {np.abs(got - ref).max():.3g}"
+        X = data[feature_cols].astype(float)
+        assert np.allclose(forest.predict_proba(X), pickled.predict_proba(X), rtol=0, atol=1e-12)
+        print(f"✅ Parity: compiled predict_proba matches sklearn on all {len(X):,} training rows")
+    return {"pickle_load_sec": pkl_secs, "compiled_load_sec": load_secs,
+            "sklearn_score_sec": sk_secs, "compiled_score_sec": cf_secs}
+
+
+def _child_main(fn_name, args, queue):
+    """Runs in a fresh (spawned) process so peak RSS measures one call only."""
+    from train_model import peak_rss_mb
+    baseline = peak_rss_mb()
+    t0 = time.perf_counter()
+    out = globals()[fn_name](*args)
+    queue.put((baseline, peak_rss_mb(), time.perf_counter() - t0, out))
+
+
+def _measure_in_child(fn_name, *args):
+    """(baseline RSS MB, peak RSS MB, seconds, return value) of benchmarks.<fn_name>(*args) in a new process."""
+    import multiprocessing as mp
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child_main, args=(fn_name, args, queue))
+    proc.start()
+    out = queue.get()
+    proc.join()
+    return out
+
+
+def _training_load_shape(which, csv_path, cache_dir):
+    from train_model import load_training_data
+    if which == "reference":
+        return _load_training_reference(csv_path)[0].shape
+    return load_training_data(csv_path, cache_dir)[0].shape
+
+
+def bench_training_load(n_symbols, n_days):
+    """Peak RSS of the original pandas load vs the typed columnar load, plus parity of the splits."""
+    import os
+    import tempfile
+    from train_model import load_training_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, cache_dir = os.path.join(tmp, "labeled.csv"), os.path.join(tmp, "cols")
+        data = label_swing_trades(add_features(make_synthetic_bars(n_symbols, n_days)))
+        data.to_csv(csv_path, index=False)
+        print(f"Labeled CSV: {len(data):,} rows, {os.path.getsize(csv_path) / 2**20:.0f} MB")
+        del data
+        load_training_data(csv_path, cache_dir)     # build the columnar cache outside the measurement
+
+        result = {}
+        for which in ("reference", "columnar"):
+            baseline, peak, secs, shape = _measure_in_child("_training_load_shape", which, csv_path, cache_dir)
+            print(f"{which:9s}: peak RSS {peak:7.0f} MB (+{peak - baseline:.0f} MB over imports)  {secs:6.2f}s  X_train {shape}")
+            result[which] = {"peak_rss_mb": peak, "load_rss_mb": peak - baseline, "sec": secs}
+
+        ref_train, ref_test, ref_ytrain, ref_ytest = _load_training_reference(csv_path)
+        X_train, X_test, y_train, y_test, _ = load_training_data(csv_path, cache_dir)
+        assert (ref_ytrain.to_numpy() == y_train).all() and (ref_ytest.to_numpy() == y_test).all()
+        assert np.allclose(X_train, ref_train.to_numpy(np.float32), rtol=1e-6, equal_nan=False)
+        assert np.allclose(X_test, ref_test.to_numpy(np.float32), rtol=1e-6, equal_nan=False)
+        print("✅ Parity: same train/test rows and labels; features equal at float32 precision")
+    return result
+
+
+def _feature_build_rows(db_path, output, workers, partition_size):
+    import bar_store
+    from feature_engineering import build_full
+    conn = bar_store.connect(db_path)
+    return build_full(conn, output, f"{output}.ckpt.json", workers=workers, partition_size=partition_size)
+
+
+def bench_feature_build(n_symbols, n_days, workers=4, partition_size=50):
+    """Full feature build: one partition vs partitioned (sequential, then a process pool)."""
+    import os
+    import filecmp
+    import tempfile
+    import bar_store
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bars.db")
+        bars = make_synthetic_bars(n_symbols, n_days)
+        bars["timestamp"] = bar_store._timestamps_to_epoch(bars["timestamp"])
+        bars["symbol"] = synthetic_symbols(bars.pop(KEY))     # registered in the store's symbol master
+        conn = bar_store.connect(db_path)
+        bar_store.upsert_bars(conn, bars)
+        conn.close()
+        print(f"Bar store: {len(bars):,} bars")
+        del bars
+
+        runs = [("single pass", 1, n_symbols), (f"partitions of {partition_size}", 1, partition_size),
+                (f"{workers} workers", workers, partition_size)]
+        result, outputs = {}, []
+        for name, w, size in runs:
+            output = os.path.join(tmp, f"features_{len(outputs)}.csv")
+            baseline, peak, secs, rows = _measure_in_child("_feature_build_rows", db_path, output, w, size)
+            print(f"{name:18s}: {secs:6.2f}s  {rows / secs:>10,.0f} rows/s  peak RSS +{peak - baseline:.0f} MB"
+                  f" (main process)")
+            result[name] = {"sec": secs, "rows_per_sec": rows / secs, "load_rss_mb": peak - baseline}
+            outputs.append(output)
+        assert all(filecmp.cmp(outputs[0], o, shallow=False) for o in outputs[1:]), "partitioned output differs"
+        print("✅ Parity: partitioned outputs are byte-identical to the single-pass build")
+    return result
+
+
+def bench_training(n_symbols, n_days):
+    """train_model end to end on a synthetic labeled CSV: columnar load (cold and warm), fit, scoring."""
+    import tempfile
+    from train_model import load_training_data, train
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, cache_dir = os.path.join(tmp, "labeled.csv"), os.path.join(tmp, "cols")
+        label_swing_trades(add_features(make_synthetic_bars(n_symbols, n_days))).to_csv(csv_path, index=False)
+        _, cold_secs = _timed(load_training_data, csv_path, cache_dir)
+        (X_train, X_test, y_train, y_test, _), warm_secs = _timed(load_training_data, csv_path, cache_dir)
+        model, fit_secs = _timed(train, X_train, y_train)
+        _, score_secs = _timed(model.predict_proba, X_test)
+    print(f"Load (builds columnar cache): {cold_secs:7.2f}s   load (cached): {warm_secs:7.2f}s")
+    print(f"Fit {X_train.shape[0]:,} × {X_train.shape[1]}: {fit_secs:7.2f}s   "
+          f"predict_proba {len(X_test):,} rows: {score_secs:7.3f}s")
+    return {"train_rows": len(X_train), "cold_load_sec": cold_secs, "warm_load_sec": warm_secs,
+            "fit_sec": fit_secs, "score_sec": score_secs}
+
+
+def bench_scanner(n_symbols, n_days, latency=0.0, error_rate=0.0):
+    """
+    run_scanner against the fake broker: a cold scan (empty bar cache, full
+    history per symbol) and a warm one (completed bars from the store, today's
+    bar from the quote). The rate limiter is disabled so the scanner's own
+    cost and the simulated latency are what get measured.
+    """
+    import io
+    import tempfile
+    import contextlib
+    from sklearn.ensemble import RandomForestClassifier
+    import scanner
+    from fyers_connect import get_fyers_client
+    from fetch_engine import RateLimitedClient, RateLimiter
+    from scan_metrics import read_metrics
+
+    feature_cols = ["open", "high", "low", "close", "volume"] + FEATURE_COLS
+    data = label_swing_trades(add_features(make_synthetic_bars(min(n_symbols, 100), n_days)))
+    data = data.dropna(subset=feature_cols + ["label"])
+    model = RandomForestClassifier(n_estimators=200, max_depth=8, min_samples_leaf=5, n_jobs=-1, random_state=42)
+    model.fit(data[feature_cols], data["label"])
+
+    fake = get_fyers_client()
+    fake.latency, fake.error_rate = latency, error_rate
+    fyers = RateLimitedClient(fake, RateLimiter(per_sec=0, per_min=0))
+    symbols = synthetic_symbols(range(n_symbols)).tolist()
+    cwd = os.getcwd()
+    result = {"symbols": n_symbols, "latency_sec": latency, "error_rate": error_rate}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)               # bar store and scanner output land in the temp dir
+        scanner._bar_cache = None
+        try:
+            for run in ("cold", "warm"):
+                calls = fake.history_calls, len(fake.quote_calls), fake.errors
+                with contextlib.redirect_stdout(io.StringIO()):
+                    df, secs = _timed(lambda: scanner.run_scanner(model=model, feature_list=feature_cols,
+                                                                  fyers=fyers, symbols=symbols))
+                history, quotes, errors = (fake.history_calls - calls[0], len(fake.quote_calls) - calls[1],
+                                           fake.errors - calls[2])
+                marks = read_metrics()["marks"]
+                print(f"{run} scan: {secs:7.2f}s  {n_symbols / secs:>8,.0f} symbols/s  scored {len(df)}"
+                      f"  ({history} history + {quotes} quote calls, {errors} dropped)  "
+                      + ", ".join(f"{name.replace('_', ' ')} {secs:.2f}s" for name, secs in marks.items()))
+                result[run] = {"sec": secs, "symbols_per_sec": n_symbols / secs, "scored": len(df),
+                               "history_calls": history, "quote_calls": quotes, "dropped_calls": errors,
+                               "first_result_sec": marks.get("first_result"),
+                               "first_pick_sec": marks.get("first_pick"), "stages": read_metrics()["stages"]}
+            result["bar_cache"] = scanner.get_bar_cache().stats()
+        finally:
+            scanner._bar_cache.conn.close()
+            scanner._bar_cache = None
+            os.chdir(cwd)
+    return result
+
+
+def bench_dashboard(n_picks, n_rows=500, repeats=20):
+    """The dashboard's uncached readers over a synthetic history.db and scanner output."""
+    import tempfile
+    import pick_tracker
+    from dashboard_data import HistoryDB, read_scanner_output, query_hit_rate, query_recent_history
+
+    rng = np.random.default_rng(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, csv_path = os.path.join(tmp, "history.db"), os.path.join(tmp, "scan.csv")
+        conn = pick_tracker.connect(db_path)
+        outcomes = rng.choice(["Hit", "Stop", "Expired"], n_picks)
+        with conn:
+            conn.executemany("""
+                INSERT INTO history (symbol, picked_at, entry_price, stop_price, target_price, score,
+                                     dropped_at, exit_price, target_hit, pct_change)
+                VALUES (?, ?, 100, 99, 103, 0.7, ?, 101, ?, 1.0)
+            """, [(f"NSE:SYN{i % 1000:04d}-EQ", f"2024-01-01 10:{i % 60:02d}:00", "2024-01-04 15:30:00", o)
+                  for i, o in enumerate(outcomes)])
+        conn.close()
+        pd.DataFrame({"symbol": [f"NSE:SYN{i:04d}-EQ" for i in range(n_rows)],
+                      "price": rng.uniform(50, 3000, n_rows), "score": rng.uniform(0, 1, n_rows),
+                      "target_price": rng.uniform(50, 3000, n_rows), "volume": rng.integers(1000, 10**6, n_rows),
+                      **{c: rng.normal(size=n_rows) for c in FEATURE_COLS}}).to_csv(csv_path, index=False)
+
+        db = HistoryDB(db_path)
+        result = {"picks": n_picks, "scanner_rows": n_rows}
+        for name, fn in (("read_scanner_output", lambda: read_scanner_output(csv_path)),
+                         ("query_hit_rate", lambda: query_hit_rate(db)),
+                         ("query_recent_history", lambda: query_recent_history(db))):
+            secs = sorted(_timed(fn)[1] for _ in range(repeats))
+            median = secs[len(secs) // 2]
+            print(f"{name:22s}: median {median * 1e3:8.2f}ms over {repeats} calls")
+            result[f"{name}_ms"] = median * 1e3
+        db.conn.close()
+    return result
+
+
+def _backtest_reference(panel, model, feature_list, **rules):
+    """Day-by-day replay through pick_tracker itself (record, then evaluate on the next bars), for parity checks."""
+    import pick_tracker
+    from datetime import datetime
+    from scanner import MIN_BARS, target_prices, screen_reasons
+
+    bars = dict(tuple(panel.groupby("timestamp")))
+    screened = screen_reasons(panel["close"], panel["volume"], panel["high"], panel["low"]) == ""
+    scan = panel[screened & (panel["bar_no"] >= MIN_BARS - 1)].dropna(subset=FEATURE_COLS)
+    scores = np.round(model.predict_proba(scan[feature_list].astype(float))[:, 1], 4)
+    scan = scan.assign(price=scan["close"], score=scores,
+                       target_price=np.round(target_prices(scores, scan["ATR14"], scan["close"], scan["close"]), 2))
+    scan = scan.assign(symbol=synthetic_symbols(scan[KEY]))
+    holidays = pick_tracker.holidays_between(panel["timestamp"].dt.date)
+    conn = pick_tracker.connect(":memory:")
+    for day, today in scan.groupby("timestamp"):
+        picks = pick_tracker.select_top_picks(today, rules["threshold"], rules["min_target_pct"])
+        picked_at = day.strftime("%Y-%m-%d %H:%M:%S")
+        pick_tracker.record_picks(conn, picks, picked_at=picked_at)
+        new = {r[0] for r in conn.execute("SELECT symbol FROM history WHERE picked_at = ?", (picked_at,))}
+        prices = {sym: {"ltp": r.close, "high": r.high, "low": r.low}
+                  for sym, r in zip(synthetic_symbols(bars[day][KEY]), bars[day].itertuples(index=False))
+                  if sym not in new}
+        pick_tracker.evaluate_open_picks(conn, prices, now=datetime.combine(day.date(), datetime.min.time()),
+                                         holidays=holidays)
+    return pd.read_sql_query("SELECT symbol, picked_at, target_hit, exit_price FROM history", conn)
+
+
+def bench_backtest(n_symbols, n_days, workers=4):
+    """Backtest on one process vs a pool, with trade-for-trade parity against a pick_tracker replay."""
+    import joblib
+    import tempfile
+    from sklearn.ensemble import RandomForestClassifier
+    from forest_model import export_forest
+    from backtest import run_backtest, summarize
+
+    feature_cols = ["open", "high", "low", "close", "volume"] + FEATURE_COLS
+    features = add_features(make_synthetic_bars(n_symbols, n_days))
+    data = label_swing_trades(features.copy()).dropna(subset=feature_cols)
+    model = RandomForestClassifier(n_estimators=100, max_depth=8, min_samples_leaf=5, n_jobs=-1, random_state=42)
+    model.fit(data[feature_cols], data["label"])
+    panel = features.sort_values([KEY, "timestamp"], kind="mergesort").reset_index(drop=True)
+    panel["bar_no"] = panel.groupby(KEY, sort=False).cumcount()
+    # Synthetic bars are too calm for the live hurdles; loosen them so there are trades to check
+    rules = {"threshold": 0.35, "min_target_pct": 0.0}
+    print(f"Panel: {n_symbols} symbols × {n_days} days = {len(panel):,} rows  (rules {rules})")
+
+    result = {"rows": len(panel)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ai_model.pkl")
+        joblib.dump((model, feature_cols), path)
+        export_forest(model, feature_cols, path)
+        runs = {}
+        for w in (1, workers):
+            runs[w], secs = _timed(lambda: run_backtest(panel, path, workers=w, **rules))
+            print(f"{w} worker(s): {secs:7.2f}s  {len(panel) / secs:>10,.0f} rows/s  {len(runs[w])} trades")
+            result[f"workers_{w}_sec"] = secs
+    trades = runs[1]
+    pd.testing.assert_frame_equal(trades, runs[workers])
+    result.update(summarize(trades))
+
+    ref, ref_secs = _timed(lambda: _backtest_reference(panel, model, feature_cols, **rules))
+    print(f"reference (pick_tracker day by day): {ref_secs:7.2f}s")
+    got = trades.assign(picked_at=trades["picked_at"].dt.strftime("%Y-%m-%d %H:%M:%S"),
+                        symbol=synthetic_symbols(trades[KEY]))
+    key = ["symbol", "picked_at"]
+    got, ref = got.sort_values(key).reset_index(drop=True), ref.sort_values(key).reset_index(drop=True)
+    assert (got[key + ["target_hit"]].values == ref[key + ["target_hit"]].values).all(), "trades differ"
+    assert np.allclose(got["exit_price"], ref["exit_price"], atol=0.005, equal_nan=True), "exit prices differ"
+    print(f"✅ Parity: {len(trades)} trades match the pick_tracker replay (entries, outcomes, exits)")
+    result["reference_sec"] = ref_secs
+    return result
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def write_results(bench, params, results, path=BENCH_LOG):
+    """Append one machine-readable record per run."""
+    record = {
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "bench": bench,
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(record, default=float) + "\n")
+    print(f"Results appended to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks")
+    parser.add_argument("bench", choices=["features", "labels", "label-grid", "streaming", "model", "training-load",
+                                          "feature-build", "training", "scanner", "dashboard", "backtest", "suite"])
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--days", type=int, default=750)
+    parser.add_argument("--years", type=float, default=None,
+                        help=f"history length in years ({TRADING_DAYS_PER_YEAR} trading days each), overrides --days")
+    parser.add_argument("--no-reference", action="store_true", help="skip the slow reference run")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--partition-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake broker: seconds per API call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake broker: fraction of calls dropped")
+    parser.add_argument("--picks", type=int, default=5000, help="dashboard: rows in the synthetic history.db")
+    parser.add_argument("--out", default=BENCH_LOG, help="JSON-lines file the results are appended to")
+    args = parser.parse_args()
+    if args.years is not None:
+        args.days = int(args.years * TRADING_DAYS_PER_YEAR)
+
+    if args.bench == "features":
+        result = bench_features(args.symbols, args.days, reference=not args.no_reference)
+    elif args.bench == "labels":
+        result = bench_labels(args.symbols, args.days, reference=not args.no_reference)
+    elif args.bench == "label-grid":
+        result = bench_label_grid(args.symbols, args.days)
+    elif args.bench == "streaming":
+        result = bench_streaming(args.symbols)
+    elif args.bench == "model":
+        result = bench_model(args.symbols, args.days)
+    elif args.bench == "training-load":
+        result = bench_training_load(args.symbols, args.days)
+    elif args.bench == "feature-build":
+        result = bench_feature_build(args.symbols, args.days, args.workers, args.partition_size)
+    elif args.bench == "training":
+        result = bench_training(args.symbols, args.days)
+    elif args.bench == "scanner":
+        result = bench_scanner(args.symbols, args.days, args.latency, args.error_rate)
+    elif args.bench == "dashboard":
+        result = bench_dashboard(args.picks)
+    elif args.bench == "backtest":
+        result = bench_backtest(args.symbols, args.days, args.workers)
+    else:
+        result = {}
+        for name, fn in (("features", lambda: bench_features(args.symbols, args.days, reference=False)),
+                         ("labels", lambda: bench_labels(args.symbols, args.days, reference=False)),
+                         ("training", lambda: bench_training(args.symbols, args.days)),
+                         ("scanner", lambda: bench_scanner(args.symbols, args.days, args.latency, args.error_rate)),
+                         ("dashboard", lambda: bench_dashboard(args.picks))):
+            print(f"\n──── {name} ────")
+            result[name] = fn()
+    write_results(args.bench, {k: v for k, v in vars(args).items() if k not in ("bench", "out")}, result, args.out)
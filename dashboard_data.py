@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+dashboard_data.py
+
+Cached data layer for the Streamlit dashboard (main.py).
+
+- One shared SQLite connection per server (st.cache_resource).
+- Scanner output is memoized on the CSV's mtime, history queries on the DB's
+  PRAGMA data_version (bumped whenever another connection commits), so a rerun
+  that changes nothing costs a stat() and one pragma instead of a CSV parse and
+  several table scans.
+- Hit rate comes from a single aggregate query.
+- The last scan's metrics (scan_metrics.json) and the running scan's
+  progress checkpoint (scan_checkpoint.json) are memoized on mtime too.
+
+The read_* / query_* functions are the uncached versions, used by benchmarks.
+"""
+
+import os
+import sqlite3
+import threading
+import pandas as pd
+import streamlit as st
+from scan_metrics import METRICS_JSON, read_metrics
+from scanner import SCAN_CHECKPOINT, read_progress
+
+AI_SCANNER_OUTPUT = "ai_scanner_output.csv"
+HISTORY_DB = "history.db"
+HISTORY_COLUMNS = ["Symbol", "Picked At", "Entry Price", "Dropped On",
+                   "Exit Price", "Target Price", "Hit/Miss", "% Change"]
+
+
+class HistoryDB:
+    """A shared read connection; sqlite3 connections must not be used by two threads at once."""
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def version(self):
+        """Changes whenever another connection commits to the database."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+
+# ─── Uncached readers ────────────────────────────────────────
+def read_scanner_output(path=AI_SCANNER_OUTPUT):
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_csv(path)
+
+
+def query_hit_rate(db):
+    """Percent of closed picks marked 'Hit', in one pass over history."""
+    try:
+        total, hits = db.query("""
+            SELECT COALESCE(SUM(target_hit IS NOT 'Open'), 0), COALESCE(SUM(target_hit = 'Hit'), 0)
+            FROM history
+        """)[0]
+    except sqlite3.Error:
+        return 0.0
+    return (hits / total * 100) if total else 0.0
+
+
+def query_recent_history(db, limit=20):
+    try:
+        rows = db.query("""
+            SELECT symbol, picked_at, entry_price, dropped_at, exit_price, target_price, target_hit, pct_change
+            FROM history ORDER BY id DESC LIMIT ?
+        """, (limit,))
+    except sqlite3.Error:
+        return None
+    return pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+
+
+# ─── Cached versions for the dashboard ───────────────────────
+@st.cache_resource
+def get_history_db(path=HISTORY_DB):
+    return HistoryDB(path)
+
+
+@st.cache_data(show_spinner=False)
+def _scanner_output_at(path, mtime):
+    return read_scanner_output(path)
+
+
+def load_scanner_output(path=AI_SCANNER_OUTPUT):
+    """Scanner output, re-read only when the file's mtime changes."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return pd.DataFrame()
+    return _scanner_output_at(path, mtime)
+
+
+@st.cache_data(show_spinner=False)
+def _hit_rate_at(path, version):
+    return query_hit_rate(get_history_db(path))
+
+
+@st.cache_data(show_spinner=False)
+def _recent_history_at(path, version, limit):
+    return query_recent_history(get_history_db(path), limit)
+
+
+def load_hit_rate(path=HISTORY_DB):
+    return _hit_rate_at(path, get_history_db(path).version())
+
+
+def load_recent_history(limit=20, path=HISTORY_DB):
+    """Last `limit` history rows, or None when the history table does not exist yet."""
+    return _recent_history_at(path, get_history_db(path).version(), limit)
+
+
+@st.cache_data(show_spinner=False)
+def _scan_metrics_at(path, mtime):
+    return read_metrics(path)
+
+
+def load_scan_metrics(path=METRICS_JSON):
+    """Counters and stage latencies of the last finished scan, or {}."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    return _scan_metrics_at(path, mtime)
+
+
+@st.cache_data(show_spinner=False)
+def _scan_progress_at(path, mtime):
+    return read_progress(path)
+
+
+def load_scan_progress(path=SCAN_CHECKPOINT):
+    """Checkpoint of the running (or last) scan, or {}."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    return _scan_progress_at(path, mtime)
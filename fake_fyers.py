@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+fake_fyers.py
+
+Offline stand-in for the FYERS client, so the scanner can be exercised (and
+benchmarked) without credentials or network. Mimics the shape of
+fyers.quotes() and fyers.history() responses, including per-symbol errors,
+with optional per-call latency, dropped calls and rate-limit answers.
+
+history() serves a deterministic random walk per symbol: the same symbol and
+date range always return the same candles, timestamped at midnight IST like
+the broker's daily bars. Quotes are stamped with a last-trade time ("tt") in
+the current session on business days and at the previous business day's
+close otherwise, like the broker's quotes outside market hours.
+
+fyers_connect.get_fyers_client() returns one of these when FYERS_CLIENT=fake,
+configured from FAKE_FYERS_LATENCY / FAKE_FYERS_ERROR_RATE /
+FAKE_FYERS_THROTTLE_RATE / FAKE_FYERS_SEED.
+
+Run directly for a quick self-check of batching and error handling:
+    python fake_fyers.py
+"""
+
+import os
+import time
+import zlib
+import random
+import threading
+import numpy as np
+import pandas as pd
+
+MAX_QUOTE_SYMBOLS = 50  # same cap the real quotes endpoint enforces
+HISTORY_ORIGIN = pd.Timestamp("2015-01-01")   # every symbol's random walk starts here
+IST_OFFSET_SEC = 19800                         # daily candles are stamped at midnight IST
+
+
+def _last_trade_time(now=None):
+    """Epoch "tt" of a quote: now on a business day (IST), else 15:30 IST of the last business day."""
+    now = time.time() if now is None else now
+    day = np.datetime64(int(now + IST_OFFSET_SEC) // 86400, "D")
+    if np.is_busday(day):
+        return int(now)
+    last = np.busday_offset(day, 0, roll="backward")
+    return int(last.astype("datetime64[s]").astype(np.int64)) - IST_OFFSET_SEC + 15 * 3600 + 30 * 60
+
+
+def _seed(symbol):
+    return zlib.crc32(symbol.encode("utf-8"))
+
+
+class FakeFyersClient:
+    def __init__(self, bad_symbols=(), fail_calls=(), max_symbols=MAX_QUOTE_SYMBOLS,
+                 latency=0.0, error_rate=0.0, throttle_rate=0.0, seed=0):
+        """
+        bad_symbols:   symbols answered with a per-symbol error entry (quotes) or "no_data" (history)
+        fail_calls:    0-based quotes() call numbers that raise, to simulate a dead batch
+        latency:       seconds each quotes()/history() call sleeps, like a network round trip
+        error_rate:    fraction of calls that raise ConnectionError
+        throttle_rate: fraction of calls answered with the broker's rate-limit error
+        seed:          seeds the error/throttle draws (candles depend only on the symbol)
+        """
+        self.bad_symbols = set(bad_symbols)
+        self.fail_calls = set(fail_calls)
+        self.max_symbols = max_symbols
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.quote_calls = []  # list of symbol lists, one per quotes() call
+        self.history_calls = 0
+        self.errors = 0
+        self.throttled = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(latency=float(os.getenv("FAKE_FYERS_LATENCY", "0")),
+                   error_rate=float(os.getenv("FAKE_FYERS_ERROR_RATE", "0")),
+                   throttle_rate=float(os.getenv("FAKE_FYERS_THROTTLE_RATE", "0")),
+                   seed=int(os.getenv("FAKE_FYERS_SEED", "0")))
+
+    def _network(self, what):
+        """Latency plus injected faults. Returns a rate-limit response, raises, or returns None."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            draw = self._rng.random()
+            if draw < self.error_rate:
+                self.errors += 1
+                raise ConnectionError(f"fake {what} call dropped")
+            if draw < self.error_rate + self.throttle_rate:
+                self.throttled += 1
+                return {"s": "error", "code": 429, "message": "request limit reached"}
+        return None
+
+    def _quote(self, symbol):
+        seed = _seed(symbol)
+        prev_close = 50 + seed % 2000 + (seed % 100) / 100
+        lp = round(prev_close * (1 + ((seed >> 8) % 81 - 40) / 1000), 2)
+        return {
+            "ch": round(lp - prev_close, 2),
+            "chp": round((lp - prev_close) / prev_close * 100, 2),
+            "lp": lp,
+            "open_price": round(prev_close, 2),
+            "high_price": round(max(lp, prev_close) * 1.005, 2),
+            "low_price": round(min(lp, prev_close) * 0.995, 2),
+            "prev_close_price": round(prev_close, 2),
+            "upper_ckt": round(prev_close * 1.2, 2),
+            "lower_ckt": round(prev_close * 0.8, 2),
+            "volume": 1000 + (seed >> 4) % 500000,
+            "symbol": symbol,
+            "tt": str(_last_trade_time()),
+        }
+
+    def _candles(self, symbol, date_from, date_to):
+        """Daily [ts, o, h, l, c, v] rows from the symbol's walk, for business days in [date_from, date_to]."""
+        days = np.arange(HISTORY_ORIGIN.to_datetime64().astype("datetime64[D]"),
+                         date_to.to_datetime64().astype("datetime64[D]") + 1)
+        days = days[np.is_busday(days)]
+        rng = np.random.default_rng(_seed(symbol))
+        n = len(days)
+        base = 50 + _seed(symbol) % 2000
+        close = base * np.exp(np.cumsum(rng.normal(0.0003, 0.018, n)))
+        open_ = close * (1 + rng.normal(0, 0.004, n))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, n)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, n)))
+        volume = rng.integers(1_000, 2_000_000, n)
+        keep = days >= date_from.to_datetime64()
+        ts = days[keep].astype("datetime64[s]").astype(np.int64) - IST_OFFSET_SEC
+        cols = [a[keep].round(2) for a in (open_, high, low, close)]
+        return [[int(t), *map(float, ohlc), int(v)]
+                for t, *ohlc, v in zip(ts, *cols, volume[keep])]
+
+    def history(self, data):
+        with self._lock:
+            self.history_calls += 1
+        fault = self._network("history")
+        if fault is not None:
+            return fault
+        symbol = data["symbol"]
+        if symbol in self.bad_symbols:
+            return {"s": "no_data", "code": 200, "candles": [], "message": ""}
+        date_from, date_to = pd.Timestamp(data["range_from"]), pd.Timestamp(data["range_to"])
+        return {"s": "ok", "code": 200, "candles": self._candles(symbol, date_from, date_to)}
+
+    def quotes(self, data):
+        symbols = [s for s in data.get("symbols", "").split(",") if s]
+        with self._lock:
+            call_no = len(self.quote_calls)
+            self.quote_calls.append(symbols)
+        if call_no in self.fail_calls:
+            raise ConnectionError(f"fake quotes call {call_no} failed")
+        fault = self._network("quotes")
+        if fault is not None:
+            return fault
+        if len(symbols) > self.max_symbols:
+            return {"s": "error", "code": -300, "message": f"max {self.max_symbols} symbols per request"}
+        d = []
+        for sym in symbols:
+            if sym in self.bad_symbols:
+                d.append({"n": sym, "s": "error", "v": {"code": -300, "errmsg": "invalid symbol", "symbol": sym}})
+            else:
+                d.append({"n": sym, "s": "ok", "v": self._quote(sym)})
+        return {"s": "ok", "code": 200, "d": d}
+
+
+if __name__ == "__main__":
+    from scanner import get_live_quotes, QUOTE_BATCH_SIZE
+
+    symbols = [f"NSE:SYM{i:04d}-EQ" for i in range(1, 121)]
+    fyers = FakeFyersClient(bad_symbols={"NSE:SYM0007-EQ"}, fail_calls={1})
+    quotes = get_live_quotes(symbols, fyers, max_workers=1)
+
+    sizes = [len(c) for c in fyers.quote_calls]
+    print(f"Batches: {sizes}")
+    assert sizes == [QUOTE_BATCH_SIZE, QUOTE_BATCH_SIZE, 20], sizes
+    assert set(quotes) == set(symbols)
+    assert quotes["NSE:SYM0007-EQ"] is None, "per-symbol error should map to None"
+    assert all(quotes[s] is None for s in symbols[50:100]), "failed batch should map to None"
+    assert all(quotes[s] is not None for s in symbols[100:]), "later batches should still succeed"
+    assert quotes["NSE:SYM0001-EQ"]["ltp"] == fyers._quote("NSE:SYM0001-EQ")["lp"]
+    print(f"✅ {sum(q is not None for q in quotes.values())}/{len(symbols)} quotes, error handling ok")
+
+    from scanner import _fetch_history
+    start, end = pd.Timestamp("2024-01-01"), pd.Timestamp("2024-03-31")
+    bars = _fetch_history("NSE:SYM0001-EQ", fyers, start, end)
+    assert len(bars) == len(pd.bdate_range(start, end)) and (bars["high"] >= bars["low"]).all()
+    again = _fetch_history("NSE:SYM0001-EQ", FakeFyersClient(), start - pd.Timedelta(days=30), end)
+    assert again.tail(len(bars)).reset_index(drop=True).equals(bars), "history should be deterministic"
+    assert _fetch_history("NSE:SYM0007-EQ", fyers, start, end).empty
+    flaky = FakeFyersClient(error_rate=0.3, throttle_rate=0.2, seed=1)
+    for _ in range(200):
+        try:
+            flaky.history({"symbol": "NSE:SYM0001-EQ", "range_from": "2024-01-01", "range_to": "2024-01-31"})
+        except ConnectionError:
+            pass
+    print(f"✅ History: {len(bars)} bars, deterministic; flaky client dropped {flaky.errors}"
+          f" and throttled {flaky.throttled} of {flaky.history_calls} calls")
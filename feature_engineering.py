@@ -1,82 +1,281 @@
+"""
+feature_engineering.py
+
+Builds training_features.csv from the bar store. Rows are keyed by the int32
+symbol_id of symbol_master, like the store itself.
+
+Incremental by default: feature_checkpoints.json holds each symbol's
+streaming_indicators state as of its last featurized bar, so a daily run only
+reads and rolls each symbol's bars from its own checkpoint on, and merges the
+new rows into the output in (symbol_id, timestamp) order. Every value equals
+what a full recompute produces (the streaming recursions reproduce
+feature_kernel bit-for-bit), so the file stays byte-identical to a --full
+build. A full rebuild happens with --full, on the first run, or whenever the
+checkpoint cannot be trusted: the output file changed underneath it, or a bar
+at or before a checkpoint was revised, backfilled or deleted.
+
+Full builds are partitioned: the universe is split into blocks of
+PARTITION_SIZE symbols, featurized in a process pool, and each partition is
+streamed into the output in symbol order as it finishes. Peak memory is set
+by partition size × workers rather than universe × history; the output is
+byte-identical to a single-pass build.
+
+The checkpoints also anchor the scanner's OBV (read_obv_anchors): OBV is a
+running sum from each symbol's first stored bar, which a scan's recent-bar
+window cannot see, so the scanner adds the checkpointed running total.
+
+Usage:
+    python feature_engineering.py                      # incremental
+    python feature_engineering.py --full               # rebuild everything
+    python feature_engineering.py --full --workers 4 --partition-size 100
+"""
+
+import os
+import json
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import numpy as np
+import bar_store
+from feature_kernel import features_long, panel_from_long, panel_features_long, OHLCV, KEY
+from streaming_indicators import IndicatorBook, SymbolIndicators
+
+OUTPUT_CSV      = "training_features.csv"
+CHECKPOINT_FILE = "feature_checkpoints.json"
+DATE_FORMAT     = "%Y-%m-%d %H:%M:%S"   # fixed, so appended rows format like the full build
+PARTITION_SIZE  = int(os.getenv("FEATURE_PARTITION_SIZE", "200"))   # symbols per partition
+FEATURE_WORKERS = int(os.getenv("FEATURE_WORKERS", str(os.cpu_count() or 1)))
+
+KEEP_COLS = [
+    KEY, "timestamp", "open", "high", "low", "close", "volume",
+    "EMA5", "EMA20", "EMA_diff", "RSI14", "MACD", "MACD_sig", "MACD_hist",
+    "BB_%B", "BB_bandwidth", "ATR14", "OBV"
+]
 
 def add_features(df):
     """
     Add technical indicator features to daily OHLCV DataFrame.
-    Expects columns: symbol, timestamp, open, high, low, close, volume
+    Expects columns: symbol_id, timestamp, open, high, low, close, volume
+
+    Indicators come from feature_kernel, the same code the scanner scores with.
     """
 
     # Ensure proper types and sorting
     df["timestamp"] = pd.to_datetime(df["timestamp"], unit='s')
-    df = df.sort_values(["symbol", "timestamp"]).reset_index(drop=True)
-
-    result_frames = []
-
-    for symbol, group in df.groupby("symbol"):
-        g = group.copy()
-        # EMA
-        g["EMA5"] = g["close"].ewm(span=5, adjust=False).mean()
-        g["EMA20"] = g["close"].ewm(span=20, adjust=False).mean()
-        g["EMA_diff"] = g["EMA5"] - g["EMA20"]
-        # RSI14
-        delta = g["close"].diff()
-        up = np.where(delta > 0, delta, 0)
-        down = np.where(delta < 0, -delta, 0)
-        roll_up = pd.Series(up).rolling(window=14, min_periods=1).mean()
-        roll_down = pd.Series(down).rolling(window=14, min_periods=1).mean()
-        rs = roll_up / (roll_down + 1e-8)
-        g["RSI14"] = 100 - (100 / (1 + rs))
-        # MACD
-        ema12 = g["close"].ewm(span=12, adjust=False).mean()
-        ema26 = g["close"].ewm(span=26, adjust=False).mean()
-        g["MACD"] = ema12 - ema26
-        g["MACD_sig"] = g["MACD"].ewm(span=9, adjust=False).mean()
-        g["MACD_hist"] = g["MACD"] - g["MACD_sig"]
-        # Bollinger Bands
-        ma20 = g["close"].rolling(window=20, min_periods=1).mean()
-        std20 = g["close"].rolling(window=20, min_periods=1).std()
-        g["BB_upper"] = ma20 + 2 * std20
-        g["BB_lower"] = ma20 - 2 * std20
-        g["BB_%B"] = (g["close"] - g["BB_lower"]) / (g["BB_upper"] - g["BB_lower"] + 1e-8)
-        g["BB_bandwidth"] = (g["BB_upper"] - g["BB_lower"]) / (ma20 + 1e-8)
-        # ATR14 (Safe way)
-        prev_close = g["close"].shift()
-        tr = pd.concat([
-            g["high"] - g["low"],
-            (g["high"] - prev_close).abs(),
-            (g["low"] - prev_close).abs()
-        ], axis=1).max(axis=1)
-        g["ATR14"] = tr.rolling(window=14, min_periods=1).mean()
-        # OBV
-        obv = [0]
-        for i in range(1, len(g)):
-            if g["close"].iloc[i] > g["close"].iloc[i-1]:
-                obv.append(obv[-1] + g["volume"].iloc[i])
-            elif g["close"].iloc[i] < g["close"].iloc[i-1]:
-                obv.append(obv[-1] - g["volume"].iloc[i])
-            else:
-                obv.append(obv[-1])
-        g["OBV"] = obv
-        # Append to result
-        result_frames.append(g)
-
-    features = pd.concat(result_frames).sort_values(["symbol", "timestamp"]).reset_index(drop=True)
+    features = features_long(df)
 
     # Clean up: keep only feature columns and core info
-    keep_cols = [
-        "symbol", "timestamp", "open", "high", "low", "close", "volume",
-        "EMA5", "EMA20", "EMA_diff", "RSI14", "MACD", "MACD_sig", "MACD_hist",
-        "BB_%B", "BB_bandwidth", "ATR14", "OBV"
-    ]
-    features = features[keep_cols]
+    features = features[KEEP_COLS]
     return features
 
+def _write_rows(features, path, append, header=None):
+    """Write (or append) feature rows whose timestamps are epoch seconds. Returns the file size."""
+    out = features[KEEP_COLS].assign(timestamp=pd.to_datetime(features["timestamp"], unit="s"))
+    header = not append if header is None else header
+    out.to_csv(path, mode="a" if append else "w", header=header, index=False, date_format=DATE_FORMAT)
+    return os.path.getsize(path)
+
+def _merge_rows(features, path):
+    """
+    Rewrite the output with feature rows merged in (symbol_id, timestamp)
+    order: each symbol's rows go right after its existing block (they are all
+    newer), new symbols in id order. A line scan of the old file, no parsing
+    beyond each line's leading id. Returns the new file size.
+    """
+    tmp = f"{path}.tmp"
+    _write_rows(features, tmp, append=False, header=False)
+    with open(tmp, "rb") as f:
+        new = {}
+        for line in f:
+            new.setdefault(int(line[:line.index(b",")]), []).append(line)
+    ids, k = sorted(new), 0
+    with open(path, "rb") as src, open(tmp, "wb") as out:
+        out.write(src.readline())                   # header
+        current = None
+        for line in src:
+            sid = int(line[:line.index(b",")])
+            if sid != current:                      # the previous block ended: rows for ids before this one
+                while k < len(ids) and ids[k] < sid:
+                    out.writelines(new[ids[k]])
+                    k += 1
+                current = sid
+            out.write(line)
+        for sid in ids[k:]:
+            out.writelines(new[sid])
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+# ─── Checkpoints ─────────────────────────────────────────────
+def _checkpoint_entry(state, bar_row):
+    return {"last_ts": int(bar_row["timestamp"]),
+            "last_bar": [float(bar_row[c]) for c in OHLCV],
+            "state": state.to_dict()}
+
+def _seed_checkpoints(bars):
+    """Checkpoint entries for every symbol in a long bar frame, from the kernel's end state."""
+    panel = panel_from_long(bars)
+    book = IndicatorBook()
+    book.seed_panel(panel)
+    last = bars.groupby(KEY, sort=False).tail(1).set_index(KEY)
+    return panel, {int(sid): _checkpoint_entry(state, last.loc[sid]) for sid, state in book.states.items()}
+
+def _save_checkpoint(symbols, output_bytes, path=CHECKPOINT_FILE, output=OUTPUT_CSV):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"output": output, "output_bytes": output_bytes, "key": KEY, "symbols": symbols}, f)
+    os.replace(tmp, path)
+
+def _load_checkpoint(path=CHECKPOINT_FILE, output=OUTPUT_CSV):
+    try:
+        with open(path) as f:
+            ckpt = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if ckpt.get("output") != output or ckpt.get("key") != KEY:
+        return None     # another output, or written before rows were keyed by symbol id
+    ckpt["symbols"] = {int(sid): entry for sid, entry in ckpt["symbols"].items()}
+    return ckpt
+
+_anchors = (None, {})   # (checkpoint mtime, read_obv_anchors result)
+
+def read_obv_anchors(path=CHECKPOINT_FILE, output=OUTPUT_CSV):
+    """
+    {symbol_id: (last_ts, close, OBV)} as of each symbol's last featurized bar:
+    the full-history running OBV the training rows carry. Re-read only when
+    the checkpoint file changes; {} without a usable checkpoint.
+    """
+    global _anchors
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return {}
+    if _anchors[0] != mtime:
+        ckpt = _load_checkpoint(path, output)
+        symbols = ckpt["symbols"] if ckpt else {}
+        _anchors = (mtime, {sid: (e["last_ts"], e["last_bar"][OHLCV.index("close")], e["state"]["obv"])
+                            for sid, e in symbols.items()})
+    return _anchors[1]
+
+# ─── Builds ──────────────────────────────────────────────────
+def _build_partition(db_path, symbol_ids, part_path):
+    """One partition, in a worker process: its own connection, features to a headerless part file."""
+    conn = bar_store.connect(db_path)
+    try:
+        bars = bar_store.read_bars(conn, symbol_ids)
+    finally:
+        conn.close()
+    panel, entries = _seed_checkpoints(bars)
+    features = panel_features_long(panel)
+    _write_rows(features, part_path, append=False, header=False)
+    return entries, len(features)
+
+def build_full(conn, output=OUTPUT_CSV, checkpoint=CHECKPOINT_FILE,
+               workers=FEATURE_WORKERS, partition_size=PARTITION_SIZE):
+    """Featurize every bar, rewrite the output and checkpoint every symbol. Returns rows written."""
+    db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    symbol_ids = bar_store.list_symbol_ids(conn)   # sorted, the order a single-pass build writes
+    parts = [symbol_ids[i:i + partition_size] for i in range(0, len(symbol_ids), partition_size)]
+    print(f"Featurizing {len(symbol_ids)} symbols from {db_path}: "
+          f"{len(parts)} partitions × {partition_size}, {min(workers, len(parts)) or 1} workers")
+
+    tmp = f"{output}.tmp"
+    pd.DataFrame(columns=KEEP_COLS).to_csv(tmp, index=False)
+    entries, rows = {}, 0
+    jobs = [(db_path, part, f"{output}.part{i}") for i, part in enumerate(parts)]
+    if workers > 1 and len(parts) > 1:
+        pool = ProcessPoolExecutor(min(workers, len(parts)))
+        results = [pool.submit(_build_partition, *job) for job in jobs]
+        results = (fut.result() for fut in results)
+    else:
+        pool = None
+        results = (_build_partition(*job) for job in jobs)
+    try:
+        with open(tmp, "ab") as out:
+            for (_, _, part_path), (part_entries, n) in zip(jobs, results):
+                with open(part_path, "rb") as part:
+                    shutil.copyfileobj(part, out)
+                os.remove(part_path)
+                entries.update(part_entries)
+                rows += n
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        for _, _, part_path in jobs:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    os.replace(tmp, output)
+    _save_checkpoint(entries, os.path.getsize(output), checkpoint, output)
+    return rows
+
+def build_incremental(conn, output=OUTPUT_CSV, checkpoint=CHECKPOINT_FILE, **full_opts):
+    """
+    Merge in features for bars newer than each symbol's checkpoint. Falls back
+    to build_full when the checkpoint is missing or stale. Returns rows written.
+    """
+    ckpt = _load_checkpoint(checkpoint, output)
+    size = os.path.getsize(output) if os.path.exists(output) else None
+    if ckpt is None or size is None:
+        print("No usable feature checkpoint: full rebuild")
+        return build_full(conn, output, checkpoint, **full_opts)
+    if size != ckpt["output_bytes"]:
+        # Rewritten since the checkpoint (e.g. a run that died before saving it)
+        print("Feature output changed since its checkpoint: full rebuild")
+        return build_full(conn, output, checkpoint, **full_opts)
+
+    known = ckpt["symbols"]
+    counts = bar_store.bar_counts(conn)
+    if any(sym not in counts for sym in known):
+        print("Symbols were removed from the bar store: full rebuild")
+        return build_full(conn, output, checkpoint, **full_opts)
+    # Each symbol from its own checkpoint: a stale symbol does not widen everyone's read
+    recent = bar_store.read_bars_from(conn, {sym: e["last_ts"] for sym, e in known.items()})
+    by_symbol = dict(tuple(recent.groupby(KEY, sort=False))) if len(recent) else {}
+
+    rows, updated = [], {}
+    for sym, entry in known.items():
+        bars = by_symbol.get(sym, recent.iloc[:0])
+        at_ckpt = bars[bars["timestamp"] == entry["last_ts"]]
+        newer = bars[bars["timestamp"] > entry["last_ts"]]
+        state = SymbolIndicators.from_dict(entry["state"])
+        if (at_ckpt.empty or at_ckpt[OHLCV].iloc[0].tolist() != entry["last_bar"]
+                or counts[sym] != state.n + len(newer)):
+            print(f"{sym}: bars revised at or before the checkpoint: full rebuild")
+            return build_full(conn, output, checkpoint, **full_opts)
+        if newer.empty:
+            continue
+        for bar in newer.itertuples(index=False):
+            feats = state.roll((bar.open, bar.high, bar.low, bar.close, bar.volume))
+            rows.append({KEY: sym, "timestamp": bar.timestamp, **feats})
+        updated[sym] = _checkpoint_entry(state, newer.iloc[-1])
+
+    # Symbols new to the store: featurize their whole history with the kernel
+    frames = [pd.DataFrame(rows)] if rows else []
+    new_syms = [s for s in counts if s not in known]
+    if new_syms:
+        panel, seeded = _seed_checkpoints(bar_store.read_bars(conn, new_syms))
+        frames.append(panel_features_long(panel))
+        updated.update(seeded)
+
+    written = 0
+    if frames:
+        features = pd.concat(frames, ignore_index=True).sort_values([KEY, "timestamp"], kind="mergesort")
+        size = _merge_rows(features, output)
+        written = len(features)
+    _save_checkpoint({**known, **updated}, size, checkpoint, output)
+    print(f"Incremental: {len(updated) - len(new_syms)} symbols advanced, {len(new_syms)} new symbols")
+    return written
+
 if __name__ == "__main__":
-    df = pd.read_csv("nse_daily_bars_fyers.csv")
-    print(f"Loaded: {df.shape}")
-    features = add_features(df)
-    print("With features:", features.shape)
-    print(features.head(10))
-    features.to_csv("training_features.csv", index=False)
-    print("✅ Features saved to training_features.csv")
+    parser = argparse.ArgumentParser(description="Build training features from the bar store")
+    parser.add_argument("--full", action="store_true", help="recompute every bar and rewrite the checkpoints")
+    parser.add_argument("--workers", type=int, default=FEATURE_WORKERS, help="processes for full builds")
+    parser.add_argument("--partition-size", type=int, default=PARTITION_SIZE, help="symbols per partition")
+    args = parser.parse_args()
+
+    conn = bar_store.connect()
+    bar_store.migrate_csv(conn)
+    if args.full:
+        written = build_full(conn, workers=args.workers, partition_size=args.partition_size)
+    else:
+        written = build_incremental(conn, workers=args.workers, partition_size=args.partition_size)
+    print(f"✅ Features saved to {OUTPUT_CSV} ({written} rows written)")
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+feature_kernel.py
+
+The one implementation of the model's indicator features, shared by training
+(feature_engineering.add_features) and scanning (scanner.featurize_stage).
+
+Bars are laid out as a (symbols × days) NumPy panel, right-aligned so the last
+column holds every symbol's latest bar; shorter histories are NaN-padded on the
+left. Each indicator is then a vectorized pass along the day axis:
+
+- EMAs: adjust=False recursion from each symbol's first bar
+- rolling means/std: trailing windows with min_periods=1 (std needs 2 bars)
+- OBV: running sum of volume signed by the close-to-close move
+
+Rolling sums are accumulated oldest → newest in a fixed order, so
+streaming_indicators can reproduce them bit-for-bit.
+"""
+
+import numpy as np
+import pandas as pd
+
+FEATURE_COLS = [
+    "EMA5", "EMA20", "EMA_diff", "RSI14", "MACD", "MACD_sig", "MACD_hist",
+    "BB_%B", "BB_bandwidth", "ATR14", "OBV"
+]
+OHLCV = ["open", "high", "low", "close", "volume"]
+KEY = "symbol_id"      # symbol column of long bar/feature frames (symbol_master ids)
+
+
+def alpha(span):
+    return 2.0 / (span + 1.0)
+
+
+class BarPanel:
+    """Right-aligned (symbols × days) OHLCV arrays plus per-symbol bar counts."""
+
+    def __init__(self, symbols, lengths, timestamps, **ohlcv):
+        self.symbols = np.asarray(symbols)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.timestamps = timestamps
+        for col in OHLCV:
+            setattr(self, col, ohlcv[col])
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    def valid(self):
+        n_days = self.shape[1]
+        return np.arange(n_days)[None, :] >= (n_days - self.lengths)[:, None]
+
+
+def panel_from_long(df, key=KEY):
+    """
+    Build a panel from a long frame with `key`, timestamp and OHLCV columns.
+    Rows are ordered by (key, timestamp) first, the order features_long returns.
+    """
+    df = df.sort_values([key, "timestamp"], kind="mergesort")
+    codes, symbols = pd.factorize(df[key], sort=False)
+    lengths = np.bincount(codes, minlength=len(symbols))
+    n_days = int(lengths.max()) if len(lengths) else 0
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    rank = np.arange(len(df)) - np.repeat(starts, lengths)
+    cols = n_days - lengths[codes] + rank
+
+    def fill(values, dtype=float, empty=np.nan):
+        out = np.full((len(symbols), n_days), empty, dtype=dtype)
+        out[codes, cols] = values
+        return out
+
+    ts = df["timestamp"].to_numpy()
+    timestamps = fill(ts, dtype=ts.dtype, empty=np.array(0).astype(ts.dtype))
+    return BarPanel(symbols, lengths, timestamps,
+                    **{c: fill(df[c].to_numpy(dtype=float)) for c in OHLCV})
+
+
+def panel_from_bars(bars_by_sym):
+    """Build a panel from {symbol: OHLCV DataFrame (oldest first)}, e.g. scanner history."""
+    symbols = [s for s, b in bars_by_sym.items() if b is not None and len(b)]
+    lengths = np.array([len(bars_by_sym[s]) for s in symbols], dtype=np.int64)
+    n_days = int(lengths.max()) if len(lengths) else 0
+    arrays = {c: np.full((len(symbols), n_days), np.nan) for c in OHLCV}
+    for i, s in enumerate(symbols):
+        block = bars_by_sym[s][OHLCV].to_numpy(dtype=float)
+        for j, c in enumerate(OHLCV):
+            arrays[c][i, n_days - len(block):] = block[:, j]
+    return BarPanel(symbols, lengths, None, **arrays)
+
+
+def _shift(x, k):
+    """Shift right by k days along axis 1, NaN-filling the left edge."""
+    if k == 0:
+        return x
+    out = np.full_like(x, np.nan)
+    out[:, k:] = x[:, :-k]
+    return out
+
+
+def _ema(x, started, span):
+    a = alpha(span)
+    out = np.full_like(x, np.nan)
+    y = np.full(x.shape[0], np.nan)
+    for t in range(x.shape[1]):
+        first = started[:, t] & np.isnan(y)
+        y = np.where(first, x[:, t], (1 - a) * y + a * x[:, t])
+        out[:, t] = y
+    return out
+
+
+def _rolling_mean_std(x, window, cols=None, with_std=False):
+    """
+    Trailing mean (and sample std) over `window` days, NaN cells skipped,
+    summed oldest → newest. `cols` restricts the output to those day columns.
+    """
+    if cols is not None:
+        lo = max(cols.start - (window - 1), 0)
+        x = x[:, lo:]
+        keep = slice(cols.start - lo, None)
+    else:
+        keep = slice(None)
+    acc = np.zeros_like(x[:, keep])
+    cnt = np.zeros_like(acc)
+    for k in range(window - 1, -1, -1):
+        s = _shift(x, k)[:, keep]
+        ok = ~np.isnan(s)
+        acc = acc + np.where(ok, s, 0.0)
+        cnt = cnt + ok
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = acc / cnt
+        if not with_std:
+            return mean, None
+        ssd = np.zeros_like(acc)
+        for k in range(window - 1, -1, -1):
+            s = _shift(x, k)[:, keep]
+            d = s - mean
+            ssd = ssd + np.where(np.isnan(s), 0.0, d * d)
+        std = np.where(cnt > 1, np.sqrt(ssd / (cnt - 1)), np.nan)
+    return mean, std
+
+
+def _moves(close, high, low, started):
+    """Close-to-close up/down moves and true range, as the RSI/ATR windows see them."""
+    prev_close = _shift(close, 1)
+    delta = close - prev_close
+    with np.errstate(invalid="ignore"):
+        up = np.where(started, np.where(delta > 0, delta, 0.0), np.nan)
+        down = np.where(started, np.where(delta < 0, -delta, 0.0), np.nan)
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return delta, up, down, tr
+
+
+def _obv(delta, volume, started):
+    signed_vol = np.where(started, np.sign(np.nan_to_num(delta)) * volume, 0.0)
+    return np.where(started, np.cumsum(signed_vol, axis=1), np.nan)
+
+
+def compute_panel_features(panel, latest_only=False):
+    """
+    Indicator features for every symbol in one pass.
+    Returns {column: (symbols × days) array}, or {column: (symbols,) array}
+    holding each symbol's latest bar when latest_only=True. OHLCV columns are
+    included alongside FEATURE_COLS.
+    """
+    close, high, low, volume = panel.close, panel.high, panel.low, panel.volume
+    started = ~np.isnan(close)
+    n_days = close.shape[1]
+    cols = slice(n_days - 1, n_days) if latest_only else slice(None)
+
+    ema5 = _ema(close, started, 5)
+    ema20 = _ema(close, started, 20)
+    ema12 = _ema(close, started, 12)
+    ema26 = _ema(close, started, 26)
+    macd = ema12 - ema26
+    macd_sig = _ema(macd, started, 9)
+
+    delta, up, down, tr = _moves(close, high, low, started)
+    roll_up, _ = _rolling_mean_std(up, 14, cols if latest_only else None)
+    roll_down, _ = _rolling_mean_std(down, 14, cols if latest_only else None)
+    rs = roll_up / (roll_down + 1e-8)
+    rsi = 100 - (100 / (1 + rs))
+
+    ma20, std20 = _rolling_mean_std(close, 20, cols if latest_only else None, with_std=True)
+    c = close[:, cols]
+    bb_upper = ma20 + 2 * std20
+    bb_lower = ma20 - 2 * std20
+    bb_pct_b = (c - bb_lower) / (bb_upper - bb_lower + 1e-8)
+    bb_bandwidth = (bb_upper - bb_lower) / (ma20 + 1e-8)
+
+    atr, _ = _rolling_mean_std(tr, 14, cols if latest_only else None)
+
+    obv = _obv(delta, volume, started)
+
+    out = {
+        "open": panel.open[:, cols], "high": high[:, cols], "low": low[:, cols],
+        "close": c, "volume": volume[:, cols],
+        "EMA5": ema5[:, cols], "EMA20": ema20[:, cols], "EMA_diff": (ema5 - ema20)[:, cols],
+        "RSI14": rsi,
+        "MACD": macd[:, cols], "MACD_sig": macd_sig[:, cols], "MACD_hist": (macd - macd_sig)[:, cols],
+        "BB_%B": bb_pct_b, "BB_bandwidth": bb_bandwidth,
+        "ATR14": atr,
+        "OBV": obv[:, cols],
+    }
+    if latest_only:
+        out = {k: v[:, -1] for k, v in out.items()}
+    return out
+
+
+def panel_state(panel):
+    """
+    Recursion state after each symbol's last bar, for seeding
+    streaming_indicators: EMA values, running OBV and the trailing up/down/TR
+    (13 days) and close (19 days) windows, left-padded with NaN where a
+    symbol's history is shorter.
+    """
+    close, high, low = panel.close, panel.high, panel.low
+    started = ~np.isnan(close)
+    ema12 = _ema(close, started, 12)
+    ema26 = _ema(close, started, 26)
+    macd_sig = _ema(ema12 - ema26, started, 9)
+    delta, up, down, tr = _moves(close, high, low, started)
+    return {
+        "ema5": _ema(close, started, 5)[:, -1], "ema20": _ema(close, started, 20)[:, -1],
+        "ema12": ema12[:, -1], "ema26": ema26[:, -1], "macd_sig": macd_sig[:, -1],
+        "obv": _obv(delta, panel.volume, started)[:, -1],
+        "ups": up[:, -13:], "downs": down[:, -13:], "trs": tr[:, -13:], "closes": close[:, -19:],
+    }
+
+
+def panel_features_long(panel, key=KEY):
+    """Full-history features for every bar of a panel, rows ordered by (symbol, day)."""
+    feats = compute_panel_features(panel)
+    valid = panel.valid()
+    out = pd.DataFrame({key: np.repeat(panel.symbols, panel.lengths),
+                        "timestamp": panel.timestamps[valid]})
+    for col in OHLCV + FEATURE_COLS:
+        out[col] = feats[col][valid]
+    return out
+
+
+def features_long(df, key=KEY):
+    """Full-history features for a long bar frame, sorted by (key, timestamp)."""
+    return panel_features_long(panel_from_long(df, key), key)
+
+
+def latest_features(bars_by_sym, min_bars=1):
+    """Latest-bar features for {symbol: bars DataFrame}, one row per symbol with >= min_bars bars."""
+    bars_by_sym = {s: b for s, b in bars_by_sym.items() if b is not None and len(b) >= min_bars}
+    panel = panel_from_bars(bars_by_sym)
+    if not len(panel.symbols):
+        return pd.DataFrame(columns=["symbol"] + OHLCV + FEATURE_COLS)
+    feats = compute_panel_features(panel, latest_only=True)
+    return pd.DataFrame({"symbol": panel.symbols, **feats})
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+fetch_engine.py
+
+Rate-limited, concurrent access to the FYERS API.
+
+- RateLimiter: token buckets for the per-second and per-minute broker limits,
+  with adaptive back-off when the broker answers "request limit reached".
+- RateLimitedClient: wraps a FYERS client so every quotes()/history() call
+  waits for a token and is retried after a rate-limit response.
+- fetch_concurrent: runs a fetch function over many symbols on a bounded
+  thread pool.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# ——— CONFIG ——— (FYERS API v3 limits: 10/sec, 200/min)
+RATE_PER_SEC  = float(os.getenv("FYERS_RATE_PER_SEC",  "10"))
+RATE_PER_MIN  = float(os.getenv("FYERS_RATE_PER_MIN",  "200"))
+FETCH_WORKERS = int(os.getenv("FYERS_FETCH_WORKERS",   "8"))
+MAX_RETRIES   = int(os.getenv("FYERS_MAX_RETRIES",     "4"))
+BACKOFF_SEC   = 1.0    # first pause after a rate-limit hit, doubled on each consecutive hit
+MIN_SCALE     = 0.1    # never throttle below 10% of the configured rate
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate, per):
+        """Allow `rate` requests every `per` seconds, with bursts up to `rate`."""
+        self.capacity = rate
+        self.fill_rate = rate / per
+        self.tokens = rate
+        self.stamp = time.monotonic()
+
+    def refill(self, now, scale=1.0):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.fill_rate * scale)
+        self.stamp = now
+
+    def wait_time(self, scale=1.0):
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / (self.fill_rate * scale)
+
+
+class RateLimiter:
+    def __init__(self, per_sec=RATE_PER_SEC, per_min=RATE_PER_MIN):
+        self.buckets = []
+        if per_sec:
+            self.buckets.append(TokenBucket(per_sec, 1.0))
+        if per_min:
+            self.buckets.append(TokenBucket(per_min, 60.0))
+        self.scale = 1.0          # fraction of the configured rate currently allowed
+        self.paused_until = 0.0
+        self.consecutive_limits = 0
+        self.rate_limited = 0     # total rate-limit responses seen
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until every bucket has a token, then take one from each."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                for b in self.buckets:
+                    b.refill(now, self.scale)
+                wait = max([self.paused_until - now] + [b.wait_time(self.scale) for b in self.buckets])
+                if wait <= 0:
+                    for b in self.buckets:
+                        b.tokens -= 1
+                    return
+            time.sleep(wait)
+
+    def backoff(self):
+        """Broker said we are going too fast: halve the rate and pause everyone."""
+        with self._lock:
+            self.rate_limited += 1
+            self.consecutive_limits += 1
+            self.scale = max(MIN_SCALE, self.scale / 2)
+            pause = BACKOFF_SEC * 2 ** (self.consecutive_limits - 1)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            for b in self.buckets:
+                b.tokens = min(b.tokens, 0)
+        logger.warning(f"Rate limited: pausing {pause:.1f}s, rate scaled to {self.scale:.0%}")
+
+    def success(self):
+        """Creep back towards the configured rate after a successful call."""
+        with self._lock:
+            self.consecutive_limits = 0
+            if self.scale < 1.0:
+                self.scale = min(1.0, self.scale + 0.02)
+
+
+def is_rate_limited(resp=None, exc=None):
+    if exc is not None:
+        msg = str(exc).lower()
+        return "429" in msg or "limit" in msg
+    if isinstance(resp, dict) and resp.get("s") != "ok":
+        return resp.get("code") in (429, -429) or "limit" in str(resp.get("message", "")).lower()
+    return False
+
+
+class RateLimitedClient:
+    def __init__(self, fyers, limiter=None, max_retries=MAX_RETRIES):
+        self._fyers = fyers
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+
+    def _call(self, fn, data):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                resp = fn(data)
+            except Exception as e:
+                if is_rate_limited(exc=e) and attempt < self.max_retries:
+                    self.limiter.backoff()
+                    continue
+                raise
+            if is_rate_limited(resp) and attempt < self.max_retries:
+                self.limiter.backoff()
+                continue
+            self.limiter.success()
+            return resp
+        return resp
+
+    def quotes(self, data):
+        return self._call(self._fyers.quotes, data)
+
+    def history(self, data):
+        return self._call(self._fyers.history, data)
+
+    def __getattr__(self, name):
+        return getattr(self._fyers, name)
+
+
+def fetch_concurrent(fn, items, max_workers=FETCH_WORKERS):
+    """
+    Run fn(item) for every item on a bounded thread pool.
+    Returns {item: result}; an item whose call raised maps to None.
+    """
+    results = {}
+    if max_workers <= 1:
+        for item in items:
+            try:
+                results[item] = fn(item)
+            except Exception as e:
+                logger.warning(f"Fetch fail for {item}: {e}")
+                results[item] = None
+        return results
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fn, item): item for item in items}
+        for fut in as_completed(futures):
+            item = futures[fut]
+            try:
+                results[item] = fut.result()
+            except Exception as e:
+                logger.warning(f"Fetch fail for {item}: {e}")
+                results[item] = None
+    return results
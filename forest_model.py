@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+forest_model.py
+
+A trained RandomForestClassifier flattened into contiguous NumPy node arrays,
+saved as one .npy file per array so loading is an mmap, not an unpickle.
+
+Layout: all trees' nodes are concatenated; `roots` holds each tree's first
+node. Leaves point both children at themselves, so evaluation is a fixed
+`max_depth` rounds of gather/compare over an (n_samples × n_trees) index
+array with no per-node branching.
+
+Predictions match sklearn's predict_proba: X is cast to float32 (as sklearn's
+trees do) and compared against the thresholds rounded down to float32, which
+decides every split the same way as sklearn's float64 compare; leaf class
+counts are normalized per tree and averaged over trees.
+
+Usage:
+    python forest_model.py [models/ai_model.pkl]     # export + parity check
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "value", "roots")
+ROW_BLOCK = 512       # rows per evaluation block; bounds the (rows × trees) index array
+
+
+def forest_path_for(model_path):
+    """models/ai_model.pkl → models/ai_model_forest"""
+    return os.path.splitext(model_path)[0] + "_forest"
+
+
+class CompiledForest:
+    def __init__(self, arrays, feature_list, classes, max_depth):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.feature_list = list(feature_list)
+        self.classes_ = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        self._children = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model, feature_list):
+        feature, threshold, left, right, missing_left, value, roots = [], [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for est in model.estimators_:
+            t = est.tree_
+            n = t.node_count
+            ids = np.arange(n)
+            leaf = t.children_left == -1
+            feature.append(np.where(leaf, 0, t.feature).astype(np.int32))
+            threshold.append(np.where(leaf, np.inf, t.threshold).astype(np.float64))
+            left.append((np.where(leaf, ids, t.children_left) + offset).astype(np.int32))
+            right.append((np.where(leaf, ids, t.children_right) + offset).astype(np.int32))
+            mgl = getattr(t, "missing_go_to_left", None)
+            missing_left.append(np.zeros(n, dtype=bool) if mgl is None else np.asarray(mgl, dtype=bool))
+            v = t.value[:, 0, :].astype(np.float64)
+            norm = v.sum(axis=1, keepdims=True)
+            value.append(v / np.where(norm == 0, 1.0, norm))
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, t.max_depth)
+        arrays = {
+            "feature": np.concatenate(feature), "threshold": np.concatenate(threshold),
+            "left": np.concatenate(left), "right": np.concatenate(right),
+            "missing_left": np.concatenate(missing_left), "value": np.concatenate(value),
+            "roots": np.asarray(roots, dtype=np.int32),
+        }
+        return cls(arrays, feature_list, model.classes_, max_depth)
+
+    # ─── Evaluation ──────────────────────────────────────────
+    def _prepare(self):
+        """
+        Evaluation views: children packed as (node, 2) for one gather per level,
+        and thresholds rounded down to float32, which for float32 x gives exactly
+        the same x <= threshold decisions as the float64 compare.
+        """
+        if self._children is None:
+            t32 = self.threshold.astype(np.float32)
+            t32 = np.where(t32.astype(np.float64) > self.threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+            self._threshold32 = t32
+            self._children = np.stack([self.left, self.right], axis=1).ravel()
+        return self._threshold32, self._children
+
+    def _leaves(self, X):
+        """Leaf node index per (row, tree)."""
+        threshold, children = self._prepare()
+        flat = X.ravel()
+        base = (np.arange(len(X), dtype=np.int32) * X.shape[1])[:, None]
+        has_nan = np.isnan(flat).any()
+        idx = np.tile(self.roots, (len(X), 1))
+        for _ in range(self.max_depth):
+            x = flat[base + self.feature[idx]]
+            go_right = x > threshold[idx]
+            if has_nan:
+                go_right = np.where(np.isnan(x), ~self.missing_left[idx], go_right)
+            idx = children[2 * idx + go_right]
+        return idx
+
+    def predict_proba(self, X):
+        X = np.asarray(getattr(X, "values", X), dtype=np.float32)
+        out = np.empty((len(X), self.value.shape[1]))
+        for start in range(0, len(X), ROW_BLOCK):
+            block = X[start:start + ROW_BLOCK]
+            out[start:start + len(block)] = self.value[self._leaves(block)].sum(axis=1) / self.n_trees
+        return out
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    # ─── Persistence ─────────────────────────────────────────
+    def save(self, path):
+        """Write to a temp directory, then swap it in so readers never see a partial export."""
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"feature_list": self.feature_list, "classes": self.classes_.tolist(),
+                       "max_depth": self.max_depth, "n_trees": self.n_trees}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAYS}
+        return cls(arrays, meta["feature_list"], meta["classes"], meta["max_depth"])
+
+
+def export_forest(model, feature_list, model_path):
+    """Compile `model` and save it next to the pickle at `model_path`. Returns the export directory."""
+    path = forest_path_for(model_path)
+    CompiledForest.from_sklearn(model, feature_list).save(path)
+    return path
+
+
+def load_compiled(model_path):
+    """The compiled forest for `model_path` if it exists and is not older than the pickle, else None."""
+    path = forest_path_for(model_path)
+    meta = os.path.join(path, "meta.json")
+    try:
+        if os.path.exists(model_path) and os.path.getmtime(meta) < os.path.getmtime(model_path):
+            return None
+        return CompiledForest.load(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def model_version(model_path):
+    """Changes whenever either the pickle or its compiled export is rewritten."""
+    mtimes = [os.path.getmtime(p) for p in (model_path, os.path.join(forest_path_for(model_path), "meta.json"))
+              if os.path.exists(p)]
+    return max(mtimes) if mtimes else None
+
+
+if __name__ == "__main__":
+    import joblib
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "models/ai_model.pkl"
+
+    t0 = time.perf_counter()
+    model, feature_list = joblib.load(model_path)
+    pkl_secs = time.perf_counter() - t0
+    path = export_forest(model, feature_list, model_path)
+    t0 = time.perf_counter()
+    forest = CompiledForest.load(path)
+    load_secs = time.perf_counter() - t0
+    print(f"Exported {forest.n_trees} trees ({len(forest.feature)} nodes) → {path}")
+    print(f"Load: pickle {pkl_secs * 1e3:.1f}ms, compiled {load_secs * 1e3:.1f}ms")
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 1, (2000, len(feature_list))) * rng.lognormal(0, 3, len(feature_list))
+    ref = model.predict_proba(X)
+    got = forest.predict_proba(X)
+    assert np.allclose(got, ref, rtol=0, atol=1e-12), f"max abs diff {np.abs(got - ref).max():.3g}"
+    print("✅ Parity: compiled predict_proba matches sklearn")
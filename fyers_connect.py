@@ -11,6 +11,8 @@ APP_ID       = os.getenv("FYERS_APP_ID",       "1STQ57NNRI-100")
 SECRET_KEY   = os.getenv("FYERS_SECRET_KEY",   "HNVJE2C9WU")
 REDIRECT_URI = os.getenv("FYERS_REDIRECT_URI", "https://google.com")  # must exactly match your FYERS app
 TOKEN_FILE   = os.getenv("FYERS_TOKEN_FILE",   "fyers_token.json")
+# "fake" swaps in fake_fyers.FakeFyersClient (offline runs, benchmarks)
+FYERS_CLIENT = os.getenv("FYERS_CLIENT",       "live")
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -53,11 +55,18 @@ def _authenticate():
 def get_fyers_client():
     """
     Returns a singleton FyersModel instance, prompting for auth only once.
+    With FYERS_CLIENT=fake, returns an offline FakeFyersClient instead.
     """
     global _fyers_client
     if _fyers_client:
         return _fyers_client
 
+    if FYERS_CLIENT == "fake":
+        from fake_fyers import FakeFyersClient
+        _fyers_client = FakeFyersClient.from_env()
+        logger.info("✅ Fake FYERS client initialized (FYERS_CLIENT=fake)")
+        return _fyers_client
+
     token = _load_token() or _authenticate()
     _fyers_client = fyersModel.FyersModel(
         client_id = APP_ID,
@@ -5,44 +5,153 @@ label_training_data.py
 Loads your daily bars with features,
 labels each row as "profitable swing trade" (1) or not (0)
 using a rolling lookahead window, and saves for AI training.
+The target must be hit before the stop, judged on intraday high/low.
+
+Sweep mode labels a whole grid of (target, stop, horizon) settings in one
+pass: the forward high/low windows are built once for the longest horizon,
+first-touch bars are found once per target and once per stop, and every
+config is then two integer compares. Writes one int8 label column per config
+plus base-rate statistics per config.
+
+Usage:
+    python label_training_data.py                                   # label with the constants below
+    python label_training_data.py --target 0.04 --stop 0.015 --horizon 5
+    python label_training_data.py --sweep [--targets 0.02,0.03 --stops 0.01 --horizons 2,3,5]
 """
 
+import argparse
+import numpy as np
 import pandas as pd
-from datetime import timedelta
+from feature_kernel import KEY
 
 # PARAMETERS — adjust as per your strategy!
 PROFIT_TARGET = 0.03    # +3% profit
 STOP_LOSS     = 0.01    # -1% loss
 HORIZON_DAYS  = 3       # Max holding period
 
-INPUT_CSV = "nse_daily_features.csv"
+INPUT_CSV     = "training_features.csv"   # written by feature_engineering.py
 OUTPUT_CSV    = "training_data_labeled.csv"
 
-def label_swing_trades(df, profit_target=PROFIT_TARGET, stop_loss=STOP_LOSS, horizon=HORIZON_DAYS):
-    # Ensure proper sorting by symbol and date/timestamp
-    df = df.sort_values(["symbol", "timestamp"]).reset_index(drop=True)
-    df["label"] = 0  # Default to not hit
-    symbols = df["symbol"].unique()
-    for symbol in symbols:
-        sub = df[df["symbol"] == symbol].reset_index()
-        closes = sub["close"].values
-        for i in range(len(sub) - horizon):
-            entry = closes[i]
-            max_close = max(closes[i+1:i+1+horizon])
-            min_close = min(closes[i+1:i+1+horizon])
-            # Did it hit profit first?
-            if (max_close - entry) / entry >= profit_target:
-                df.loc[sub.loc[i, "index"], "label"] = 1
-            # Optionally: can handle stop-loss first logic here if you want!
-            # elif (min_close - entry) / entry <= -stop_loss:
-            #     df.loc[sub.loc[i, "index"], "label"] = 0
-            else:
-                df.loc[sub.loc[i, "index"], "label"] = 0
+# Sweep grid defaults
+GRID_TARGETS   = (0.02, 0.03, 0.04, 0.05)
+GRID_STOPS     = (0.01, 0.015, 0.02)
+GRID_HORIZONS  = (2, 3, 5)
+GRID_CSV       = "training_label_grid.csv"
+GRID_STATS_CSV = "label_grid_stats.csv"
+
+def forward_window(values, rows_left, horizon):
+    """
+    (n, horizon) matrix whose column k-1 holds values[i+k] for k = 1..horizon,
+    or NaN where i+k runs past the end of row i's symbol block.
+    """
+    padded = np.append(np.asarray(values, dtype=float), np.full(horizon, np.nan))
+    window = np.lib.stride_tricks.sliding_window_view(padded, horizon + 1)[:len(values), 1:]
+    return np.where(np.arange(1, horizon + 1) > rows_left[:, None], np.nan, window)
+
+def first_touch(hit):
+    """Index of the first True per row of a (n, horizon) bool matrix; horizon if none."""
+    return np.where(hit.any(axis=1), hit.argmax(axis=1), hit.shape[1])
+
+def rows_left_in_symbol(symbols):
+    """For each row of a symbol-sorted array, how many later rows share its symbol."""
+    symbols = np.asarray(symbols)
+    n = len(symbols)
+    starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+    ends = np.r_[starts[1:], n]
+    block_end = np.repeat(ends, ends - starts)
+    return block_end - np.arange(n) - 1
+
+def label_swing_trades(df, profit_target=PROFIT_TARGET, stop_loss=STOP_LOSS, horizon=HORIZON_DAYS,
+                       path_aware=True):
+    """
+    Label 1 when the profit target is reached within `horizon` bars.
+
+    path_aware=True: uses intraday high/low and walks the path bar by bar, so
+    the label is 1 only if the target is touched before the stop. A bar that
+    touches both counts as a stop (intraday order is unknown).
+    path_aware=False: the original rule, max forward close vs target only.
+    Rows without `horizon` bars left in their symbol are labelled 0.
+    """
+    # Ensure proper sorting by symbol id and date/timestamp
+    df = df.sort_values([KEY, "timestamp"], kind="mergesort").reset_index(drop=True)
+    rows_left = rows_left_in_symbol(df[KEY].to_numpy())
+    entry = df["close"].to_numpy(dtype=float)
+
+    use_hl = path_aware and {"high", "low"} <= set(df.columns)
+    fwd_high = forward_window(df["high" if use_hl else "close"].to_numpy(), rows_left, horizon)
+    target_hit = first_touch(fwd_high >= (entry * (1 + profit_target))[:, None])
+    if path_aware:
+        fwd_low = forward_window(df["low" if use_hl else "close"].to_numpy(), rows_left, horizon)
+        stop_hit = first_touch(fwd_low <= (entry * (1 - stop_loss))[:, None])
+        label = (target_hit < horizon) & (target_hit < stop_hit)
+    else:
+        label = target_hit < horizon
+
+    label &= rows_left >= horizon
+    df["label"] = label.astype(int)
     return df
 
+def label_column(target, stop, horizon):
+    """label_t3_s1_h3 for a 3% target, 1% stop, 3-bar horizon"""
+    return f"label_t{target * 100:g}_s{stop * 100:g}_h{horizon}"
+
+def label_grid(df, targets=GRID_TARGETS, stops=GRID_STOPS, horizons=GRID_HORIZONS):
+    """
+    Path-aware labels for every (target, stop, horizon) combination, each equal
+    to label_swing_trades(df, target, stop, horizon)["label"].
+    Returns (labels, stats): symbol_id, timestamp and one int8 column per config
+    in (symbol, timestamp) order; and one row of base-rate statistics per config.
+    """
+    df = df.sort_values([KEY, "timestamp"], kind="mergesort").reset_index(drop=True)
+    rows_left = rows_left_in_symbol(df[KEY].to_numpy())
+    entry = df["close"].to_numpy(dtype=float)
+    use_hl = {"high", "low"} <= set(df.columns)
+    longest = max(horizons)
+
+    # Shared across the grid: one pair of windows, one first-touch pass per target and per stop.
+    # A first touch within the longest window that lands before bar h is the first touch within h.
+    fwd_high = forward_window(df["high" if use_hl else "close"].to_numpy(), rows_left, longest)
+    fwd_low = forward_window(df["low" if use_hl else "close"].to_numpy(), rows_left, longest)
+    target_at = {t: first_touch(fwd_high >= (entry * (1 + t))[:, None]).astype(np.int16) for t in targets}
+    stop_at = {s: first_touch(fwd_low <= (entry * (1 - s))[:, None]).astype(np.int16) for s in stops}
+    del fwd_high, fwd_low
+    eligible = {h: rows_left >= h for h in horizons}
+
+    labels = {KEY: df[KEY], "timestamp": df["timestamp"]}
+    stats = []
+    for t in targets:
+        for s in stops:
+            first = target_at[t] < stop_at[s]
+            for h in horizons:
+                label = first & (target_at[t] < h) & eligible[h]
+                col = label_column(t, s, h)
+                labels[col] = label.astype(np.int8)
+                positives = int(label.sum())
+                stats.append({"config": col, "profit_target": t, "stop_loss": s, "horizon": h,
+                              "rows": len(df), "eligible_rows": int(eligible[h].sum()), "positives": positives,
+                              "base_rate": positives / len(df) if len(df) else 0.0})
+    return pd.DataFrame(labels), pd.DataFrame(stats)
+
+def _floats(text):
+    return tuple(float(x) for x in text.split(","))
+
+def _ints(text):
+    return tuple(int(x) for x in text.split(","))
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label training features")
+    parser.add_argument("--target", type=float, default=PROFIT_TARGET)
+    parser.add_argument("--stop", type=float, default=STOP_LOSS)
+    parser.add_argument("--horizon", type=int, default=HORIZON_DAYS)
+    parser.add_argument("--sweep", action="store_true", help=f"label a grid of configs into {GRID_CSV}")
+    parser.add_argument("--targets", type=_floats, default=GRID_TARGETS, help="comma-separated, e.g. 0.02,0.03")
+    parser.add_argument("--stops", type=_floats, default=GRID_STOPS)
+    parser.add_argument("--horizons", type=_ints, default=GRID_HORIZONS)
+    args = parser.parse_args()
+
     print(f"Loading: {INPUT_CSV}")
-    df = pd.read_csv(INPUT_CSV)
+    usecols = (lambda c: c in (KEY, "timestamp", "date", "open", "high", "low", "close")) if args.sweep else None
+    df = pd.read_csv(INPUT_CSV, usecols=usecols, dtype={KEY: np.int32})
 
     # If your timestamp is not in datetime, convert
     if "timestamp" in df.columns:
@@ -50,10 +159,19 @@ if __name__ == "__main__":
     elif "date" in df.columns:
         df["timestamp"] = pd.to_datetime(df["date"])
 
-    print(f"Labeling {len(df)} rows...")
-    df_labeled = label_swing_trades(df)
-    print("Label distribution:", df_labeled["label"].value_counts(normalize=True))
+    if args.sweep:
+        n_configs = len(args.targets) * len(args.stops) * len(args.horizons)
+        print(f"Labeling {len(df)} rows × {n_configs} configs...")
+        labels, stats = label_grid(df, args.targets, args.stops, args.horizons)
+        labels.to_csv(GRID_CSV, index=False)
+        stats.to_csv(GRID_STATS_CSV, index=False)
+        print(stats[["config", "eligible_rows", "positives", "base_rate"]].to_string(index=False))
+        print(f"✅ Saved {n_configs} label columns to {GRID_CSV}, statistics to {GRID_STATS_CSV}")
+    else:
+        print(f"Labeling {len(df)} rows...")
+        df_labeled = label_swing_trades(df, args.target, args.stop, args.horizon)
+        print("Label distribution:", df_labeled["label"].value_counts(normalize=True))
 
-    # Save to file
-    df_labeled.to_csv(OUTPUT_CSV, index=False)
-    print(f"✅ Saved labeled training data to {OUTPUT_CSV}")
+        # Save to file
+        df_labeled.to_csv(OUTPUT_CSV, index=False)
+        print(f"✅ Saved labeled training data to {OUTPUT_CSV}")
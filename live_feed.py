@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+live_feed.py
+
+Streaming last prices for the current picks and open history positions.
+
+- LastPriceTable: in-memory symbol → (ltp, high, low, since, volume,
+  updated_at, score) table. One writer (the feed thread) and any number of
+  readers, with no locks: values live in preallocated NumPy arrays, and
+  growing them swaps in a new array tuple with a single reference assignment.
+  high/low are the range of the ticks seen since `since` (the symbol's
+  subscription or the start of the IST session, whichever is later), not
+  the broker's day range, most of which can predate a pick's entry.
+- LiveScorer: re-scores a symbol on every tick. Indicator state is seeded from
+  the completed daily bars (streaming_indicators.IndicatorBook), the tick is
+  applied as today's partial bar and the one feature row goes through the
+  model (the compiled forest in the scanner worker).
+- LiveFeed: FYERS websocket (SymbolUpdate) subscriber writing into the table,
+  with each tick's score when a scorer is attached.
+- ReplayServer / ReplayFeed: a local TCP server that streams recorded ticks in
+  the broker's message format, and a client for it, so the feed can be
+  exercised offline. Each subscription reads on its own connection; one
+  writer thread per feed applies the ticks.
+
+Run directly for an offline self-check against the replay server:
+    python live_feed.py
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+import socketserver
+import numpy as np
+import pandas as pd
+from forest_model import CompiledForest
+from feature_kernel import panel_from_bars
+from streaming_indicators import IndicatorBook
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("ltp", "high", "low", "since", "volume", "updated_at", "score")
+IST_OFFSET_SEC = 19800   # sessions are IST calendar days
+LIVE_FEED = os.getenv("LIVE_FEED", "1") != "0"
+LIVE_FEED_REPLAY = os.getenv("LIVE_FEED_REPLAY", "")     # "host:port" of a ReplayServer
+LIVE_MAX_AGE_SEC = float(os.getenv("LIVE_MAX_AGE_SEC", "60"))
+
+
+class LastPriceTable:
+    def __init__(self, capacity=1024):
+        self._slots = {}
+        self._arrays = tuple(np.full(capacity, np.nan) for _ in FIELDS)
+
+    def _slot(self, symbol):
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = len(self._slots)
+            if slot >= len(self._arrays[0]):
+                grown = tuple(np.concatenate([a, np.full(len(a), np.nan)]) for a in self._arrays)
+                self._arrays = grown          # single reference swap, readers keep the old tuple
+            self._slots[symbol] = slot
+        return slot
+
+    def update(self, symbol, ltp, volume=None, ts=None, score=None, restart=False):
+        """
+        Writer side: called only from the feed thread. The high/low range
+        starts over on the first tick of a session, or with restart=True
+        (the first tick after a (re)subscription).
+        """
+        i = self._slot(symbol)
+        ltp_a, high_a, low_a, since_a, vol_a, ts_a, score_a = self._arrays
+        now = time.time() if ts is None else ts
+        ltp_a[i] = ltp
+        if restart or np.isnan(since_a[i]) or (now + IST_OFFSET_SEC) // 86400 != (since_a[i] + IST_OFFSET_SEC) // 86400:
+            high_a[i] = low_a[i] = ltp
+            since_a[i] = now
+        elif ltp > high_a[i]:
+            high_a[i] = ltp
+        elif ltp < low_a[i]:
+            low_a[i] = ltp
+        if volume is not None:
+            vol_a[i] = volume
+        ts_a[i] = now
+        if score is not None:
+            score_a[i] = score
+
+    def get(self, symbol, max_age=None):
+        """Quote-like dict for one symbol, or None if unseen (or older than max_age seconds)."""
+        slot = self._slots.get(symbol)
+        if slot is None:
+            return None
+        arrays = self._arrays
+        row = {f: float(a[slot]) for f, a in zip(FIELDS, arrays)}
+        if np.isnan(row["ltp"]) or (max_age is not None and time.time() - row["updated_at"] > max_age):
+            return None
+        return row
+
+    def snapshot(self, symbols=None, max_age=None):
+        symbols = list(self._slots) if symbols is None else symbols
+        out = {}
+        for sym in symbols:
+            q = self.get(sym, max_age)
+            if q is not None:
+                out[sym] = q
+        return out
+
+    def __len__(self):
+        return len(self._slots)
+
+
+class LiveScorer:
+    """
+    Tick-by-tick scores for a fixed set of symbols. Built whole and then
+    handed to a feed (one reference assignment), so the feed thread never
+    sees a half-seeded book.
+    """
+
+    def __init__(self, model, feature_list, bars_by_sym, obv_offsets=None):
+        """
+        bars_by_sym: {symbol: completed daily bars, oldest first}; obv_offsets:
+        {symbol: shift onto the training OBV scale} (scanner.obv_offsets).
+        """
+        self.model = model
+        self.feature_list = list(feature_list)
+        self.book = IndicatorBook()
+        self.book.seed_panel(panel_from_bars(bars_by_sym))
+        for sym, offset in (obv_offsets or {}).items():
+            if sym in self.book.states:
+                self.book.states[sym].obv += offset
+        self.scored = 0
+
+    def __contains__(self, symbol):
+        return symbol in self.book.states
+
+    def score(self, symbol, ltp, high=None, low=None, open_=None, volume=0.0):
+        """Model score with `ltp` as today's close, or None when the symbol cannot be scored."""
+        feats = self.book.update(symbol, ltp, high, low, open_, volume)
+        if not feats:
+            return None
+        X = np.array([[feats.get(f, 0.0) for f in self.feature_list]])
+        if not isinstance(self.model, CompiledForest):
+            X = pd.DataFrame(X, columns=self.feature_list)     # sklearn checks feature names
+        self.scored += 1
+        return float(self.model.predict_proba(X)[0, 1])
+
+
+class _FeedBase:
+    def __init__(self, table, scorer=None):
+        self.table = table
+        self.scorer = scorer          # LiveScorer, swapped in whole by the owner
+        self.symbols = set()
+        self.ticks = 0
+        self._restart = set()         # subscribed since their last tick: their range starts over
+
+    def _on_message(self, msg):
+        """
+        Broker SymbolUpdate message → table row, re-scored when the scorer
+        knows the symbol. Lite mode only carries ltp. The message's day
+        high/low feed the score (today's partial bar) but not the table's
+        range, which only covers ticks seen since subscription.
+        """
+        if not isinstance(msg, dict) or "symbol" not in msg or "ltp" not in msg:
+            return
+        self.ticks += 1
+        sym, high, low, volume = msg["symbol"], msg.get("high_price"), msg.get("low_price"), msg.get("vol_traded_today")
+        scorer, score = self.scorer, None
+        if scorer is not None and sym in scorer:
+            try:
+                score = scorer.score(sym, msg["ltp"], high, low, msg.get("open_price"), volume or 0.0)
+            except Exception as e:
+                logger.warning(f"Live re-score failed for {sym}: {e}")
+        restart = sym in self._restart
+        if restart:
+            self._restart.discard(sym)
+        self.table.update(sym, msg["ltp"], volume, score=score, restart=restart)
+
+    def set_symbols(self, symbols):
+        """Subscribe to `symbols`, dropping any no longer wanted."""
+        symbols = set(symbols)
+        added, removed = symbols - self.symbols, self.symbols - symbols
+        self.symbols = symbols
+        self._restart |= added
+        if added:
+            self._subscribe(sorted(added))
+        if removed:
+            self._unsubscribe(sorted(removed))
+
+
+class LiveFeed(_FeedBase):
+    """FYERS data websocket subscriber."""
+
+    def __init__(self, table, access_token=None, litemode=False, scorer=None):
+        super().__init__(table, scorer)
+        if access_token is None:
+            from fyers_connect import APP_ID, _load_token
+            access_token = f"{APP_ID}:{_load_token()}"
+        self.access_token = access_token
+        self.litemode = litemode
+        self._socket = None
+
+    def start(self, symbols=()):
+        from fyers_apiv3.FyersWebsocket import data_ws
+        self._socket = data_ws.FyersDataSocket(
+            access_token=self.access_token, litemode=self.litemode, write_to_file=False,
+            log_path="", reconnect=True, on_message=self._on_message,
+            on_error=lambda e: logger.warning(f"Live feed error: {e}"),
+            on_connect=lambda: self._subscribe(sorted(self.symbols)) if self.symbols else None,
+            on_close=lambda m: logger.info(f"Live feed closed: {m}"),
+        )
+        self.symbols = set(symbols)
+        self._socket.connect()
+        return self
+
+    def _subscribe(self, symbols):
+        if self._socket is not None:
+            self._socket.subscribe(symbols=symbols, data_type="SymbolUpdate")
+
+    def _unsubscribe(self, symbols):
+        if self._socket is not None:
+            self._socket.unsubscribe(symbols=symbols, data_type="SymbolUpdate")
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close_connection()
+            self._socket = None
+
+
+# ─── Offline replay ──────────────────────────────────────────
+class ReplayServer:
+    """
+    Local TCP stand-in for the data feed. A client sends one JSON line
+    {"subscribe": [...]}; the server replays `ticks` (broker-format dicts)
+    for those symbols as JSON lines, `interval` seconds apart, then closes.
+    """
+
+    def __init__(self, ticks, interval=0.0, host="127.0.0.1", port=0):
+        ticks, delay = list(ticks), interval
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                wanted = set(json.loads(self.rfile.readline()).get("subscribe", []))
+                for tick in ticks:
+                    if tick.get("symbol") in wanted:
+                        self.wfile.write((json.dumps(tick) + "\n").encode())
+                        if delay:
+                            time.sleep(delay)
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ReplayFeed(_FeedBase):
+    """Client for ReplayServer with the same interface as LiveFeed."""
+
+    def __init__(self, table, address, scorer=None):
+        super().__init__(table, scorer)
+        self.address = address
+        self._ticks = queue.Queue()
+        self._readers = []
+        self._writer = None
+
+    def start(self, symbols=()):
+        self.set_symbols(symbols)
+        return self
+
+    def _write(self):
+        """The feed's only table writer: applies ticks from every connection in arrival order."""
+        while True:
+            msg = self._ticks.get()
+            try:
+                if msg is None:
+                    return
+                self._on_message(msg)
+            finally:
+                self._ticks.task_done()
+
+    def _subscribe(self, symbols):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write, daemon=True)
+            self._writer.start()
+
+        def read():
+            with socket.create_connection(self.address) as sock, sock.makefile("rwb") as f:
+                f.write((json.dumps({"subscribe": symbols}) + "\n").encode())
+                f.flush()
+                for line in f:
+                    self._ticks.put(json.loads(line))
+        t = threading.Thread(target=read, daemon=True)
+        t.start()
+        self._readers.append(t)
+
+    def _unsubscribe(self, symbols):
+        pass  # replay connections end on their own
+
+    def join(self, timeout=None):
+        """Wait for the replay connections to finish and their ticks to be applied."""
+        deadline = None if timeout is None else time.time() + timeout
+        for t in self._readers:
+            t.join(None if deadline is None else max(0.0, deadline - time.time()))
+        while self._ticks.unfinished_tasks and (deadline is None or time.time() < deadline):
+            time.sleep(0.005)
+
+    def stop(self):
+        self.join(0)
+        if self._writer is not None:
+            self._ticks.put(None)
+            self._writer = None
+
+
+def make_feed(table, scorer=None):
+    """LiveFeed, or a ReplayFeed when LIVE_FEED_REPLAY points at a replay server."""
+    if LIVE_FEED_REPLAY:
+        host, port = LIVE_FEED_REPLAY.rsplit(":", 1)
+        return ReplayFeed(table, (host, int(port)), scorer)
+    return LiveFeed(table, scorer=scorer)
+
+
+if __name__ == "__main__":
+    ticks = [{"symbol": f"NSE:SYM{i % 4}-EQ", "ltp": 100 + i, "high_price": 500, "low_price": 1, "type": "sf"}
+             for i in range(40)]
+    ticks.append({"type": "cn", "message": "not a price"})
+    server = ReplayServer(ticks).start()
+    table = LastPriceTable(capacity=2)       # forces one grow
+    feed = ReplayFeed(table, server.address).start(["NSE:SYM0-EQ", "NSE:SYM1-EQ", "NSE:SYM2-EQ"])
+    feed.set_symbols(["NSE:SYM0-EQ", "NSE:SYM1-EQ", "NSE:SYM2-EQ", "NSE:SYM3-EQ"])   # a second connection
+    feed.join(5)
+    feed.stop()
+    server.stop()
+    snap = table.snapshot()
+    print(f"Ticks: {feed.ticks}, symbols: {len(table)}")
+    assert feed.ticks == 40
+    assert len(set(table._slots.values())) == len(table) == 4, "one writer: every symbol gets its own slot"
+    assert snap["NSE:SYM2-EQ"]["ltp"] == 138
+    assert (snap["NSE:SYM0-EQ"]["low"], snap["NSE:SYM0-EQ"]["high"]) == (100, 136), "range of ticks seen, not the day's"
+    assert table.get("NSE:SYM0-EQ", max_age=60) is not None and table.get("NSE:NOPE-EQ") is None
+    print("✅ Replay feed → last-price table ok")
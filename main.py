@@ -3,18 +3,22 @@ import streamlit as st
 from streamlit_autorefresh import st_autorefresh
 from datetime import datetime, time as dtime, timedelta
 import zoneinfo
-import sqlite3
 import pandas as pd
 import subprocess
 import os
-import threading, time
+import time
+from scanner_worker import ScannerWorker, read_status
+from dashboard_data import (load_scanner_output, load_hit_rate, load_recent_history, load_scan_metrics,
+                            load_scan_progress)
+from scanner import RESUME_MAX_AGE_SEC
+from pick_tracker import CONFIDENCE_THRESHOLD, MIN_TARGET_PCT, TOP_N, STOP_PCT
+from live_feed import LIVE_MAX_AGE_SEC
 # ─── Constants ────────────────────────────────────────────────
 IST = zoneinfo.ZoneInfo("Asia/Kolkata")
-CONFIDENCE_THRESHOLD = 0.5
-MIN_TARGET_PCT = 0.025
 MARKET_OPEN, MARKET_CLOSE = dtime(9,15), dtime(15,30)
 AI_SCANNER_OUTPUT = "ai_scanner_output.csv"
 HISTORY_DB = "history.db"
+EMBEDDED_WORKER = os.getenv("SCANNER_WORKER_EMBEDDED", "1") != "0"
 
 # ─── CSS Styling ──────────────────────────────────────────────
 st.set_page_config(
@@ -55,48 +59,30 @@ h1,h2,h3,h4,h5,h6,p,label {color: #e0f7fa !important;}
 </style>
 """, unsafe_allow_html=True)
 
+# ─── Scanner worker: one warm, single-flight scanner per server ─
+@st.cache_resource
+def get_scanner_worker():
+    return ScannerWorker().start()
+
+worker = get_scanner_worker() if EMBEDDED_WORKER else None
+live_prices = worker.prices if worker and worker.live_prices_active() else None
+
+# ─── Scan progress (scanner.run_scanner publishes partial picks per chunk) ─
+progress = load_scan_progress()
+scan_partial = progress.get("state") == "running"
+scan_live = scan_partial and time.time() - progress.get("updated", 0) <= RESUME_MAX_AGE_SEC
+
 # ─── Autorefresh ──────────────────────────────────────────────
-st_autorefresh(interval=300_000, key="refresh")  # 5 min
-
-# ─── Load History DB for Overall Hit% ────────────────────────
-conn = sqlite3.connect(HISTORY_DB, check_same_thread=False)
-c    = conn.cursor()
-
-# ─── Helper to get overall hit rate ──────────────────────────
-def get_hit_rate():
-    try:
-        hits  = c.execute("SELECT COUNT(*) FROM history WHERE target_hit='Hit'").fetchone()[0]
-        total = c.execute("SELECT COUNT(*) FROM history").fetchone()[0]
-        return (hits / total * 100) if total else 0.0
-    except:
-        return 0.0
-
-# ─── Run scanner.py live, ONLY during market hours ───────────
-def run_scanner_now():
-    with st.spinner("Running AI Scanner for live picks..."):
-        result = subprocess.run(
-            ["python", "scanner.py"],
-            capture_output=True, text=True
-        )
-        if result.returncode == 0:
-            st.info("AI scanner refreshed with live data!")
-        else:
-            st.error("Scanner failed! See console for details.")
-            st.code(result.stdout + "\n" + result.stderr)
-
-def auto_run_scanner():
-    IST = zoneinfo.ZoneInfo("Asia/Kolkata")
-    while True:
-        now = datetime.now(IST).time()
-        if dtime(9,15) <= now <= dtime(15,30):
-            os.system("python scanner.py")
-        time.sleep(300)  # 5 min
-
-# Launch in background (unsafe on Streamlit Cloud!)
-if "scanner_thread_started" not in st.session_state:
-    t = threading.Thread(target=auto_run_scanner, daemon=True)
-    t.start()
-    st.session_state.scanner_thread_started = True
+# Live ticks are already in memory (and partial picks land per chunk), so redraw often then
+st_autorefresh(interval=15_000 if live_prices is not None or scan_live else 300_000, key="refresh")  # 15 s / 5 min
+
+def scanner_status():
+    return worker.status() if worker else read_status()
+
+def counter_total(counters, name):
+    """A scan_metrics counter, summed over its labels if it has any."""
+    value = counters.get(name, 0)
+    return sum(value.values()) if isinstance(value, dict) else value
 
 # ─── Retrain Model Button ────────────────────────────────────
 def retrain_model():
@@ -121,21 +107,69 @@ st.markdown(f"**Last refresh:** {now_dt.strftime('%Y-%m-%d %H:%M:%S')} IST")
 force_open = st.sidebar.checkbox("🛠️ Force Market Open", value=False)
 is_open    = force_open or (MARKET_OPEN <= now_time <= MARKET_CLOSE)
 
+if worker:
+    worker.force_market_open = force_open
+
 # Retrain Button (top right)
 with st.sidebar:
     st.markdown("## 🤖 AI Model Control")
     if st.button("🔁 Retrain Model (Full Pipeline)"):
         retrain_model()
 
-# ─── Main Logic: Scanner auto-refresh during open market ────
-if is_open:
-    run_scanner_now()
+    # ─── Scanner status: the worker scans on its own schedule ──
+    st.markdown("## 🛰️ Scanner")
+    status = scanner_status()
+    if scan_partial:
+        done, total = len(progress.get("done", [])), progress.get("total") or 0
+        label = "Scan in progress" if scan_live else "Scan interrupted (resumes on the next scan)"
+        st.progress(done / total if total else 0.0,
+                    text=f"{label}: {done}/{total} symbols · {progress.get('rows', 0)} rows so far")
+        if progress.get("first_pick_sec") is not None:
+            st.caption(f"First pick after {progress['first_pick_sec']:.0f}s")
+    elif status.get("state") == "scanning":
+        st.info(f"Scan in progress (started {status.get('last_started')})")
+    elif status.get("last_finished"):
+        st.caption(f"Last scan: {status['last_finished']} · {status.get('last_rows')} rows "
+                   f"· {status.get('last_duration_sec')}s")
+    if status.get("last_error"):
+        st.error(f"Last scan failed: {status['last_error']}")
+    if worker and st.button("▶ Scan now", disabled=worker.is_scanning()):
+        worker.request_scan()
+        st.info("Scan requested; picks update when it finishes.")
+
+    # ─── Last scan metrics (written by scanner.run_scanner) ──
+    metrics = load_scan_metrics()
+    if metrics:
+        counters = metrics.get("counters", {})
+        with st.expander("📈 Last scan metrics"):
+            scored, universe = counter_total(counters, "symbols_scored"), counter_total(counters, "symbols")
+            first_pick = metrics.get("marks", {}).get("first_pick")
+            st.caption(f"{metrics.get('started')} · {metrics.get('duration_sec')}s · scored {scored}/{universe}"
+                       + (f" · first pick {first_pick}s" if first_pick is not None else ""))
+            st.caption(" · ".join(f"{label} {counter_total(counters, name)}" for label, name in (
+                ("API calls", "api_calls"), ("errors", "api_errors"), ("rate-limited", "rate_limited"),
+                ("rejected symbols", "quote_symbol_errors"))))
+            tiers = counters.get("tier_survivors", {})
+            if tiers:
+                st.caption("Tiers: " + " → ".join(
+                    [f"{universe} universe"] + [f"{tiers[f'tier={t}']} {t}" for t in ("quoted", "screened", "featurized")
+                                                if f"tier={t}" in tiers] + [f"{scored} scored"]))
+            skipped = counters.get("symbols_skipped", {})
+            if skipped:
+                st.caption("Skipped: " + ", ".join(f"{k.split('=', 1)[1]} {v}" for k, v in skipped.items()))
+            stages = pd.DataFrame([
+                {"Stage": stage, "Count": s["count"], "Mean ms": round((s["mean"] or 0) * 1e3, 1),
+                 "p95 ms": round((s["p95"] or 0) * 1e3, 1), "Total s": round(s["sum"], 2)}
+                for stage, s in metrics.get("stages", {}).items()
+            ])
+            if not stages.empty:
+                st.dataframe(stages, hide_index=True, use_container_width=True)
 
 # ─── Layout: Main + Right Panel ─────────────────────────────
 col_main, col_side = st.columns([3, 1])
 
 with col_side:
-    rate = get_hit_rate()
+    rate = load_hit_rate(HISTORY_DB)
     st.markdown(f"""
     <div class="widget-card">
       <h4>Overall Hit %</h4>
@@ -145,11 +179,13 @@ with col_side:
 
 with col_main:
     # ─── Load Scanner Output ────────────────────────────────
+    # Cached on the file's mtime: reruns only re-read it after a new scan
     if not os.path.exists(AI_SCANNER_OUTPUT):
         st.warning("No scanner output found. Please run the scanner or retrain pipeline.")
-        df_all = pd.DataFrame()
-    else:
-        df_all = pd.read_csv(AI_SCANNER_OUTPUT)
+    df_all = load_scanner_output(AI_SCANNER_OUTPUT)
+    if scan_partial:
+        st.info(f"Partial scan: best picks so far from {len(progress.get('done', []))}/{progress.get('total')} "
+                "symbols; the table fills in as the scan continues.")
     st.write(f"🔍 Loaded: {df_all.shape[0]} picks", df_all.head(3))
 
     # ─── Filtering ─────────────────────────────────────────
@@ -163,14 +199,16 @@ with col_main:
         st.write(f"➡️ After target ≥ 2%: {len(df_all)}")
 
         # 3. Top 5 picks by score
-        df_top5 = df_all.nlargest(5, "score").copy()
+        df_top5 = df_all.nlargest(TOP_N, "score").copy()
 
         # 4. Action logic (hold/sell)
         picks = []
         for _, row in df_top5.iterrows():
             entry = row["price"]
-            ltp   = row["price"]    # (Optional: Replace with fresh live price if desired)
-            stop_level   = entry * 0.99
+            tick  = live_prices.get(row["symbol"], max_age=LIVE_MAX_AGE_SEC) if live_prices is not None else None
+            ltp   = tick["ltp"] if tick else row["price"]
+            live_score = tick["score"] if tick and pd.notna(tick["score"]) else row["score"]   # re-scored per tick
+            stop_level   = entry * (1 - STOP_PCT)
             profit_level = row["target_price"]
             if ltp <= stop_level:
                 action = "Sell"
@@ -182,8 +220,9 @@ with col_main:
                 "Symbol":        row["symbol"],
                 "Entry Price":   round(entry,2),
                 "LTP":           round(ltp,2),
-                "% Change":      0.00,
+                "% Change":      round((ltp / entry - 1) * 100, 2),
                 "AI Score":      round(row["score"],4),
+                "Live Score":    round(live_score,4),
                 "Stop @":        round(stop_level,2),
                 "Target Price":  round(profit_level,2),
                 "Action":        action
@@ -207,26 +246,18 @@ with col_main:
 
     # ─── History Section ──────────────────────────────────
     st.header("📜 History of Past Picks (last 20)")
-    try:
-        rows = c.execute("""
-            SELECT symbol, picked_at, entry_price, dropped_at, exit_price, target_price, target_hit, pct_change
-            FROM history ORDER BY id DESC LIMIT 20
-        """).fetchall()
-        if rows:
-            hist_df = pd.DataFrame(rows, columns=[
-                "Symbol","Picked At","Entry Price","Dropped On",
-                "Exit Price","Target Price","Hit/Miss","% Change"
-            ])
-            def hist_style(r):
-                return ["background-color:#144d14;color:#fff"]*len(r) if r["% Change"]>=0 else ["background-color:#4d1414;color:#fff"]*len(r)
-            st.dataframe(hist_df.style.apply(hist_style, axis=1), use_container_width=True)
-            # Download option
-            csv = hist_df.to_csv(index=False).encode("utf-8")
-            st.download_button("Download Full History as CSV", data=csv,
-                               file_name="swing_history.csv", mime="text/csv")
-        else:
-            st.info("No pick history yet.")
-    except Exception as ex:
+    hist_df = load_recent_history(20, HISTORY_DB)
+    if hist_df is None:
         st.info("History DB not found or empty.")
+    elif not hist_df.empty:
+        def hist_style(r):
+            return ["background-color:#144d14;color:#fff"]*len(r) if r["% Change"]>=0 else ["background-color:#4d1414;color:#fff"]*len(r)
+        st.dataframe(hist_df.style.apply(hist_style, axis=1), use_container_width=True)
+        # Download option
+        csv = hist_df.to_csv(index=False).encode("utf-8")
+        st.download_button("Download Full History as CSV", data=csv,
+                           file_name="swing_history.csv", mime="text/csv")
+    else:
+        st.info("No pick history yet.")
 
 # End of script
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+pick_tracker.py
+
+Records each scan's top picks into history.db and closes them out.
+
+- select_top_picks: the dashboard's pick rules (score threshold, target hurdle, top 5)
+- record_picks: batched insert; a symbol that is already open is not re-entered
+- evaluate_open_picks: one pass over all open picks against one price snapshot,
+  marking Hit (target reached), Stop (1% stop reached) or Expired (held too long).
+  Holding time is counted in trading days: weekdays that are not market
+  holidays (market_holidays), i.e. the sessions the backtest counts as bars.
+  A quote's day high/low only counts from the session after entry: on the entry
+  day most of that range predates the pick, so only the ltp is checked. A
+  live-feed range (high/low since a tick time "since") counts once it started
+  after the entry.
+- track_scan / evaluate_live: price the snapshot from the live feed's last-price
+  table when it has fresh ticks, falling back to one batched quote call
+
+The DB runs in WAL mode so the dashboard can read while the tracker writes.
+
+Usage:
+    python pick_tracker.py          # record picks from ai_scanner_output.csv and evaluate
+"""
+
+import os
+import sqlite3
+import zoneinfo
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import bar_store
+from bar_cache import bar_dates
+from label_training_data import HORIZON_DAYS
+from live_feed import LIVE_MAX_AGE_SEC
+
+IST = zoneinfo.ZoneInfo("Asia/Kolkata")
+HISTORY_DB = "history.db"
+
+# ─── Pick rules (shared with main.py) ────────────────────────
+CONFIDENCE_THRESHOLD = 0.5
+MIN_TARGET_PCT = 0.025
+TOP_N = 5
+STOP_PCT = 0.01
+MAX_HOLD_DAYS = HORIZON_DAYS   # trading days, same horizon the model is trained on
+# Announced closures (YYYY-MM-DD, comma-separated) past the bar store's last session
+NSE_HOLIDAYS = [d.strip() for d in os.getenv("NSE_HOLIDAYS", "").split(",") if d.strip()]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol       TEXT NOT NULL,
+    picked_at    TEXT NOT NULL,
+    entry_price  REAL NOT NULL,
+    stop_price   REAL,
+    target_price REAL,
+    score        REAL,
+    dropped_at   TEXT,
+    exit_price   REAL,
+    target_hit   TEXT NOT NULL DEFAULT 'Open',   -- Open | Hit | Stop | Expired
+    pct_change   REAL
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_history_symbol     ON history (symbol);
+CREATE INDEX IF NOT EXISTS idx_history_picked_at  ON history (picked_at);
+CREATE INDEX IF NOT EXISTS idx_history_target_hit ON history (target_hit);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_history_open_symbol ON history (symbol) WHERE target_hit = 'Open';
+"""
+
+
+def select_top_picks(df, threshold=CONFIDENCE_THRESHOLD, min_target_pct=MIN_TARGET_PCT, top_n=TOP_N):
+    """Scanner rows that pass the dashboard's filters, best `top_n` by score."""
+    if df.empty:
+        return df
+    df = df[df["score"] >= threshold]
+    df = df[(df["target_price"] / df["price"] - 1) >= min_target_pct]
+    return df.nlargest(top_n, "score")
+
+
+def connect(path=HISTORY_DB):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    # Older history tables predate these columns
+    have = {r[1] for r in conn.execute("PRAGMA table_info(history)")}
+    for col, decl in (("stop_price", "REAL"), ("score", "REAL")):
+        if col not in have:
+            conn.execute(f"ALTER TABLE history ADD COLUMN {col} {decl}")
+    _expire_duplicate_open(conn)
+    conn.executescript(INDEXES)
+    return conn
+
+
+def _expire_duplicate_open(conn):
+    """
+    One-time cleanup before idx_history_open_symbol exists: older tables could
+    hold several Open rows per symbol, which the unique index rejects. Keeps
+    the newest open pick per symbol and marks the rest Expired. No-op once
+    the index is there.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_history_open_symbol'").fetchone():
+        return
+    with conn:
+        conn.execute("""
+            UPDATE history SET target_hit = 'Expired', dropped_at = COALESCE(dropped_at, ?)
+            WHERE target_hit = 'Open' AND id NOT IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY picked_at DESC, id DESC) AS rn
+                    FROM history WHERE target_hit = 'Open'
+                ) WHERE rn = 1
+            )
+        """, (_now(),))
+
+
+def _now():
+    return datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def record_picks(conn, picks, picked_at=None):
+    """Insert picks (symbol, price, target_price, score) in one batch. Returns rows inserted."""
+    if picks is None or picks.empty:
+        return 0
+    picked_at = picked_at or _now()
+    rows = [
+        (r.symbol, picked_at, float(r.price), round(float(r.price) * (1 - STOP_PCT), 2),
+         float(r.target_price), float(r.score))
+        for r in picks.itertuples(index=False)
+    ]
+    before = conn.total_changes
+    with conn:
+        conn.executemany("""
+            INSERT INTO history (symbol, picked_at, entry_price, stop_price, target_price, score, target_hit)
+            VALUES (?, ?, ?, ?, ?, ?, 'Open')
+            ON CONFLICT DO NOTHING
+        """, rows)
+    return conn.total_changes - before
+
+
+def holidays_between(sessions):
+    """Weekdays between the first and last of `sessions` (dates) with no session, as datetime64[D]."""
+    sessions = np.unique(np.asarray(sessions, dtype="datetime64[D]"))
+    if not len(sessions):
+        return sessions
+    days = np.arange(sessions[0], sessions[-1] + 1, dtype="datetime64[D]")
+    return days[np.is_busday(days) & ~np.isin(days, sessions)]
+
+
+_holidays_cache = {}
+
+def market_holidays(path=None):
+    """
+    Weekdays the market was shut, for np.busday_count: weekdays within the
+    bar store's range on which no symbol has a bar, plus NSE_HOLIDAYS for
+    closures after its last session. Cached per bar store revision.
+    """
+    path = path or bar_store.BARS_DB
+    extra = np.array(NSE_HOLIDAYS, dtype="datetime64[D]")
+    if not os.path.exists(path):
+        return np.unique(extra)
+    conn = bar_store.connect(path)
+    try:
+        rev = bar_store.revision(conn)
+        cached = _holidays_cache.get(path)
+        if cached is None or cached[0] != rev:
+            ts = pd.Series([r[0] for r in conn.execute("SELECT DISTINCT timestamp FROM bars")], dtype="int64")
+            sessions = bar_dates(pd.to_datetime(ts, unit="s")).to_numpy()
+            cached = _holidays_cache[path] = (rev, holidays_between(sessions))
+    finally:
+        conn.close()
+    return np.union1d(cached[1], extra)
+
+
+def open_picks(conn):
+    return pd.read_sql_query("""
+        SELECT id, symbol, picked_at, entry_price, stop_price, target_price
+        FROM history WHERE target_hit = 'Open'
+    """, conn)
+
+
+def evaluate_open_picks(conn, prices, now=None, max_hold_days=MAX_HOLD_DAYS, holidays=None):
+    """
+    Close out open picks against one price snapshot.
+    prices: {symbol: quote dict with "ltp" and optionally "high"/"low"} or {symbol: ltp}.
+    High/low are the session's range, so they are used only for picks entered
+    before `now`'s date; picks entered today are checked against the ltp. A
+    quote with "since" (epoch seconds; live_feed.LastPriceTable) carries the
+    range of the ticks from then on, used for picks entered by that time.
+    A snapshot whose range touches both stop and target counts as a stop.
+    A pick expires after max_hold_days trading days: weekdays after its entry
+    day up to `now`'s, excluding `holidays` (default market_holidays()).
+    Returns a DataFrame of the picks closed.
+    """
+    picks = open_picks(conn)
+    if picks.empty:
+        return picks
+    now = now or datetime.now(IST)
+
+    def field(sym, key):
+        q = prices.get(sym)
+        if isinstance(q, dict):
+            v = q.get(key)
+            return np.nan if v is None else float(v)
+        return np.nan if q is None else float(q)
+
+    ltp = np.array([field(s, "ltp") for s in picks["symbol"]])
+    high = np.array([field(s, "high") for s in picks["symbol"]])
+    low = np.array([field(s, "low") for s in picks["symbol"]])
+    since = np.array([field(s, "since") for s in picks["symbol"]])
+    picked_at = pd.to_datetime(picks["picked_at"])
+    picked = picked_at.dt.date.to_numpy().astype("datetime64[D]")
+    entered = (picked_at.dt.tz_localize(IST) - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy()
+    with np.errstate(invalid="ignore"):
+        after_entry = np.where(np.isnan(since), picked < np.datetime64(now.date()), since >= entered)
+    high = np.where(np.isnan(high) | ~after_entry, ltp, high)
+    low = np.where(np.isnan(low) | ~after_entry, ltp, low)
+    stop = picks["stop_price"].fillna(picks["entry_price"] * (1 - STOP_PCT)).to_numpy()
+    target = picks["target_price"].to_numpy()
+
+    holidays = market_holidays() if holidays is None else holidays
+    held = np.busday_count(picked, np.datetime64(now.date()), holidays=holidays)
+    priced = ~np.isnan(ltp)
+    stopped = priced & (low <= stop)
+    hit = priced & ~stopped & (high >= target)
+    expired = priced & ~stopped & ~hit & (held >= max_hold_days)
+
+    outcome = np.select([stopped, hit, expired], ["Stop", "Hit", "Expired"], default="Open")
+    exit_price = np.select([stopped, hit, expired], [stop, target, ltp], default=np.nan)
+    closed = picks.assign(target_hit=outcome, exit_price=exit_price)[outcome != "Open"]
+    if closed.empty:
+        return closed
+    closed["pct_change"] = ((closed["exit_price"] / closed["entry_price"] - 1) * 100).round(2)
+    closed["dropped_at"] = now.strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        conn.executemany("""
+            UPDATE history SET dropped_at = ?, exit_price = ?, target_hit = ?, pct_change = ?
+            WHERE id = ? AND target_hit = 'Open'
+        """, [(r.dropped_at, round(float(r.exit_price), 2), r.target_hit, float(r.pct_change), int(r.id))
+              for r in closed.itertuples(index=False)])
+    return closed
+
+
+def track_scan(conn, scan_df, fyers=None, prices=None, live=None):
+    """
+    After a scan: evaluate the picks already open against one price snapshot
+    (`prices` if given, else fresh ticks from `live`, a
+    live_feed.LastPriceTable, with one batched quote call for any symbol the
+    feed has not priced), then record the scan's top picks, except symbols
+    that were open at this scan. Picks entered by this call are not
+    evaluated: the snapshot is their entry price.
+    Returns (inserted, closed).
+    """
+    if prices is None:
+        symbols = open_picks(conn)["symbol"].tolist()
+        prices = live.snapshot(symbols, max_age=LIVE_MAX_AGE_SEC) if live is not None else {}
+        missing = [s for s in symbols if s not in prices]
+        if fyers is not None and missing:
+            from scanner import get_live_quotes
+            prices.update({s: q for s, q in get_live_quotes(missing, fyers).items() if q})
+        elif missing and not scan_df.empty:
+            scan_prices = dict(zip(scan_df["symbol"], scan_df["price"]))
+            prices.update({s: scan_prices[s] for s in missing if s in scan_prices})
+    closed = evaluate_open_picks(conn, prices)
+    picks = select_top_picks(scan_df)
+    if not closed.empty and not picks.empty:
+        picks = picks[~picks["symbol"].isin(closed["symbol"])]   # was open at this scan: no re-entry
+    inserted = record_picks(conn, picks)
+    return inserted, closed
+
+
+def evaluate_live(conn, live):
+    """Close out open picks against the feed's fresh ticks only (no quote calls)."""
+    return evaluate_open_picks(conn, live.snapshot(max_age=LIVE_MAX_AGE_SEC))
+
+
+if __name__ == "__main__":
+    from scanner import OUTPUT_CSV
+    conn = connect()
+    scan = pd.read_csv(OUTPUT_CSV)
+    inserted, closed = track_scan(conn, scan)
+    print(f"✅ Recorded {inserted} new picks, closed {len(closed)} open picks")
+    if not closed.empty:
+        print(closed[["symbol", "entry_price", "exit_price", "target_hit", "pct_change"]])
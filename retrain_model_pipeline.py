@@ -2,30 +2,206 @@
 """
 retrain_model_pipeline.py
 
-Runs the full retrain pipeline:
+Runs the full retrain pipeline as a stage graph:
 1. Append today's bar
 2. Feature engineering
 3. Label data
 4. Train model
 5. Run scanner to update picks (ai_scanner_output.csv)
+
+Each stage declares the files it reads and writes; a stage depends on
+whichever stages write its inputs. A stage is skipped when the content hashes
+of its inputs (data files and its own code) match its last successful run and
+its outputs still exist, so a retrain with no new bars only re-runs the
+always-run stages (append bar, scanner). Stages whose dependencies are done
+run in parallel. Timings go to pipeline_state.json (latest) and
+pipeline_timings.jsonl (one line per run).
+
+Usage:
+    python retrain_model_pipeline.py            # run what changed
+    python retrain_model_pipeline.py --force    # run every stage
 """
 
-import subprocess
+import os
 import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import bar_store
+from feature_engineering import OUTPUT_CSV as FEATURES_CSV, CHECKPOINT_FILE as FEATURE_CHECKPOINTS
+from label_training_data import OUTPUT_CSV as LABELED_CSV
+
+STATE_FILE  = "pipeline_state.json"
+TIMINGS_LOG = "pipeline_timings.jsonl"
+MODEL_PATH  = "models/ai_model.pkl"
+
+
+class Stage:
+    def __init__(self, name, label, script, inputs=(), outputs=(), always=False):
+        self.name = name
+        self.label = label
+        self.script = script
+        self.inputs = [script, *inputs]
+        self.outputs = list(outputs)
+        self.always = always     # reads the outside world (broker API), so never cached
+
+
+STAGES = [
+    Stage("append_bar", "Step 1: Append Today's Bar", "append_today_bar.py",
+          inputs=["fetch_engine.py", "symbol_master.py", "stock_universe.csv"],
+          outputs=[bar_store.BARS_DB], always=True),
+    Stage("features", "Step 2: Feature Engineering", "feature_engineering.py",
+          inputs=["feature_kernel.py", "streaming_indicators.py", bar_store.BARS_DB],
+          outputs=[FEATURES_CSV, FEATURE_CHECKPOINTS]),
+    Stage("labels", "Step 3: Label Data", "label_training_data.py",
+          inputs=[FEATURES_CSV],
+          outputs=[LABELED_CSV]),
+    Stage("train", "Step 4: Train Model", "train_model.py",
+          inputs=["forest_model.py", LABELED_CSV],
+          outputs=[MODEL_PATH, "models/ai_model_forest", "feature_importances.csv"]),
+    Stage("scan", "Step 5: Run Scanner", "scanner.py",
+          inputs=["feature_kernel.py", "stock_universe.csv", bar_store.BARS_DB, MODEL_PATH, FEATURE_CHECKPOINTS],
+          outputs=["ai_scanner_output.csv"], always=True),
+]
+
+
+# ─── Content hashes ──────────────────────────────────────────
+def _hash_file(path, h):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+
+def fingerprint(path):
+    """Content hash of a file, a directory's files, or (for the bar store) its rows."""
+    if not os.path.exists(path):
+        return "missing"
+    h = hashlib.sha256()
+    if os.path.abspath(path) == os.path.abspath(bar_store.BARS_DB):
+        conn = bar_store.connect(path)
+        try:
+            h.update(bar_store.content_digest(conn).encode())
+        finally:
+            conn.close()
+    elif os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            h.update(name.encode())
+            _hash_file(os.path.join(path, name), h)
+    else:
+        _hash_file(path, h)
+    return h.hexdigest()
+
+
+def input_digest(stage):
+    h = hashlib.sha256()
+    for path in stage.inputs:
+        h.update(f"{path}={fingerprint(path)}\n".encode())
+    return h.hexdigest()
+
+
+# ─── Graph ───────────────────────────────────────────────────
+def dependencies(stages):
+    """stage name → names of the earlier stages that write any of its inputs."""
+    writer, deps = {}, {}
+    for stage in stages:
+        deps[stage.name] = sorted({writer[p] for p in stage.inputs if p in writer})
+        for p in stage.outputs:
+            writer[p] = stage.name
+    return deps
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def run_stage(stage):
+    started = time.time()
+    result = subprocess.run([sys.executable, stage.script], capture_output=True, text=True)
+    return result, time.time() - started
+
+
+def run_pipeline(stages=STAGES, force=False, max_workers=None):
+    """Run the graph. Returns {stage name: {"status": ran|skipped|failed|blocked, "duration_sec": ...}}."""
+    deps = dependencies(stages)
+    state = load_state()
+    results = {}
+    pending = {s.name: s for s in stages}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers or len(stages)) as pool:
+        while pending or running:
+            progressed = False
+            for name, stage in list(pending.items()):
+                if any(results.get(d, {}).get("status") in ("failed", "blocked") for d in deps[name]):
+                    results[name] = {"status": "blocked", "duration_sec": 0.0}
+                elif all(d in results for d in deps[name]):
+                    digest = input_digest(stage)
+                    cached = state.get(name, {}).get("input_digest") == digest
+                    if cached and not (force or stage.always) and all(os.path.exists(p) for p in stage.outputs):
+                        print(f"\n==== {stage.label}: inputs unchanged, skipped ====")
+                        results[name] = {"status": "skipped", "duration_sec": 0.0}
+                    else:
+                        print(f"\n==== {stage.label}: started ====")
+                        running[pool.submit(run_stage, stage)] = (stage, digest)
+                else:
+                    continue
+                del pending[name]
+                progressed = True
+            if not running:
+                if pending and not progressed:
+                    raise RuntimeError(f"Stages can never run (dependency cycle?): {sorted(pending)}")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, digest = running.pop(fut)
+                proc, secs = fut.result()
+                print(f"\n==== {stage.label}: finished in {secs:.1f}s ====")
+                print(proc.stdout)
+                if proc.returncode != 0:
+                    print(f"Step FAILED: {stage.label}")
+                    print(proc.stderr)
+                    results[stage.name] = {"status": "failed", "duration_sec": round(secs, 2)}
+                else:
+                    results[stage.name] = {"status": "ran", "duration_sec": round(secs, 2)}
+                    state[stage.name] = {"input_digest": digest}
+                state.setdefault(stage.name, {})["last_run"] = {
+                    "finished": datetime.now().isoformat(timespec="seconds"), **results[stage.name]}
+                save_state(state)
+
+    with open(TIMINGS_LOG, "a") as f:
+        f.write(json.dumps({"finished": datetime.now().isoformat(timespec="seconds"), "stages": results}) + "\n")
+    return results
 
-def run_step(label, cmd):
-    print(f"\n==== {label} ====")
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    print(result.stdout)
-    if result.returncode != 0:
-        print(f"Step FAILED: {label}")
-        print(result.stderr)
-        sys.exit(1)
 
 if __name__ == "__main__":
-    run_step("Step 1: Append Today's Bar", "python append_today_bar.py")
-    run_step("Step 2: Feature Engineering", "python feature_engineering.py")
-    run_step("Step 3: Label Data", "python label_data.py")
-    run_step("Step 4: Train Model", "python train_model.py")
-    run_step("Step 5: Run Scanner", "python scanner.py")
+    parser = argparse.ArgumentParser(description="Retrain pipeline")
+    parser.add_argument("--force", action="store_true", help="ignore the stage cache and run every stage")
+    parser.add_argument("--workers", type=int, default=None, help="max stages running at once")
+    args = parser.parse_args()
+
+    t0 = time.time()
+    results = run_pipeline(force=args.force, max_workers=args.workers)
+    print("\nStage timings:")
+    for name, r in results.items():
+        print(f"  {name:12s} {r['status']:8s} {r['duration_sec']:8.1f}s")
+    print(f"  {'total':12s} {'':8s} {time.time() - t0:8.1f}s")
+    if any(r["status"] in ("failed", "blocked") for r in results.values()):
+        sys.exit(1)
     print("\n✅ Full retrain pipeline complete! Picks ready in ai_scanner_output.csv")
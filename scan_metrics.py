@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+scan_metrics.py
+
+Per-scan instrumentation for the scanner: latency histograms per stage,
+broker API call / error / rate-limit counters and skip reasons by category.
+
+- ScanMetrics: one per scan. Thread-safe (fetches run on a thread pool).
+  Histogram observations are one unit of work in a stage: a quotes request,
+  one symbol's bars, or (for the vectorized stages) one chunk's featurize /
+  score pass. Marks record when a milestone (first published result, first
+  pick) was reached, in seconds from the start of the scan.
+- InstrumentedClient: wraps the (rate-limited) FYERS client and records every
+  quotes()/history() call: latency, failures, per-symbol quote errors.
+- write(): scan_metrics.json for the dashboard and scan_metrics.prom in
+  Prometheus text exposition format (node_exporter textfile collector).
+
+Per-symbol log lines are opt-in (SCAN_VERBOSE=1 or scanner.py --verbose);
+by default a scan only logs totals.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+METRICS_JSON = "scan_metrics.json"
+METRICS_PROM = "scan_metrics.prom"
+VERBOSE = os.getenv("SCAN_VERBOSE", "0") != "0"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "scanner_"
+
+COUNTER_HELP = {
+    "api_calls": "Broker API calls made by the scan",
+    "api_errors": "Broker API calls that raised or returned an error",
+    "rate_limited": "Rate-limit responses the client backed off on",
+    "quote_symbol_errors": "Symbols rejected inside an otherwise successful quotes call",
+    "symbols": "Symbols in the scanned universe",
+    "symbols_scored": "Symbols scored by the model",
+    "symbols_skipped": "Symbols dropped before scoring, by reason",
+    "bar_cache_hits": "Symbols whose completed bars came from the bar cache",
+    "bar_cache_misses": "Symbols whose full history was fetched",
+    "model_errors": "Scans whose predict_proba call failed",
+    "tier_survivors": "Symbols left after each scan tier",
+    "obv_unanchored": "Symbols scored with a window-only OBV (no feature checkpoint to anchor it)",
+    "symbols_resumed": "Symbols already finished by an interrupted scan that this one resumed",
+}
+MARK_HELP = {
+    "first_result": "Seconds from scan start to the first partial output",
+    "first_pick": "Seconds from scan start to the first row passing the pick rules",
+}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_str(key, extra=()):
+    pairs = list(key) + list(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)    # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (the max for the +Inf bucket)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "mean": round(self.sum / self.count, 6) if self.count else None,
+                "p50": round(self.quantile(0.5), 6) if self.count else None,
+                "p95": round(self.quantile(0.95), 6) if self.count else None, "max": round(self.max, 6)}
+
+
+class ScanMetrics:
+    def __init__(self, verbose=VERBOSE):
+        self.verbose = verbose
+        self.started = time.time()
+        self.duration = None
+        self.counters = {}      # (name, label key) → int
+        self.histograms = {}    # stage → Histogram
+        self.marks = {}         # milestone → seconds from start
+        self._lock = threading.Lock()
+
+    def inc(self, name, n=1, **labels):
+        with self._lock:
+            key = (name, _key(labels))
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def count(self, name, **labels):
+        """Total of a counter; with no labels given, summed over all label values."""
+        with self._lock:
+            if labels:
+                return self.counters.get((name, _key(labels)), 0)
+            return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.histograms.setdefault(stage, Histogram()).observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def mark(self, name):
+        """Record the first time a milestone is reached; later calls are ignored."""
+        with self._lock:
+            self.marks.setdefault(name, round(time.time() - self.started, 3))
+
+    def skip(self, symbol, reason, detail):
+        """A symbol dropped before scoring: counted by reason, logged only when verbose."""
+        self.inc("symbols_skipped", reason=reason)
+        if self.verbose:
+            print(f"  ⛔ {symbol}: skipped, {detail}")
+
+    def symbol_warning(self, msg):
+        """Per-symbol failure detail; the scan-level totals are always recorded separately."""
+        if self.verbose:
+            logging.warning(msg)
+
+    def instrument(self, fyers):
+        return InstrumentedClient(fyers, self)
+
+    def finish(self):
+        self.duration = time.time() - self.started
+        return self
+
+    # ─── Export ──────────────────────────────────────────────
+    def to_dict(self):
+        with self._lock:
+            counters = {}
+            for (name, key), v in sorted(self.counters.items()):
+                if key:
+                    counters.setdefault(name, {})[",".join(f"{k}={val}" for k, val in key)] = v
+                else:
+                    counters[name] = v
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "duration_sec": round(self.duration, 3) if self.duration is not None else None,
+                "counters": counters,
+                "stages": {stage: h.summary() for stage, h in self.histograms.items()},
+                "marks": dict(self.marks),
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, key), v in sorted(self.counters.items()):
+                by_name.setdefault(name, []).append((key, v))
+            for name, series in by_name.items():
+                metric = f"{PREFIX}{name}_total"
+                lines.append(f"# HELP {metric} {COUNTER_HELP.get(name, name)} (last scan)")
+                lines.append(f"# TYPE {metric} counter")
+                lines.extend(f"{metric}{_label_str(key)} {v}" for key, v in series)
+
+            metric = f"{PREFIX}stage_seconds"
+            lines.append(f"# HELP {metric} Latency per unit of work in each scan stage (last scan)")
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, h in self.histograms.items():
+                key = (("stage", stage),)
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f"{metric}_bucket{_label_str(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_sum{_label_str(key)} {h.sum:.6f}")
+                lines.append(f"{metric}_count{_label_str(key)} {h.count}")
+
+            for name, secs in self.marks.items():
+                metric = f"{PREFIX}{name}_seconds"
+                lines.append(f"# HELP {metric} {MARK_HELP.get(name, name)} (last scan)")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {secs:.3f}")
+
+            if self.duration is not None:
+                metric = f"{PREFIX}scan_duration_seconds"
+                lines.append(f"# HELP {metric} Wall time of the last scan")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {self.duration:.3f}")
+                lines.append(f"# TYPE {PREFIX}last_scan_timestamp_seconds gauge")
+                lines.append(f"{PREFIX}last_scan_timestamp_seconds {self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=METRICS_JSON, prom_path=METRICS_PROM):
+        """Both files via temp file + rename, so readers never see a partial write."""
+        for path, text in ((json_path, json.dumps(self.to_dict(), indent=2)), (prom_path, self.to_prometheus())):
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as f:
+                f.write(text)
+            os.replace(tmp, path)
+
+    def summary_line(self):
+        c = self.count
+        skipped = self.to_dict()["counters"].get("symbols_skipped", {})
+        first_pick = f", first pick at {self.marks['first_pick']:.1f}s" if "first_pick" in self.marks else ""
+        return (f"API calls {c('api_calls')} ({c('api_errors')} failed, {c('rate_limited')} rate-limited), "
+                f"scored {c('symbols_scored')}/{c('symbols')}, skipped {skipped or 0}{first_pick}")
+
+
+class InstrumentedClient:
+    """Counts and times every broker call made through it; everything else passes through."""
+
+    def __init__(self, fyers, metrics):
+        self._fyers = fyers
+        self.metrics = metrics
+
+    def _call(self, endpoint, stage, fn, data):
+        m = self.metrics
+        m.inc("api_calls", endpoint=endpoint)
+        t0 = time.perf_counter()
+        try:
+            resp = fn(data)
+        except Exception:
+            m.inc("api_errors", endpoint=endpoint)
+            raise
+        finally:
+            m.observe(stage, time.perf_counter() - t0)
+        if not isinstance(resp, dict) or resp.get("s") not in ("ok", "no_data"):
+            m.inc("api_errors", endpoint=endpoint)
+        return resp
+
+    def quotes(self, data):
+        resp = self._call("quotes", "quote", self._fyers.quotes, data)
+        if isinstance(resp, dict) and isinstance(resp.get("d"), list):
+            bad = sum(1 for item in resp["d"] if item.get("s", "ok") != "ok")
+            if bad:
+                self.metrics.inc("quote_symbol_errors", bad)
+        return resp
+
+    def history(self, data):
+        return self._call("history", "history_api", self._fyers.history, data)
+
+    def __getattr__(self, name):
+        return getattr(self._fyers, name)
+
+
+def read_metrics(path=METRICS_JSON):
+    """Metrics of the last finished scan (for the dashboard), or {}."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
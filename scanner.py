@@ -2,34 +2,114 @@
 import pandas as pd
 import numpy as np
 import joblib
-import logging
+import os
+import json
 import time
+import hashlib
+import socket
+import logging
+import argparse
+from contextlib import contextmanager
 from fyers_connect import get_fyers_client
+from fetch_engine import RateLimitedClient, fetch_concurrent, FETCH_WORKERS
+import bar_store
+import symbol_master
+import feature_engineering
+from bar_cache import DailyBarCache, ist_today, bar_dates
+from feature_kernel import latest_features, FEATURE_COLS, OHLCV
+from forest_model import load_compiled
+from scan_metrics import ScanMetrics, VERBOSE
+import pick_tracker
 
 BATCH_SIZE   = 100
-SLEEP_SEC    = 20
+QUOTE_BATCH_SIZE = 50   # FYERS accepts up to 50 symbols per quotes call
 MODEL_PATH   = "models/ai_model.pkl"
-UNIVERSE_CSV = "stock_universe.csv"
+UNIVERSE_CSV = symbol_master.UNIVERSE_CSV
 OUTPUT_CSV   = "ai_scanner_output.csv"
+HISTORY_DAYS = 120  # bars per symbol; long enough that the EMAs have warmed up as in training
+MIN_BARS     = 20
+USE_BAR_CACHE = os.getenv("SCANNER_BAR_CACHE", "1") != "0"
 
-def get_live_quote(symbol, fyers):
+# Streaming output: the universe is scanned in chunks, each one published and checkpointed
+SCAN_CHUNK_SIZE    = int(os.getenv("SCAN_CHUNK_SIZE", "200"))
+SCAN_CHECKPOINT    = "scan_checkpoint.json"
+LOCK_FILE          = "scanner.lock"   # single-flight across processes sharing this directory
+STALE_LOCK_SEC     = 3600             # a lock this old is taken over even if its holder cannot be checked
+RESUME_MAX_AGE_SEC = float(os.getenv("SCAN_RESUME_MAX_AGE", "1800"))  # older partial scans restart (stale prices)
+
+# Tier-one screen on quote data, before any history call (0 disables a limit)
+SCREEN_MIN_PRICE     = float(os.getenv("SCAN_MIN_PRICE",     "10"))
+SCREEN_MAX_PRICE     = float(os.getenv("SCAN_MAX_PRICE",     "0"))
+SCREEN_MIN_VOLUME    = float(os.getenv("SCAN_MIN_VOLUME",    "10000"))  # shares traded so far today
+SCREEN_MIN_RANGE_PCT = float(os.getenv("SCAN_MIN_RANGE_PCT", "0"))      # (high - low) / ltp; 0 = must have moved
+SCREEN_CIRCUIT       = os.getenv("SCAN_SKIP_CIRCUIT", "1") != "0"       # drop names locked at a circuit limit
+
+_bar_cache = None  # DailyBarCache, created on first use
+
+def _parse_quote(v):
+    """Pull the fields the scanner uses out of a quote's "v" payload."""
+    return {
+        "ltp":        v.get("lp", None),
+        "volume":     v.get("volume", 0),
+        "open":       v.get("open_price", None),
+        "high":       v.get("high_price", None),
+        "low":        v.get("low_price", None),
+        "prev_close": v.get("prev_close_price", None),
+        "chp":        v.get("chp", None),
+        "tt":         v.get("tt", None),
+        "upper_ckt":  v.get("upper_ckt", None),
+        "lower_ckt":  v.get("lower_ckt", None),
+    }
+
+def _symbol_warning(fyers, msg):
+    """Per-symbol failures: logged only in verbose scans when the client is instrumented (counted instead)."""
+    metrics = getattr(fyers, "metrics", None)
+    if isinstance(metrics, ScanMetrics):
+        metrics.symbol_warning(msg)
+    else:
+        logging.warning(msg)
+
+def _fetch_quote_batch(batch, fyers):
+    quotes = {sym: None for sym in batch}
     try:
-        data = {"symbols": symbol}
-        resp = fyers.quotes(data)
-        if isinstance(resp, dict) and resp.get("s") == "ok" and "d" in resp:
-            qlist = resp["d"]
-            if qlist and isinstance(qlist, list) and "v" in qlist[0]:
-                v = qlist[0]["v"]
-                return v.get("lp", None), v.get("volume", 0)
-        return None, 0
+        resp = fyers.quotes({"symbols": ",".join(batch)})
     except Exception as e:
-        logging.warning(f"Quote fail for {symbol}: {e}")
+        logging.warning(f"Quote batch fail ({batch[0]}..{batch[-1]}): {e}")
+        return quotes
+    if not (isinstance(resp, dict) and resp.get("s") == "ok" and isinstance(resp.get("d"), list)):
+        logging.warning(f"Quote batch fail ({batch[0]}..{batch[-1]}): {resp}")
+        return quotes
+    for item in resp["d"]:
+        sym = item.get("n") or item.get("v", {}).get("symbol")
+        v = item.get("v")
+        if sym not in quotes or item.get("s", "ok") != "ok" or not isinstance(v, dict) or "lp" not in v:
+            if sym in quotes:
+                _symbol_warning(fyers, f"Quote fail for {sym}: {v}")
+            continue
+        quotes[sym] = _parse_quote(v)
+    return quotes
+
+def get_live_quotes(symbols, fyers, batch_size=QUOTE_BATCH_SIZE, max_workers=FETCH_WORKERS):
+    """
+    Fetch quotes for many symbols, QUOTE_BATCH_SIZE per request, with batches
+    running concurrently. Returns {symbol: quote dict or None}; a symbol is
+    None when the broker rejected it or its whole batch failed.
+    """
+    batches = [tuple(symbols[i:i+batch_size]) for i in range(0, len(symbols), batch_size)]
+    results = fetch_concurrent(lambda b: _fetch_quote_batch(list(b), fyers), batches, max_workers)
+    quotes = {}
+    for batch in batches:
+        quotes.update(results.get(batch) or {sym: None for sym in batch})
+    return quotes
+
+def get_live_quote(symbol, fyers):
+    q = get_live_quotes([symbol], fyers).get(symbol)
+    if q is None:
         return None, 0
+    return q["ltp"], q["volume"]
 
-def fetch_recent_bars(symbol, fyers, days=30):
+def _fetch_history(symbol, fyers, date_from, date_to):
     try:
-        date_to = pd.Timestamp.today()
-        date_from = date_to - pd.Timedelta(days=days*1.5)
         data = {
             "symbol": symbol,
             "resolution": "1D",
@@ -43,116 +123,503 @@ def fetch_recent_bars(symbol, fyers, days=30):
             bars = resp["candles"]
             df = pd.DataFrame(bars, columns=["ts","open","high","low","close","volume"])
             df["ts"] = pd.to_datetime(df["ts"], unit="s")
-            return df.tail(days)
+            return df
     except Exception as e:
-        logging.warning(f"History fail for {symbol}: {e}")
+        _symbol_warning(fyers, f"History fail for {symbol}: {e}")
     return pd.DataFrame()
 
+def get_bar_cache():
+    global _bar_cache
+    if _bar_cache is None:
+        _bar_cache = DailyBarCache(_fetch_history)
+    return _bar_cache
+
+def fetch_recent_bars(symbol, fyers, days=HISTORY_DAYS, quote=None):
+    """
+    Last `days` daily bars. With the bar cache on, completed sessions come from
+    local storage and only today's partial bar is fetched (or built from `quote`).
+    """
+    if USE_BAR_CACHE:
+        return get_bar_cache().get_bars(symbol, fyers, days, quote)
+    date_to = pd.Timestamp.today()
+    date_from = date_to - pd.Timedelta(days=days*1.5)
+    return _fetch_history(symbol, fyers, date_from, date_to).tail(days)
+
+def load_store_bars(symbol_id, conn, days=HISTORY_DAYS):
+    """Recent bars from the local bar store, shaped like fetch_recent_bars output."""
+    df = bar_store.read_recent_bars(conn, symbol_id, days)
+    df = df.rename(columns={"timestamp": "ts"}).drop(columns="symbol_id")
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    return df
+
+def completed_bars(symbols, conn, days=HISTORY_DAYS):
+    """
+    {symbol: completed daily bars, oldest first} without today's partial
+    session: from the bar cache when this session's scans fetched them, else
+    from the bar store. Seeds live_feed.LiveScorer.
+    """
+    cache = get_bar_cache() if USE_BAR_CACHE else None
+    today = ist_today()
+    out = {}
+    for sym, symbol_id in zip(symbols, symbol_master.load(conn).ids(symbols)):
+        bars = cache.completed(sym) if cache else None
+        if bars is None and symbol_id >= 0:
+            bars = load_store_bars(symbol_id, conn, days + 1)
+            bars = bars[bar_dates(bars["ts"]) < today].tail(days).reset_index(drop=True)
+        if bars is not None and not bars.empty:
+            out[sym] = bars
+    return out
+
+def obv_anchors(symbols, conn):
+    """{symbol: OBV anchor} from the feature checkpoints, for the symbols that have one."""
+    anchors = feature_engineering.read_obv_anchors()
+    ids = symbol_master.load(conn).ids(symbols)
+    return {sym: anchors[int(sid)] for sym, sid in zip(symbols, ids) if int(sid) in anchors}
+
 def compute_features(df):
-    if df.empty or len(df) < 20:
+    """Latest-bar features for one symbol's bars (same kernel as training)."""
+    if df.empty or len(df) < MIN_BARS:
         return {}
-    feats = {}
-    df = df.copy()
-    df["TR"] = np.maximum(df["high"] - df["low"],
-                          np.maximum(abs(df["high"] - df["close"].shift(1)),
-                                     abs(df["low"] - df["close"].shift(1))))
-    feats["ATR14"] = df["TR"].rolling(14).mean().iloc[-1]
-    feats["EMA5"]  = df["close"].ewm(span=5).mean().iloc[-1]
-    feats["EMA20"] = df["close"].ewm(span=20).mean().iloc[-1]
-    feats["EMA_diff"] = feats["EMA5"] - feats["EMA20"]
-    delta = df["close"].diff()
-    up, down = delta.clip(lower=0), -delta.clip(upper=0)
-    roll_up = up.rolling(14).mean()
-    roll_down = down.rolling(14).mean()
-    rs = roll_up.iloc[-1] / (roll_down.iloc[-1]+1e-9)
-    feats["RSI14"] = 100 - (100/(1+rs))
-    ema12 = df["close"].ewm(span=12, adjust=False).mean()
-    ema26 = df["close"].ewm(span=26, adjust=False).mean()
-    macd = ema12 - ema26
-    macd_sig = macd.ewm(span=9, adjust=False).mean()
-    feats["MACD"] = macd.iloc[-1]
-    feats["MACD_sig"] = macd_sig.iloc[-1]
-    feats["MACD_hist"] = (macd - macd_sig).iloc[-1]
-    bb_mid = df["close"].rolling(20).mean().iloc[-1]
-    bb_std = df["close"].rolling(20).std().iloc[-1]
-    feats["BB_bandwidth"] = (2*bb_std)/bb_mid if bb_mid else 0
-    feats["BB_%B"] = (df["close"].iloc[-1] - (bb_mid-2*bb_std))/(4*bb_std) if bb_std else 0
-    feats["open"] = df["open"].iloc[-1]
-    feats["high"] = df["high"].iloc[-1]
-    feats["low"] = df["low"].iloc[-1]
-    feats["close"] = df["close"].iloc[-1]
-    feats["volume"] = df["volume"].iloc[-1]
-    return feats
-
-def run_scanner():
-    print("===== Swing Trading AI Scanner Debug Log =====")
-    # Load model
+    row = latest_features({"_": df}).iloc[0]
+    return {k: float(v) for k, v in row.items() if k != "symbol"}
+
+def target_prices(score, atr, close, ltp):
+    """Vectorized scanner target: ATR-scaled expected return, floored at +2%."""
+    score, atr, close, ltp = (np.asarray(a, dtype=float) for a in (score, atr, close, ltp))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ratio = np.where((atr != 0) & (close != 0) & ~np.isnan(atr), atr / close, 0.03)
+    exp_ret = score * vol_ratio
+    return ltp * (1 + np.maximum(0.02, exp_ret))
+
+def screen_reasons(price, volume, high, low, upper_ckt=None, lower_ckt=None, min_price=SCREEN_MIN_PRICE,
+                   max_price=SCREEN_MAX_PRICE, min_volume=SCREEN_MIN_VOLUME, min_range_pct=SCREEN_MIN_RANGE_PCT,
+                   skip_circuit=SCREEN_CIRCUIT):
+    """
+    Vectorized tier-one screen. Returns, per row, the first failed check
+    ("price", "volume", "circuit", "no_movement") or "" for a survivor.
+    NaN inputs never fail a check; circuit limits are used when the quote
+    carries them, otherwise a range-less day (high == low) counts as locked.
+    """
+    price, volume, high, low = (np.asarray(a, dtype=float) for a in (price, volume, high, low))
+    n = len(price)
+    upper = np.full(n, np.nan) if upper_ckt is None else np.asarray(upper_ckt, dtype=float)
+    lower = np.full(n, np.nan) if lower_ckt is None else np.asarray(lower_ckt, dtype=float)
+    bad_price = (price < min_price) | ((max_price > 0) & (price > max_price))
+    bad_volume = volume < min_volume
+    locked = skip_circuit & ((price >= upper) | (price <= lower))
+    day_range = (high - low) / price
+    still = (day_range <= min_range_pct) if min_range_pct > 0 else (day_range == 0)
+    return np.select([bad_price, bad_volume, locked, still], ["price", "volume", "circuit", "no_movement"],
+                     default="")
+
+def screen_stage(symbols, quotes, metrics=None):
+    """Symbols with a quote that pass the screen, in universe order. Eliminations are counted by reason."""
+    metrics = metrics or ScanMetrics()
+    quoted = [sym for sym in symbols if quotes.get(sym) is not None and quotes[sym].get("ltp") is not None]
+    for sym in symbols:
+        if quotes.get(sym) is None or quotes[sym].get("ltp") is None:
+            metrics.skip(sym, "no_quote", "no price")
+    def field(key):
+        return [np.nan if quotes[s].get(key) is None else quotes[s][key] for s in quoted]
+    reasons = screen_reasons(field("ltp"), field("volume"), field("high"), field("low"),
+                             field("upper_ckt"), field("lower_ckt"))
+    for sym, reason in zip(quoted, reasons):
+        if reason:
+            metrics.skip(sym, reason, f"screened out ({reason})")
+    metrics.inc("tier_survivors", len(quoted), tier="quoted")
+    survivors = [sym for sym, reason in zip(quoted, reasons) if not reason]
+    metrics.inc("tier_survivors", len(survivors), tier="screened")
+    return survivors
+
+def fetch_stage(symbols, fyers, source="api", days=HISTORY_DAYS, metrics=None):
+    """
+    Quotes for every symbol, then the screen, then recent bars for the
+    survivors only. Returns (quotes, bars_by_sym, candidates).
+    """
+    metrics = metrics or ScanMetrics()
+    if source == "store":
+        conn = bar_store.connect()
+        bars_by_sym = {}
+        try:
+            for sym, symbol_id in zip(symbols, symbol_master.load(conn).ids(symbols)):
+                with metrics.timer("history"):
+                    bars_by_sym[sym] = load_store_bars(symbol_id, conn, days=days)
+        finally:
+            conn.close()
+        quotes = {sym: (b.iloc[-1][["close", "volume", "high", "low"]].rename({"close": "ltp"}).to_dict()
+                        if not b.empty else None)
+                  for sym, b in bars_by_sym.items()}
+        candidates = screen_stage(symbols, quotes, metrics)
+        return quotes, {sym: bars_by_sym[sym] for sym in candidates}, candidates
+
+    quotes = get_live_quotes(symbols, fyers)
+    if metrics.verbose:
+        print(f"Quotes fetched: {sum(q is not None for q in quotes.values())}/{len(symbols)}")
+    candidates = screen_stage(symbols, quotes, metrics)
+
+    def fetch(sym):
+        with metrics.timer("history"):
+            return fetch_recent_bars(sym, fyers, days=days, quote=quotes.get(sym))
+
+    cache = get_bar_cache() if USE_BAR_CACHE else None
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    bars_by_sym = {}
+    for i in range(0, len(candidates), BATCH_SIZE):
+        batch = candidates[i:i+BATCH_SIZE]
+        bars_by_sym.update(fetch_concurrent(fetch, batch))
+        if metrics.verbose:
+            print(f"History batch {i//BATCH_SIZE+1} / {(len(candidates)-1)//BATCH_SIZE+1}: {len(batch)} symbols")
+    if cache:
+        metrics.inc("bar_cache_hits", cache.hits - hits)
+        metrics.inc("bar_cache_misses", cache.misses - misses)
+    return quotes, bars_by_sym, candidates
+
+def obv_offsets(bars_by_sym, anchors):
+    """
+    {symbol: amount that puts the OBV of its bar window on the training scale}:
+    the checkpointed full-history OBV at the anchor bar (see
+    feature_engineering.read_obv_anchors) minus the window's own running OBV
+    there. Symbols whose window does not hold the anchor bar unchanged are left out.
+    """
+    offsets = {}
+    for sym, bars in bars_by_sym.items():
+        anchor = anchors.get(sym)
+        if anchor is None or bars is None or bars.empty:
+            continue
+        last_ts, anchor_close, anchor_obv = anchor
+        ts = bars["ts"].to_numpy().astype("datetime64[s]").astype(np.int64)
+        at = np.flatnonzero(ts == last_ts)
+        close = bars["close"].to_numpy(dtype=float)
+        if not len(at) or not np.isclose(close[at[0]], anchor_close, rtol=1e-9, atol=0):
+            continue
+        signed = np.sign(np.diff(close, prepend=close[0])) * bars["volume"].to_numpy(dtype=float)
+        offsets[sym] = anchor_obv - signed[:at[0] + 1].sum()
+    return offsets
+
+def featurize_stage(symbols, quotes, bars_by_sym, metrics=None, anchors=None):
+    """
+    One row of features per scorable symbol, plus its live price/volume.
+    All symbols go through the shared feature kernel in a single pass.
+    OBV is shifted onto the training scale with `anchors` ({symbol: OBV
+    anchor}); symbols without a usable anchor keep their window's OBV and are
+    counted. Dropped symbols are counted in `metrics` by reason.
+    """
+    metrics = metrics or ScanMetrics()
+    with metrics.timer("features"):
+        ready = {}
+        for sym in symbols:
+            q = quotes.get(sym)
+            bars = bars_by_sym.get(sym)
+            if q is None or q.get("ltp") is None:
+                metrics.skip(sym, "no_quote", "no price")
+            elif bars is None or bars.empty:
+                metrics.skip(sym, "no_bars", "no bars")
+            elif len(bars) < MIN_BARS:
+                metrics.skip(sym, "too_few_bars", f"only {len(bars)} bars")
+            else:
+                ready[sym] = bars
+        feats_df = latest_features(ready)
+        offsets = obv_offsets(ready, anchors or {})
+        feats_df["OBV"] += feats_df["symbol"].map(offsets).fillna(0.0)
+        metrics.inc("obv_unanchored", len(feats_df) - len(offsets))
+        bad = feats_df[FEATURE_COLS + OHLCV].isna().any(axis=1)
+        for sym in feats_df.loc[bad, "symbol"]:
+            metrics.skip(sym, "feature_nan", "feature NaN")
+        feats_df = feats_df[~bad].reset_index(drop=True)
+        feats_df.insert(1, "price", [quotes[s]["ltp"] for s in feats_df["symbol"]])
+        feats_df.insert(2, "live_volume", [quotes[s].get("volume", 0) for s in feats_df["symbol"]])
+    return feats_df
+
+def score_stage(model, feature_list, feats_df, metrics=None):
+    """Score the whole universe with one predict_proba call and build the output records."""
+    if feats_df.empty:
+        return pd.DataFrame()
+    metrics = metrics or ScanMetrics()
+    X = feats_df.reindex(columns=feature_list, fill_value=0).astype(float)
     try:
-        model, feature_list = joblib.load(MODEL_PATH)
-        print(f"Loaded model from {MODEL_PATH}, features: {feature_list}")
+        with metrics.timer("score"):
+            scores = model.predict_proba(X)[:, 1]
     except Exception as e:
-        print("❌ Could not load AI model:", e)
-        return pd.DataFrame()
+        print("  ⛔ Model prediction failed:", e)
+        metrics.inc("model_errors")
+        scores = np.zeros(len(feats_df))
+    targets = target_prices(scores, feats_df["ATR14"], feats_df["close"], feats_df["price"])
+    records = pd.DataFrame({
+        "symbol": feats_df["symbol"],
+        "price": feats_df["price"],
+        "score": np.round(scores, 4),
+        "target_price": np.round(targets, 2),
+        "volume": feats_df["live_volume"],
+    })
+    extra = [f for f in feature_list if f not in ["open","high","low","close","volume"]]
+    return pd.concat([records, X[extra].round(6)], axis=1)
+
+def load_scanner_model(path=MODEL_PATH):
+    """The compiled forest export when it is current (an mmap), else the pickled sklearn model."""
+    compiled = load_compiled(path)
+    if compiled is not None:
+        print(f"Loaded compiled forest for {path}, features: {compiled.feature_list}")
+        return compiled, compiled.feature_list
+    model, feature_list = joblib.load(path)
+    print(f"Loaded model from {path}, features: {feature_list}")
+    return model, feature_list
+
+def load_universe(path=UNIVERSE_CSV, conn=None):
+    """Broker symbols of the universe, registered in the symbol master (read once per process)."""
+    return symbol_master.load_universe(conn or bar_store.connect(), path)
+
+def write_output(df, path=OUTPUT_CSV):
+    """Write via a temp file + rename so readers never see a half-written CSV."""
+    tmp = f"{path}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
 
-    # Load universe
-    universe = pd.read_csv(UNIVERSE_CSV)
-    symbols = [
-        f"{row['exchange'].strip().upper()}:{row['symbol'].strip().upper()}-EQ"
-        for _, row in universe.iterrows()
-    ]
-    print(f"Loaded universe: {len(symbols)} symbols (first 5: {symbols[:5]})")
-    fyers = get_fyers_client()
-    records = []
-
-    # Batch loop
-    for i in range(0, len(symbols), BATCH_SIZE):
-        batch = symbols[i:i+BATCH_SIZE]
-        print(f"\nProcessing batch {i//BATCH_SIZE+1} / {(len(symbols)-1)//BATCH_SIZE+1} ({len(batch)} symbols)")
-        for idx, sym in enumerate(batch, i+1):
-            print(f"--- [{idx}/{len(symbols)}] {sym} ---")
-            ltp, vol = get_live_quote(sym, fyers)
-            print(f"  LTP: {ltp}, Volume: {vol}")
-            bars = fetch_recent_bars(sym, fyers, days=30)
-            print(f"  Bars fetched: {len(bars)}")
-            if ltp is None or bars.empty:
-                print("  ⛔ Skipped: No price or bars.\n")
-                continue
-            feats = compute_features(bars)
-            if not feats or any(np.isnan(v) for v in feats.values()):
-                print("  ⛔ Skipped: Feature NaN or empty.\n")
-                continue
-            feature_vec = [float(feats.get(f, 0)) for f in feature_list]
-            try:
-                score = model.predict_proba([feature_vec])[0][1]
-            except Exception as e:
-                print("  ⛔ Model prediction failed:", e)
-                score = 0.0
-            atr = feats.get("ATR14", 0)
-            exp_ret = score * (atr/bars["close"].iloc[-1] if atr and bars["close"].iloc[-1] else 0.03)
-            target_price = ltp * (1 + max(0.02, exp_ret))
-            records.append({
-                "symbol": sym,
-                "price": ltp,
-                "score": round(score,4),
-                "target_price": round(target_price,2),
-                "volume": vol,
-                **{f: round(feats[f],6) for f in feature_list if f not in ["open","high","low","close","volume"]}
-            })
-            print(f"  ✅ Record: score={score:.4f} target={target_price:.2f}\n")
-            time.sleep(0.1)  # Throttle each symbol
-        time.sleep(SLEEP_SEC)  # Pause after each batch
-
-    df = pd.DataFrame(records)
-    print(f"Total records after scan: {len(df)}")
+# ─── Single-flight lock ──────────────────────────────────────
+class ScanLocked(RuntimeError):
+    """Another scan (worker, pipeline or CLI) holds the scanner lock."""
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True          # exists, owned by another user
+    return True
+
+def _lock_holder(path=LOCK_FILE):
+    """(pid, host) written into the lock file, or (None, None) if unreadable."""
+    try:
+        with open(path) as f:
+            fields = f.read().split()
+        return int(fields[0]), (fields[1] if len(fields) > 1 else None)
+    except (FileNotFoundError, ValueError, IndexError):
+        return None, None
+
+def _lock_is_stale(path=LOCK_FILE):
+    """Its holder on this host has exited, or (holder elsewhere or unknown) it is older than STALE_LOCK_SEC."""
+    pid, host = _lock_holder(path)
+    if pid is not None and host in (None, socket.gethostname()) and not _pid_alive(pid):
+        return True
+    return time.time() - os.path.getmtime(path) >= STALE_LOCK_SEC
+
+def _acquire_file_lock(path=LOCK_FILE):
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if not _lock_is_stale(path):
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return _acquire_file_lock(path)
+    with os.fdopen(fd, "w") as f:
+        f.write(f"{os.getpid()} {socket.gethostname()}")
+    return True
+
+def _release_file_lock(path=LOCK_FILE):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+@contextmanager
+def scan_lock(path=LOCK_FILE):
+    """Hold the scanner lock for a scan; raises ScanLocked when another live scan holds it."""
+    if not _acquire_file_lock(path):
+        pid, host = _lock_holder(path)
+        raise ScanLocked(f"another scan holds {path} (pid {pid} on {host})")
+    try:
+        yield
+    finally:
+        _release_file_lock(path)
+
+# ─── Progress checkpoint ─────────────────────────────────────
+def _scan_key(source, symbols):
+    """Identifies a resumable scan: same source, universe and IST session."""
+    h = hashlib.sha1(f"{source}\n{ist_today()}".encode())
+    h.update("\n".join(symbols).encode())
+    return h.hexdigest()
+
+def read_progress(path=SCAN_CHECKPOINT):
+    """Checkpoint of the running (or last) scan: done/total symbols, rows published, first pick; or {}."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_progress(progress, path=SCAN_CHECKPOINT):
+    progress["updated"] = time.time()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(progress, f)
+    os.replace(tmp, path)
+
+def _writer_gone(ckpt):
+    """The process that last wrote ckpt is this one or has exited (checkable on this host only)."""
+    pid, host = ckpt.get("pid"), ckpt.get("host")
+    if pid is None or pid == os.getpid() or host != socket.gethostname():
+        return True
+    return not _pid_alive(pid)
+
+def _resume_point(key, path=SCAN_CHECKPOINT, output=OUTPUT_CSV, max_age=RESUME_MAX_AGE_SEC, lock=LOCK_FILE):
+    """
+    (checkpoint, rows it already published) of an interrupted scan with this
+    key, updated within max_age seconds; (None, None) when there is none.
+    A checkpoint is only interrupted while this process holds the scanner lock
+    and the scan that wrote it is gone; otherwise it may still be running.
+    """
+    ckpt = read_progress(path)
+    if ckpt.get("state") != "running" or ckpt.get("key") != key or time.time() - ckpt.get("updated", 0) > max_age:
+        return None, None
+    if _lock_holder(lock) != (os.getpid(), socket.gethostname()) or not _writer_gone(ckpt):
+        return None, None
+    try:
+        prior = pd.read_csv(output)
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        prior = pd.DataFrame(columns=["symbol"])
+    return ckpt, prior[prior["symbol"].isin(ckpt["done"])].reset_index(drop=True)
+
+def _publish(frames):
+    """Everything scored so far, best first, written to the output. Returns it."""
+    frames = [f for f in frames if not f.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
     if not df.empty:
-        df = df.sort_values("score", ascending=False).reset_index(drop=True)
-    else:
-        print("❌ No records found. Check universe, model, features, filters.")
-    print("\n===== Final Output Table (top 10) =====")
-    print(df.head(10))
-    df.to_csv(OUTPUT_CSV, index=False)
+        df = df.sort_values("score", ascending=False, kind="mergesort").reset_index(drop=True)
+    write_output(df)
+    return df
+
+def run_scanner(source="api", model=None, feature_list=None, fyers=None, symbols=None, verbose=VERBOSE,
+                resume=True, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    source="api":   live quotes + history from FYERS (market hours)
+    source="store": last completed bars from the local bar store, no API calls
+    Runs as tiers: quotes → screen (price, volume, circuit; no API cost) →
+    history for the survivors → featurize → score (one model call per chunk).
+    The universe goes through the tiers in chunks of `chunk_size` symbols;
+    after each chunk everything scored so far is published to OUTPUT_CSV
+    (best first) and SCAN_CHECKPOINT records the symbols done, so the
+    dashboard shows partial picks while the scan runs. With resume=True, a
+    scan of the same universe interrupted earlier this session (and updated
+    within RESUME_MAX_AGE_SEC) keeps its published rows and skips its done symbols.
+    A long-lived caller (scanner_worker) passes its warm model, client and universe.
+    Output rows are keyed by symbol_master id; the broker symbol is kept for display.
+    Stage latencies and counters go to scan_metrics.json / scan_metrics.prom;
+    verbose=True also logs every skipped or failed symbol.
+    Holds LOCK_FILE for the whole scan, so a pipeline or CLI scan never runs
+    alongside the worker's; raises ScanLocked when another scan holds it.
+    """
+    with scan_lock():
+        return _scan(source, model, feature_list, fyers, symbols, verbose, resume, chunk_size)
+
+def _scan(source, model, feature_list, fyers, symbols, verbose, resume, chunk_size):
+    metrics = ScanMetrics(verbose=verbose)
+    print("===== Swing Trading AI Scanner Debug Log =====")
+    # Load model
+    if model is None:
+        try:
+            model, feature_list = load_scanner_model()
+        except Exception as e:
+            print("❌ Could not load AI model:", e)
+            return pd.DataFrame()
+
+    # Load universe. The finally closes the store connection on every path; a
+    # failed scan deliberately leaves its checkpoint "running" so the next scan
+    # resumes from the last finished chunk instead of starting over.
+    conn = bar_store.connect()
+    try:
+        if symbols is None:
+            symbols = load_universe(conn=conn)
+        print(f"Loaded universe: {len(symbols)} symbols (first 5: {symbols[:5]})")
+        if source == "store":
+            fyers = None
+        elif fyers is None:
+            fyers = RateLimitedClient(get_fyers_client())
+        metrics.inc("symbols", len(symbols))
+        limited = fyers.limiter.rate_limited if fyers is not None else 0
+
+        # Resume an interrupted scan of this universe, or start a fresh checkpoint
+        key = _scan_key(source, symbols)
+        ckpt, prior = _resume_point(key) if resume else (None, None)
+        done = list(ckpt["done"]) if ckpt else []
+        frames = [prior] if ckpt else []
+        if ckpt:
+            print(f"Resuming interrupted scan: {len(done)}/{len(symbols)} symbols done, {len(prior)} rows kept")
+            metrics.inc("symbols_resumed", len(done))
+        finished = set(done)
+        todo = [sym for sym in symbols if sym not in finished]
+        progress = {"key": key, "state": "running", "source": source, "pid": os.getpid(), "host": socket.gethostname(),
+                    "started": ckpt["started"] if ckpt else metrics.started,
+                    "total": len(symbols), "done": done, "rows": len(prior) if ckpt else 0, "first_pick_sec": None}
+        save_progress(progress)
+
+        api = metrics.instrument(fyers) if fyers is not None else None
+        df = _publish(frames) if not todo else pd.DataFrame()
+        n_chunks = (len(todo) + chunk_size - 1) // chunk_size
+        for i in range(0, len(todo), chunk_size):
+            chunk = todo[i:i + chunk_size]
+            quotes, bars_by_sym, candidates = fetch_stage(chunk, api, source, metrics=metrics)
+            feats_df = featurize_stage(candidates, quotes, bars_by_sym, metrics, obv_anchors(candidates, conn))
+            metrics.inc("tier_survivors", len(feats_df), tier="featurized")
+            scored = score_stage(model, feature_list, feats_df, metrics)
+            metrics.inc("symbols_scored", len(scored))
+            if not scored.empty:
+                scored.insert(0, "symbol_id", symbol_master.register(conn, scored["symbol"]))
+                frames.append(scored)
+
+            df = _publish(frames)
+            metrics.mark("first_result")
+            if not pick_tracker.select_top_picks(df).empty:
+                metrics.mark("first_pick")
+            done += chunk
+            progress.update(done=done, rows=len(df), first_pick_sec=metrics.marks.get("first_pick"))
+            save_progress(progress)
+            print(f"Chunk {i // chunk_size + 1}/{n_chunks}: {len(chunk)} symbols → {len(scored)} scored "
+                  f"({len(done)}/{len(symbols)} done, {len(df)} rows published)")
+
+        c = metrics.count
+        print(f"Tiers: {len(todo)} to scan → {c('tier_survivors', tier='quoted')} quoted → "
+              f"{c('tier_survivors', tier='screened')} screened → {c('tier_survivors', tier='featurized')} featurized "
+              f"→ {c('symbols_scored')} scored")
+        if "first_pick" in metrics.marks:
+            print(f"Time to first pick: {metrics.marks['first_pick']:.1f}s")
+
+        print(f"Total records after scan: {len(df)}")
+        if fyers is not None:
+            metrics.inc("rate_limited", fyers.limiter.rate_limited - limited)
+            if USE_BAR_CACHE:
+                print(f"Bar cache: {get_bar_cache().stats()}")
+        if metrics.count("api_errors") or metrics.count("quote_symbol_errors"):
+            logging.warning(f"Scan saw {metrics.count('api_errors')} failed API calls and "
+                            f"{metrics.count('quote_symbol_errors')} rejected symbols (SCAN_VERBOSE=1 for details)")
+        print(f"Metrics: {metrics.summary_line()}")
+        if df.empty:
+            print("❌ No records found. Check universe, model, features, filters.")
+        print("\n===== Final Output Table (top 10) =====")
+        print(df.head(10))
+        progress["state"] = "complete"
+        save_progress(progress)
+    finally:
+        conn.close()
+    try:
+        metrics.finish().write()
+    except OSError as e:
+        logging.warning(f"Could not write scan metrics: {e}")
     print(f"\n✅ All done! Output: {OUTPUT_CSV}\n")
     return df
 
 if __name__ == "__main__":
-    run_scanner()
+    parser = argparse.ArgumentParser(description="Swing trading AI scanner")
+    parser.add_argument("--source", choices=["api", "store"], default="api",
+                        help="'store' scores the last completed bars from the local bar store (no API calls)")
+    parser.add_argument("--verbose", action="store_true", help="log every skipped or failed symbol")
+    parser.add_argument("--fresh", action="store_true", help="ignore an interrupted scan's checkpoint and rescan all")
+    parser.add_argument("--chunk-size", type=int, default=SCAN_CHUNK_SIZE, help="symbols per published chunk")
+    args = parser.parse_args()
+    try:
+        run_scanner(source=args.source, verbose=args.verbose or VERBOSE, resume=not args.fresh,
+                    chunk_size=args.chunk_size)
+    except ScanLocked as e:
+        raise SystemExit(f"❌ Scan not started: {e}")
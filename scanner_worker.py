@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+scanner_worker.py
+
+A long-lived scanner that keeps the model, FYERS client and universe warm and
+runs scans on a market-hours schedule, at most one at a time.
+
+- Embedded: main.py holds one ScannerWorker per server process (st.cache_resource)
+  and only calls request_scan() / status(); it never waits for a scan.
+- Standalone: `python scanner_worker.py` runs the same loop in the foreground.
+  Set SCANNER_WORKER_EMBEDDED=0 for the dashboard when running it this way.
+
+Single-flight: an in-process lock, plus the lock file scanner.run_scanner
+holds for every scan (worker, pipeline stage or CLI), so two processes sharing
+the same working directory never scan concurrently.
+
+Live prices: after each scan the worker subscribes its live feed to the top
+picks and every open history position. Ticks land in `worker.prices` (a
+live_feed.LastPriceTable) that the dashboard reads directly, and between scans
+open picks are re-evaluated against it every LIVE_EVAL_SEC. Each tick is also
+re-scored by a live_feed.LiveScorer holding the warm model and indicator state
+seeded from the subscribed symbols' completed bars; it is rebuilt after
+every scan.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import zoneinfo
+from datetime import datetime, time as dtime
+
+import scanner
+import bar_store
+import pick_tracker
+import live_feed
+from fetch_engine import RateLimitedClient
+from forest_model import model_version
+from fyers_connect import get_fyers_client
+
+IST = zoneinfo.ZoneInfo("Asia/Kolkata")
+MARKET_OPEN, MARKET_CLOSE = dtime(9, 15), dtime(15, 30)
+SCAN_INTERVAL_SEC = int(os.getenv("SCAN_INTERVAL_SEC", "300"))
+STATUS_FILE = "scanner_status.json"
+LIVE_EVAL_SEC = int(os.getenv("LIVE_EVAL_SEC", "15"))
+
+logger = logging.getLogger(__name__)
+
+
+def is_market_open(now=None):
+    now = now or datetime.now(IST)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+
+def read_status(path=STATUS_FILE):
+    """Last status written by any worker (for dashboards in another process)."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+class ScannerWorker:
+    def __init__(self, interval=SCAN_INTERVAL_SEC, model_path=scanner.MODEL_PATH):
+        self.interval = interval
+        self.model_path = model_path
+        self.force_market_open = False
+        self._scan_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._requested = False
+        self._thread = None
+        self._model = None
+        self._model_mtime = None
+        self._fyers = None
+        self._symbols = None
+        self._tracker_conn = None
+        self.prices = live_feed.LastPriceTable()
+        self._feed = None
+        self._status = {
+            "state": "idle", "scans": 0, "last_started": None, "last_finished": None,
+            "last_duration_sec": None, "last_rows": None, "last_error": None,
+        }
+
+    # ─── Warm resources ──────────────────────────────────────
+    def _warm(self):
+        """Load (or reload after a retrain) the model; create the client and universe once."""
+        mtime = model_version(self.model_path)
+        if self._model is None or mtime != self._model_mtime:
+            self._model = scanner.load_scanner_model(self.model_path)
+            self._model_mtime = mtime
+        if self._fyers is None:
+            self._fyers = RateLimitedClient(get_fyers_client())
+        if self._symbols is None:
+            self._symbols = scanner.load_universe()
+        if self._tracker_conn is None:
+            self._tracker_conn = pick_tracker.connect()
+
+    # ─── Scanning ────────────────────────────────────────────
+    def scan_once(self):
+        """Run one scan unless one is already running. Returns True if it ran."""
+        if not self._scan_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.time()
+            ran = True
+            self._set_status(state="scanning", last_started=datetime.now(IST).isoformat(timespec="seconds"))
+            try:
+                self._warm()
+                model, feature_list = self._model
+                df = scanner.run_scanner(model=model, feature_list=feature_list,
+                                         fyers=self._fyers, symbols=self._symbols)
+                inserted, closed = pick_tracker.track_scan(self._tracker_conn, df, fyers=self._fyers,
+                                                           live=self.prices)
+                logger.info(f"Pick tracker: {inserted} new picks, {len(closed)} closed")
+                self._subscribe_live(df)
+                self._set_status(last_rows=len(df), last_error=None)
+            except scanner.ScanLocked as e:
+                logger.info(f"Scan skipped: {e}")
+                ran = False
+            except Exception as e:
+                logger.exception("Scan failed")
+                self._set_status(last_error=f"{type(e).__name__}: {e}")
+            finally:
+                if ran:
+                    self._set_status(state="idle", scans=self._status["scans"] + 1,
+                                     last_finished=datetime.now(IST).isoformat(timespec="seconds"),
+                                     last_duration_sec=round(time.time() - started, 1))
+                else:
+                    self._set_status(state="idle")
+            return ran
+        finally:
+            self._scan_lock.release()
+
+    # ─── Live prices ─────────────────────────────────────────
+    def _subscribe_live(self, df):
+        """Point the feed at the current picks plus open positions; start it on first use."""
+        if not live_feed.LIVE_FEED:
+            return
+        symbols = set(pick_tracker.select_top_picks(df)["symbol"]) if not df.empty else set()
+        symbols |= set(pick_tracker.open_picks(self._tracker_conn)["symbol"])
+        try:
+            scorer = self._live_scorer(sorted(symbols))
+        except Exception as e:
+            logger.warning(f"Live re-scoring unavailable, scores update per scan only: {e}")
+            scorer = None
+        try:
+            if self._feed is None:
+                self._feed = live_feed.make_feed(self.prices, scorer).start(sorted(symbols))
+            else:
+                self._feed.scorer = scorer
+                self._feed.set_symbols(symbols)
+        except Exception as e:
+            logger.warning(f"Live feed unavailable, prices update per scan only: {e}")
+            self._feed = None
+
+    def _live_scorer(self, symbols):
+        """A LiveScorer for `symbols` with the warm model, seeded from their completed bars."""
+        model, feature_list = self._model
+        conn = bar_store.connect()
+        try:
+            bars = scanner.completed_bars(symbols, conn)
+            offsets = scanner.obv_offsets(bars, scanner.obv_anchors(list(bars), conn))
+        finally:
+            conn.close()
+        return live_feed.LiveScorer(model, feature_list, bars, offsets)
+
+    def _evaluate_live(self):
+        if self._feed is None or self._tracker_conn is None or self._scan_lock.locked():
+            return
+        try:
+            closed = pick_tracker.evaluate_live(self._tracker_conn, self.prices)
+            if not closed.empty:
+                logger.info(f"Pick tracker: {len(closed)} closed on live ticks")
+        except Exception:
+            logger.exception("Live evaluation failed")
+
+    def live_prices_active(self):
+        return self._feed is not None
+
+    def request_scan(self):
+        """Ask for a scan as soon as possible. Never blocks."""
+        self._requested = True
+        self._wake.set()
+
+    def is_scanning(self):
+        return self._scan_lock.locked()
+
+    def status(self):
+        return dict(self._status)
+
+    def _set_status(self, **kw):
+        self._status.update(kw)
+        tmp = f"{STATUS_FILE}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._status, f)
+            os.replace(tmp, STATUS_FILE)
+        except OSError as e:
+            logger.warning(f"Could not write {STATUS_FILE}: {e}")
+
+    # ─── Schedule ────────────────────────────────────────────
+    def _loop(self):
+        next_scan = 0.0
+        while not self._stop.is_set():
+            market_open = self.force_market_open or is_market_open()
+            if self._requested or (market_open and time.time() >= next_scan):
+                self._requested = False
+                self.scan_once()
+                next_scan = time.time() + self.interval
+            elif market_open:
+                self._evaluate_live()
+            wait = min(self.interval, LIVE_EVAL_SEC) if self._feed is not None else self.interval
+            self._wake.wait(max(0.0, min(wait, next_scan - time.time())) if market_open else wait)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="scanner-worker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._feed is not None:
+            self._feed.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    worker = ScannerWorker()
+    print(f"Scanner worker: every {worker.interval}s during {MARKET_OPEN}–{MARKET_CLOSE} IST (Ctrl-C to stop)")
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+streaming_indicators.py
+
+Stateful per-symbol indicators for intraday updates.
+
+A SymbolIndicators object is seeded once from a symbol's completed daily bars
+and then carries exactly the state feature_kernel's recursions need: the EMA
+values, the running OBV, the previous close and the short trailing windows for
+RSI/ATR (13 values) and Bollinger (19 values). Applying today's LTP / partial
+bar is O(1) and reproduces feature_kernel bit-for-bit: the same recursions,
+with window sums accumulated oldest → newest like the kernel does.
+roll() commits a completed session in O(1).
+
+to_dict() / from_dict() round-trip the state exactly (JSON keeps float
+repr), which is what feature_engineering's incremental checkpoints store.
+"""
+
+import math
+from array import array
+from feature_kernel import alpha, panel_state
+
+MIN_BARS = 20        # scanner.MIN_BARS: fewer bars than this and there is nothing to score
+
+A5, A20, A12, A26, A9 = alpha(5), alpha(20), alpha(12), alpha(26), alpha(9)
+
+
+def _ema(prev, x, a):
+    return x if prev is None else (1 - a) * prev + a * x
+
+
+def _push(window, value, size):
+    window.append(value)
+    if len(window) > size:
+        del window[0]
+
+
+def _window_mean_std(values, with_std=False):
+    acc = 0.0
+    for v in values:
+        acc = acc + v
+    mean = acc / len(values)
+    if not with_std:
+        return mean, None
+    ssd = 0.0
+    for v in values:
+        d = v - mean
+        ssd = ssd + d * d
+    std = math.sqrt(ssd / (len(values) - 1)) if len(values) > 1 else math.nan
+    return mean, std
+
+
+class SymbolIndicators:
+    __slots__ = (
+        "n", "prev_close",
+        "ema5", "ema20", "ema12", "ema26", "macd_sig", "obv",
+        "ups", "downs", "trs",      # last 13 committed values (14-bar windows)
+        "closes",                   # last 19 committed closes (20-bar Bollinger window)
+    )
+
+    def __init__(self, bars=None):
+        """bars: completed sessions, oldest first, as OHLCV rows or an OHLCV DataFrame."""
+        self.n = 0
+        self.prev_close = None
+        self.ema5 = self.ema20 = self.ema12 = self.ema26 = self.macd_sig = None
+        self.obv = 0.0
+        self.ups, self.downs, self.trs = array("d"), array("d"), array("d")
+        self.closes = array("d")
+        if bars is not None:
+            self.seed(bars)
+
+    def seed(self, bars):
+        if hasattr(bars, "loc"):
+            bars = bars[["open", "high", "low", "close", "volume"]].to_numpy(dtype=float)
+        for bar in bars:
+            self.roll(bar)
+
+    def _step(self, open_, high, low, close, volume):
+        """State after one more bar, plus that bar's features. Does not mutate."""
+        pc = self.prev_close
+        ema5, ema20 = _ema(self.ema5, close, A5), _ema(self.ema20, close, A20)
+        ema12, ema26 = _ema(self.ema12, close, A12), _ema(self.ema26, close, A26)
+        macd = ema12 - ema26
+        macd_sig = _ema(self.macd_sig, macd, A9)
+
+        if pc is None:
+            up = down = 0.0
+            tr = high - low
+            obv = self.obv + 0.0 * volume
+        else:
+            d = close - pc
+            up, down = (d if d > 0 else 0.0), (-d if d < 0 else 0.0)
+            tr = max(high - low, max(abs(high - pc), abs(low - pc)))
+            obv = self.obv + (1.0 if d > 0 else -1.0 if d < 0 else 0.0) * volume
+
+        roll_up, _ = _window_mean_std(list(self.ups) + [up])
+        roll_down, _ = _window_mean_std(list(self.downs) + [down])
+        rs = roll_up / (roll_down + 1e-8)
+        atr, _ = _window_mean_std(list(self.trs) + [tr])
+        ma20, std20 = _window_mean_std(list(self.closes) + [close], with_std=True)
+        bb_upper = ma20 + 2 * std20
+        bb_lower = ma20 - 2 * std20
+
+        feats = {
+            "open": open_, "high": high, "low": low, "close": close, "volume": volume,
+            "EMA5": ema5, "EMA20": ema20, "EMA_diff": ema5 - ema20,
+            "RSI14": 100 - (100 / (1 + rs)),
+            "MACD": macd, "MACD_sig": macd_sig, "MACD_hist": macd - macd_sig,
+            "BB_%B": (close - bb_lower) / (bb_upper - bb_lower + 1e-8),
+            "BB_bandwidth": (bb_upper - bb_lower) / (ma20 + 1e-8),
+            "ATR14": atr,
+            "OBV": obv,
+        }
+        state = (ema5, ema20, ema12, ema26, macd_sig, obv, up, down, tr)
+        return state, feats
+
+    def to_dict(self):
+        return {
+            "n": self.n, "prev_close": self.prev_close,
+            "ema5": self.ema5, "ema20": self.ema20, "ema12": self.ema12, "ema26": self.ema26,
+            "macd_sig": self.macd_sig, "obv": self.obv,
+            "ups": list(self.ups), "downs": list(self.downs), "trs": list(self.trs),
+            "closes": list(self.closes),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls()
+        state.n, state.prev_close = d["n"], d["prev_close"]
+        state.ema5, state.ema20, state.ema12, state.ema26 = d["ema5"], d["ema20"], d["ema12"], d["ema26"]
+        state.macd_sig, state.obv = d["macd_sig"], d["obv"]
+        state.ups, state.downs, state.trs = array("d", d["ups"]), array("d", d["downs"]), array("d", d["trs"])
+        state.closes = array("d", d["closes"])
+        return state
+
+    def roll(self, bar):
+        """Commit a completed session (open, high, low, close, volume). Returns its features."""
+        open_, high, low, close, volume = (float(v) for v in bar)
+        state, feats = self._step(open_, high, low, close, volume)
+        self.ema5, self.ema20, self.ema12, self.ema26, self.macd_sig, self.obv, up, down, tr = state
+        _push(self.ups, up, 13)
+        _push(self.downs, down, 13)
+        _push(self.trs, tr, 13)
+        _push(self.closes, close, 19)
+        self.prev_close = close
+        self.n += 1
+        return feats
+
+    def update(self, ltp, high=None, low=None, open_=None, volume=0.0):
+        """
+        Features with today's partial bar (ltp as close). Missing high/low/open
+        default to ltp. Returns {} while there is too little history to score.
+        """
+        if self.n + 1 < MIN_BARS:
+            return {}
+        x = float(ltp)
+        _, feats = self._step(x if open_ is None else float(open_),
+                              x if high is None else float(high),
+                              x if low is None else float(low),
+                              x, float(volume))
+        return feats
+
+
+class IndicatorBook:
+    """SymbolIndicators for a whole universe, keyed by symbol."""
+
+    def __init__(self):
+        self.states = {}
+
+    def seed(self, symbol, completed_bars):
+        self.states[symbol] = SymbolIndicators(completed_bars)
+
+    def seed_many(self, bars_by_sym):
+        for sym, bars in bars_by_sym.items():
+            if bars is not None and len(bars):
+                self.seed(sym, bars)
+
+    def seed_panel(self, panel):
+        """Seed every symbol of a feature_kernel.BarPanel from its vectorized end state."""
+        st = panel_state(panel)
+        for i, (sym, n) in enumerate(zip(panel.symbols, panel.lengths)):
+            if n == 0:
+                continue
+            state = SymbolIndicators()
+            state.n, state.prev_close = int(n), float(panel.close[i, -1])
+            state.ema5, state.ema20 = float(st["ema5"][i]), float(st["ema20"][i])
+            state.ema12, state.ema26 = float(st["ema12"][i]), float(st["ema26"][i])
+            state.macd_sig, state.obv = float(st["macd_sig"][i]), float(st["obv"][i])
+            w = min(int(n), 13)
+            state.ups = array("d", st["ups"][i, -w:])
+            state.downs = array("d", st["downs"][i, -w:])
+            state.trs = array("d", st["trs"][i, -w:])
+            state.closes = array("d", st["closes"][i, -min(int(n), 19):])
+            self.states[sym] = state
+
+    def update(self, symbol, ltp, high=None, low=None, open_=None, volume=0.0):
+        state = self.states.get(symbol)
+        return state.update(ltp, high, low, open_, volume) if state else {}
+
+    def __len__(self):
+        return len(self.states)
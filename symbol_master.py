@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+symbol_master.py
+
+Stable int32 ids for broker symbols, kept in the bar store's `symbols` table.
+
+A symbol is (exchange, symbol, series), e.g. NSE / TCS / EQ, whose broker
+form is "NSE:TCS-EQ". Ids are assigned once, in order of first sight, and are
+never reused or renumbered, so the bar store, feature and label files and the
+scanner output carry a 4-byte id instead of the string. Broker strings are
+only needed at the edges: API calls and the dashboard.
+
+- load: the master of a bar store, read once per process and cached
+  (re-read only after ids were added or metadata synced)
+- register: ids for broker symbols, assigning new ones as needed
+- load_universe: stock_universe.csv as broker symbols, with its optional
+  series / sector / lot_size / isin columns synced into the master
+
+Usage:
+    python symbol_master.py          # sync stock_universe.csv and summarize the master
+"""
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+UNIVERSE_CSV   = "stock_universe.csv"
+DEFAULT_SERIES = "EQ"
+META_COLS      = ["sector", "lot_size", "isin"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    symbol_id INTEGER PRIMARY KEY AUTOINCREMENT,   -- stable: never reused or renumbered
+    exchange  TEXT NOT NULL,
+    symbol    TEXT NOT NULL,
+    series    TEXT NOT NULL,
+    sector    TEXT,
+    lot_size  INTEGER,
+    isin      TEXT,
+    UNIQUE (exchange, symbol, series)
+);
+"""
+
+_masters   = {}     # database path → SymbolMaster
+_universes = {}     # (database path, universe path) → (universe mtime, broker symbols)
+_lock = threading.Lock()
+
+
+def broker_symbol(exchange, symbol, series=DEFAULT_SERIES):
+    """"NSE:TCS-EQ" from ("NSE", "TCS", "EQ")."""
+    return f"{exchange}:{symbol}-{series}" if series else f"{exchange}:{symbol}"
+
+
+def parse_broker_symbol(name):
+    """("NSE", "BAJAJ-AUTO", "EQ") from "NSE:BAJAJ-AUTO-EQ": the series follows the last '-'."""
+    exchange, colon, rest = name.partition(":")
+    if not colon or not exchange or not rest:
+        raise ValueError(f"Not a broker symbol: {name!r}")
+    symbol, dash, series = rest.rpartition("-")
+    return (exchange, symbol, series) if dash else (exchange, rest, "")
+
+
+def _broker_symbols(frame):
+    """Vectorized broker_symbol over exchange / symbol / series columns."""
+    series = frame["series"].fillna("")
+    return (frame["exchange"] + ":" + frame["symbol"]
+            + np.where(series == "", "", "-" + series)).astype(object)
+
+
+class SymbolMaster:
+    """In-memory copy of the symbols table: vectorized id ↔ broker symbol lookups and metadata."""
+
+    def __init__(self, frame):
+        frame = frame.sort_values("symbol_id").reset_index(drop=True)
+        frame["symbol_id"] = frame["symbol_id"].astype(np.int32)
+        frame["lot_size"] = pd.to_numeric(frame["lot_size"]).astype("Int64")
+        frame["broker_symbol"] = _broker_symbols(frame)
+        self.frame = frame
+        self.max_id = int(frame["symbol_id"].max()) if len(frame) else 0
+        self._ids = frame["symbol_id"].to_numpy()
+        self._index = pd.Index(frame["broker_symbol"])
+        self._names = np.full(self.max_id + 1, None, dtype=object)
+        self._names[self._ids] = frame["broker_symbol"].to_numpy()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def ids(self, symbols):
+        """int32 ids for broker symbols, -1 for any the master does not know."""
+        pos = self._index.get_indexer(pd.Index(symbols, dtype=object))
+        if not len(self._ids):
+            return np.full(len(pos), -1, dtype=np.int32)
+        return np.where(pos >= 0, self._ids[pos], -1).astype(np.int32)
+
+    def id_of(self, symbol):
+        """Id of one broker symbol, or None."""
+        i = int(self.ids([symbol])[0])
+        return i if i >= 0 else None
+
+    def symbols(self, ids):
+        """Broker symbols for an array of ids (None for unknown ids)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        out = np.full(len(ids), None, dtype=object)
+        known = (ids >= 0) & (ids <= self.max_id)
+        out[known] = self._names[ids[known]]
+        return out
+
+    def symbol_of(self, symbol_id):
+        return self.symbols([symbol_id])[0]
+
+    def metadata(self, ids=None):
+        """symbol_id-indexed frame of exchange, symbol, series, broker_symbol and META_COLS."""
+        frame = self.frame.set_index("symbol_id")
+        return frame if ids is None else frame.reindex(np.asarray(ids))
+
+
+def _db_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def _forget(path):
+    with _lock:
+        _masters.pop(path, None)
+
+
+def load(conn):
+    """
+    The master of a bar store connection, cached per database file. Ids only
+    ever grow, so the cached copy is current while the highest id matches
+    (one primary-key lookup per call).
+    """
+    path = _db_path(conn)
+    max_id = conn.execute("SELECT COALESCE(MAX(symbol_id), 0) FROM symbols").fetchone()[0]
+    with _lock:
+        master = _masters.get(path)
+    if master is None or master.max_id != max_id:
+        master = SymbolMaster(pd.read_sql_query(
+            f"SELECT symbol_id, exchange, symbol, series, {', '.join(META_COLS)} FROM symbols", conn))
+        if path:                            # in-memory databases are not shared, so not cached
+            with _lock:
+                _masters[path] = master
+    return master
+
+
+def register(conn, symbols):
+    """int32 ids for broker symbols, in order; symbols new to the master get the next ids."""
+    symbols = np.asarray(symbols, dtype=object)
+    ids = load(conn).ids(symbols)
+    if (ids < 0).any():
+        new = pd.unique(symbols[ids < 0])
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO symbols (exchange, symbol, series) VALUES (?, ?, ?)",
+                             [parse_broker_symbol(s) for s in new])
+        ids = load(conn).ids(symbols)
+    return ids
+
+
+def read_universe(path=UNIVERSE_CSV):
+    """The universe file normalized to exchange, symbol, series and META_COLS (None where absent)."""
+    raw = pd.read_csv(path, dtype=str)
+    universe = pd.DataFrame({c: raw[c].str.strip().str.upper() for c in ("exchange", "symbol")})
+    universe["series"] = (raw["series"].str.strip().str.upper().fillna(DEFAULT_SERIES)
+                          if "series" in raw else DEFAULT_SERIES)
+    universe["sector"] = raw["sector"].str.strip() if "sector" in raw else None
+    universe["lot_size"] = pd.to_numeric(raw["lot_size"], errors="coerce").astype("Int64") if "lot_size" in raw else None
+    universe["isin"] = raw["isin"].str.strip().str.upper() if "isin" in raw else None
+    return universe.dropna(subset=["exchange", "symbol"])
+
+
+def load_universe(conn, path=UNIVERSE_CSV):
+    """
+    Broker symbols of the universe, in file order. The file is read and synced
+    into the master (new ids, refreshed metadata) once per process, and again
+    only when it changes.
+    """
+    key = (_db_path(conn), os.path.abspath(path))
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _universes.get(key)
+    if cached is not None and cached[0] == mtime:
+        return list(cached[1])
+
+    universe = read_universe(path)
+    symbols = _broker_symbols(universe).tolist()
+    register(conn, symbols)                 # only new symbols, so ids stay dense
+    rows = universe[META_COLS + ["exchange", "symbol", "series"]].astype(object)
+    with conn:
+        conn.executemany("""
+            UPDATE symbols SET sector   = COALESCE(?, sector),
+                               lot_size = COALESCE(?, lot_size),
+                               isin     = COALESCE(?, isin)
+            WHERE exchange = ? AND symbol = ? AND series = ?
+        """, rows.where(rows.notna(), None).itertuples(index=False, name=None))
+    _forget(key[0])
+    with _lock:
+        _universes[key] = (mtime, symbols)
+    return list(symbols)
+
+
+if __name__ == "__main__":
+    import bar_store
+    conn = bar_store.connect()
+    universe = load_universe(conn)
+    master = load(conn)
+    print(f"{bar_store.BARS_DB}: {len(master)} symbols in the master, {len(universe)} in {UNIVERSE_CSV}")
+    print(master.metadata().head(10).to_string())
@@ -1,72 +1,212 @@
 #!/usr/bin/env python3
+"""
+train_model.py
+
+Trains the RandomForest scorer on training_data_labeled.csv.
+
+Training data is loaded through a typed, columnar cache so peak memory stays
+close to the size of the float32 feature matrix:
+
+- The CSV is converted once (and again whenever it changes) into one raw
+  binary file per column under training_data_labeled_cols/: float32 features,
+  int8 label (-1 = missing) and the int32 symbol_id, read chunk by chunk with
+  only the needed columns projected.
+- Loading memory-maps those files and fills a float32 feature matrix one
+  column at a time: median imputation per column, rows written directly in
+  train/test split order so the splits are views rather than copies.
+- sklearn trees train on float32 anyway, so fit() does not copy X again.
+
+Usage:
+    python train_model.py
+"""
+
+import os
+import json
+import resource
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import roc_auc_score, accuracy_score, classification_report, confusion_matrix
 from sklearn.model_selection import train_test_split
 import joblib
+from forest_model import export_forest
+from feature_kernel import KEY
 
-# ─── Load Data ───────────────────────────────────────────────────────
-print("Loading: training_data_labeled.csv")
-df = pd.read_csv("training_data_labeled.csv")
+LABELED_CSV  = "training_data_labeled.csv"
+COLUMNAR_DIR = "training_data_labeled_cols"
+MODEL_PATH   = "models/ai_model.pkl"
+CHUNKSIZE    = 500_000
 
-# ─── Define Feature Columns ──────────────────────────────────────────
-feature_cols = [
+FEATURE_COLS = [
     "open", "high", "low", "close", "volume",
     "EMA5", "EMA20", "EMA_diff", "RSI14", "MACD", "MACD_sig", "MACD_hist",
     "BB_%B", "BB_bandwidth", "ATR14", "OBV"
 ]
-feature_cols = [f for f in feature_cols if f in df.columns]
-
-# ─── Impute missing values (Median for each feature) ─────────────────
-df[feature_cols] = df[feature_cols].fillna(df[feature_cols].median())
-
-# (Optional: also drop any remaining rows with NaN label)
-df = df.dropna(subset=["label"])
-
-print(f"Using features: {feature_cols}")
-# ─── Prepare Train/Test Sets ─────────────────────────────────────────
-X = df[feature_cols]
-y = df["label"]
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.15, random_state=42, shuffle=True  # set shuffle=False for pure time-series
-)
-
-print(f"Train: {X_train.shape}, Test: {X_test.shape}")
-
-# ─── Train Model ─────────────────────────────────────────────────────
-model = RandomForestClassifier(
-    n_estimators=200,
-    max_depth=8,
-    min_samples_leaf=5,
-    n_jobs=-1,
-    random_state=42
-)
-model.fit(X_train, y_train)
-
-# ─── Evaluation ──────────────────────────────────────────────────────
-probs = model.predict_proba(X_test)[:,1]
-preds = model.predict(X_test)
-roc = roc_auc_score(y_test, probs)
-acc = accuracy_score(y_test, preds)
-cm  = confusion_matrix(y_test, preds)
-
-print("\nTest ROC AUC: ", round(roc, 4))
-print("Test Accuracy:", round(acc, 4))
-print("Label ratio in test:", np.mean(y_test))
-print("Confusion Matrix:\n", cm)
-print(classification_report(y_test, preds, digits=3))
-
-# ─── Feature Importances ─────────────────────────────────────────────
-fi = pd.Series(model.feature_importances_, index=feature_cols)
-fi = fi.sort_values(ascending=False)
-print("\nTop Feature Importances:")
-print(fi)
-
-# ─── Save Model and Features ─────────────────────────────────────────
-joblib.dump((model, feature_cols), "models/ai_model.pkl")
-print("✅ Model and feature list saved to models/ai_model.pkl")
-
-# (optional) Save feature importances for your dashboard
-fi.to_csv("feature_importances.csv")
-print("✅ Feature importances saved to feature_importances.csv")
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB. Prefers Linux's
+    VmHWM, which starts fresh at exec; ru_maxrss (KiB) carries over the
+    parent's peak into a spawned child.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ─── Columnar cache ──────────────────────────────────────────
+def build_columnar(csv_path=LABELED_CSV, out_dir=COLUMNAR_DIR, chunksize=CHUNKSIZE):
+    """Stream the labeled CSV into per-column binary files. Returns the cache metadata."""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    feature_cols = [f for f in FEATURE_COLS if f in header]
+    has_symbol = KEY in header
+    usecols = feature_cols + ["label"] + ([KEY] if has_symbol else [])
+    dtypes = {**{c: np.float32 for c in feature_cols + ["label"]}, KEY: np.int32}
+
+    tmp = f"{out_dir}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    files = {c: open(os.path.join(tmp, f"{c}.bin"), "wb") for c in feature_cols + ["label"]}
+    if has_symbol:
+        files[KEY] = open(os.path.join(tmp, f"{KEY}.bin"), "wb")
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+            for c in feature_cols:
+                chunk[c].to_numpy(np.float32).tofile(files[c])
+            label = chunk["label"].to_numpy(np.float32)
+            np.where(np.isnan(label), -1, label).astype(np.int8).tofile(files["label"])
+            if has_symbol:
+                chunk[KEY].to_numpy(np.int32).tofile(files[KEY])
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {
+        "rows": rows,
+        "columns": {**{c: "float32" for c in feature_cols}, "label": "int8",
+                    **({KEY: "int32"} if has_symbol else {})},
+        "feature_cols": feature_cols,
+        "source_mtime": os.path.getmtime(csv_path),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    if os.path.isdir(out_dir):
+        for name in os.listdir(out_dir):
+            os.remove(os.path.join(out_dir, name))
+        os.rmdir(out_dir)
+    os.replace(tmp, out_dir)
+    return meta
+
+
+def load_columnar(csv_path=LABELED_CSV, cache_dir=COLUMNAR_DIR):
+    """Memory-mapped columns from the cache, rebuilding it first if the CSV is newer."""
+    meta_path = os.path.join(cache_dir, "meta.json")
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if os.path.exists(csv_path) and meta["source_mtime"] != os.path.getmtime(csv_path):
+            meta = None
+    if meta is None:
+        print(f"Building columnar cache: {csv_path} → {cache_dir}")
+        meta = build_columnar(csv_path, cache_dir)
+    cols = {c: np.memmap(os.path.join(cache_dir, f"{c}.bin"), dtype=dt, mode="r", shape=(meta["rows"],))
+            for c, dt in meta["columns"].items()}
+    return cols, meta
+
+
+def load_training_data(csv_path=LABELED_CSV, cache_dir=COLUMNAR_DIR, test_size=0.15, random_state=42):
+    """
+    float32 X_train/X_test, int8 y_train/y_test and the feature list.
+    Same rows and split as median-imputing the full frame, dropping unlabeled
+    rows and calling train_test_split on it.
+    """
+    cols, meta = load_columnar(csv_path, cache_dir)
+    feature_cols = meta["feature_cols"]
+    keep = np.flatnonzero(np.asarray(cols["label"]) >= 0)
+    train_idx, test_idx = train_test_split(
+        keep, test_size=test_size, random_state=random_state, shuffle=True  # set shuffle=False for pure time-series
+    )
+    order = np.concatenate([train_idx, test_idx])
+    del keep, train_idx
+
+    X = np.empty((len(order), len(feature_cols)), dtype=np.float32, order="F")
+    for j, c in enumerate(feature_cols):
+        col = np.asarray(cols[c])
+        median = np.nanmedian(col)      # over all rows, labeled or not, like the frame-wide median
+        X[:, j] = col[order]
+        X[np.isnan(X[:, j]), j] = median
+    y = np.asarray(cols["label"])[order]
+    n_train = len(order) - len(test_idx)
+    return X[:n_train], X[n_train:], y[:n_train], y[n_train:], feature_cols
+
+
+# ─── Training / evaluation ───────────────────────────────────
+def train(X_train, y_train):
+    model = RandomForestClassifier(
+        n_estimators=200,
+        max_depth=8,
+        min_samples_leaf=5,
+        n_jobs=-1,
+        random_state=42
+    )
+    model.fit(X_train, y_train)
+    return model
+
+
+def evaluate(model, X_test, y_test, feature_cols):
+    probs = model.predict_proba(X_test)[:,1]
+    preds = model.predict(X_test)
+    roc = roc_auc_score(y_test, probs)
+    acc = accuracy_score(y_test, preds)
+    cm  = confusion_matrix(y_test, preds)
+
+    print("\nTest ROC AUC: ", round(roc, 4))
+    print("Test Accuracy:", round(acc, 4))
+    print("Label ratio in test:", np.mean(y_test))
+    print("Confusion Matrix:\n", cm)
+    print(classification_report(y_test, preds, digits=3))
+
+    # ─── Feature Importances ─────────────────────────────────
+    fi = pd.Series(model.feature_importances_, index=feature_cols)
+    fi = fi.sort_values(ascending=False)
+    print("\nTop Feature Importances:")
+    print(fi)
+    return fi
+
+
+def save_model(model, feature_cols, fi, path=MODEL_PATH):
+    joblib.dump((model, feature_cols), path)
+    print(f"✅ Model and feature list saved to {path}")
+
+    # Flattened node arrays for fast loading/scoring (scanner, ai_utils.load_model)
+    forest_dir = export_forest(model, feature_cols, path)
+    print(f"✅ Compiled forest exported to {forest_dir}")
+
+    # (optional) Save feature importances for your dashboard
+    fi.to_csv("feature_importances.csv")
+    print("✅ Feature importances saved to feature_importances.csv")
+
+
+def main():
+    print(f"Loading: {LABELED_CSV}")
+    X_train, X_test, y_train, y_test, feature_cols = load_training_data()
+    print(f"Using features: {feature_cols}")
+    print(f"Train: {X_train.shape}, Test: {X_test.shape}")
+    print(f"Peak RSS after load: {peak_rss_mb():.0f} MB")
+
+    model = train(X_train, y_train)
+    print(f"Peak RSS after fit:  {peak_rss_mb():.0f} MB")
+    fi = evaluate(model, X_test, y_test, feature_cols)
+    save_model(model, feature_cols, fi)
+
+
+if __name__ == "__main__":
+    main()